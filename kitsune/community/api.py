@@ -1,12 +1,17 @@
+import hashlib
+import json
 from collections import defaultdict
 from datetime import datetime, timedelta
 
+from django.conf import settings
+from django.core.cache import cache
 from elasticutils import F
 from rest_framework import views, fields, exceptions
 from rest_framework.response import Response
 
 from kitsune.questions.models import AnswerMetricsMappingType
 from kitsune.users.models import UserMappingType
+from kitsune.users.templatetags.jinja_helpers import get_avatars_and_names
 from kitsune.wiki.models import RevisionMetricsMappingType
 
 
@@ -14,6 +19,10 @@ from kitsune.wiki.models import RevisionMetricsMappingType
 # section.  There isn't a way to tell ES to just return everything.
 BIG_NUMBER = 10000
 
+# The query values that pick a page of a leaderboard, rather than the
+# leaderboard itself.
+PAGE_QUERY_KEYS = ("page", "page_size")
+
 
 class InvalidFilterNameException(exceptions.APIException):
     """A filter was requested which does not exist."""
@@ -156,228 +165,209 @@ class TopContributorsBase(views.APIView):
     def filter_product(self, value):
         return F(product=value)
 
+    def get_ordering(self):
+        """Return the metric to sort by, and whether to sort descending."""
+        ordering = self.query_values["ordering"]
+        if ordering.lstrip("-") not in self.get_allowed_orderings():
+            ordering = self.get_default_query()["ordering"]
+        return ordering.lstrip("-"), ordering.startswith("-")
 
-class TopContributorsQuestions(TopContributorsBase):
-    def get_default_query(self):
-        filters = super(TopContributorsQuestions, self).get_default_query()
-        filters["ordering"] = "-answer_count"
-        return filters
-
-    def get_allowed_orderings(self):
-        return [
-            "answer_count",
-            "solution_count",
-            "helpful_vote_count",
-        ]
-
-    def get_filters(self):
-        f = super(TopContributorsQuestions, self).get_filters()
-        f &= F(by_asker=False)
-        return f
+    def compute_leaderboard(self, filters):
+        """Return every contributor that matches the filters, in order.
 
-    def get_data(self, request):
-        super(TopContributorsQuestions, self).get_data(request)
+        Contributors are dicts of their "user_id" and their metrics.
 
-        # This is the base of all the metrics. Each metric branches off from
-        # this to get a particular metric type, since we can't do Aggregates.
-        query = AnswerMetricsMappingType.search()
-        base_filters = self.get_filters()
+        """
+        raise NotImplementedError
 
-        # This branch is to get the total number of answers for each user.
-        answer_query = query.filter(base_filters).facet(
-            "creator_id", filtered=True, size=BIG_NUMBER
-        )
+    def get_leaderboard(self):
+        """Return the leaderboard for the request's filters.
 
-        # This branch gets the number of answers that are solutions for each user.
-        solutions_filter = base_filters & F(is_solution=True)
-        solutions_query = query.filter(solutions_filter).facet(
-            "creator_id", filtered=True, size=BIG_NUMBER
-        )
+        Leaderboards are cached for TOP_CONTRIBUTORS_CACHE_TIMEOUT
+        seconds, so going through their pages doesn't compute them again.
 
-        # This branch gets the number of helpful votes across all answers for
-        # each user. It is a raw facet because elasticutils only supports the
-        # term facet type in non-raw facets. Because it is raw facet, we have
-        # to also put the filter in the facet ourselves.
-        helpful_query = query.facet_raw(
-            creator_id={
-                "terms_stats": {"key_field": "creator_id", "value_field": "helpful_count",},
-                "facet_filter": query._process_filters(base_filters.filters),
-            }
+        """
+        query_values = self.get_default_query()
+        query_values.update(dict(list(self.request.GET.items())))
+        leaderboard_values = [
+            (k, v) for k, v in sorted(query_values.items()) if k not in PAGE_QUERY_KEYS
+        ]
+        key = "community:top_contributors:%s:%s" % (
+            self.__class__.__name__,
+            hashlib.md5(json.dumps(leaderboard_values).encode()).hexdigest(),
         )
 
-        # Collect three lists of objects that correlates users and the appropriate metric count
-        creator_answer_counts = answer_query.facet_counts()["creator_id"]["terms"]
-        creator_solutions_counts = solutions_query.facet_counts()["creator_id"]["terms"]
-        creator_helpful_counts = helpful_query.facet_counts()["creator_id"]["terms"]
-
-        # Combine all the metric types into one big list.
-        combined = defaultdict(
-            lambda: {"answer_count": 0, "solution_count": 0, "helpful_vote_count": 0,}
+        timeout = settings.TOP_CONTRIBUTORS_CACHE_TIMEOUT
+        cached = cache.get(key) if timeout else None
+        if cached is not None:
+            leaderboard, warnings = cached
+            self.query_values = query_values
+            self.warnings.extend(warnings)
+            for k in PAGE_QUERY_KEYS:
+                getattr(self, "filter_" + k)(query_values[k])
+            return leaderboard
+
+        warnings_count = len(self.warnings)
+        leaderboard = self.compute_leaderboard(self.get_filters())
+        if timeout:
+            cache.set(key, (leaderboard, self.warnings[warnings_count:]), timeout)
+        return leaderboard
+
+    def aggregate(self, mapping_type, filters, aggs):
+        """Run aggregations over the documents that match the filters.
+
+        They all run in one request to ES.
+
+        """
+        query = mapping_type.search()
+        body = {
+            "size": 0,
+            "query": {"filtered": {"filter": query._process_filters(filters.filters)}},
+            "aggs": aggs,
+        }
+        response = query.get_es().search(
+            index=query.get_indexes(), doc_type=query.get_doctypes(), body=body
         )
+        return response["aggregations"]
 
-        for d in creator_answer_counts:
-            combined[d["term"]]["user_id"] = d["term"]
-            combined[d["term"]]["answer_count"] = d["count"]
-
-        for d in creator_solutions_counts:
-            combined[d["term"]]["user_id"] = d["term"]
-            combined[d["term"]]["solution_count"] = d["count"]
-
-        for d in creator_helpful_counts:
-            combined[d["term"]]["user_id"] = d["term"]
-            # Since this is a term_stats filter, not just a term filter, it is total, not count.
-            combined[d["term"]]["helpful_vote_count"] = int(d["total"])
-
-        # Sort by answer count, and get just the ids into a list.
-        sort_key = self.query_values["ordering"]
-        if sort_key[0] == "-":
-            sort_reverse = True
-            sort_key = sort_key[1:]
-        else:
-            sort_reverse = False
-
-        top_contributors = list(combined.values())
-        top_contributors.sort(key=lambda d: d[sort_key], reverse=sort_reverse)
-        user_ids = [c["user_id"] for c in top_contributors]
-        full_count = len(user_ids)
-
-        # Paginate those user ids.
+    def get_page(self, leaderboard):
+        """Return the requested page of the leaderboard, with the users."""
         page_start = (self.query_values["page"] - 1) * self.query_values["page_size"]
         page_end = page_start + self.query_values["page_size"]
-        user_ids = user_ids[page_start:page_end]
+        contributors = leaderboard[page_start:page_end]
 
         # Get full user objects for every id on this page.
         users = UserMappingType.reshape(
             UserMappingType.search()
-            .filter(id__in=user_ids)
+            .filter(id__in=[c["user_id"] for c in contributors])
             .values_dict("id", "username", "display_name", "avatar", "last_contribution_date")[
                 : self.query_values["page_size"]
             ]
         )
+        users = dict((u["id"], u) for u in users)
+
+        # The index has the avatars and names from when the users were last
+        # indexed, so get the current ones.
+        avatars_and_names = get_avatars_and_names(list(users), size=120)
 
-        # For ever user object found, mix in the metrics counts for that user,
-        # and then reshape the data to make more sense to clients.
+        # For every user found, mix in their metrics, and then reshape the
+        # data to make more sense to clients.
         data = []
-        for u in users:
-            d = combined[u["id"]]
+        for contributor in contributors:
+            u = users.get(contributor["user_id"])
+            if u is None:
+                continue
+            if u["id"] in avatars_and_names:
+                u["avatar"], u["display_name"] = avatars_and_names[u["id"]]
+            d = dict(contributor)
+            d.pop("user_id")
             d["user"] = u
-            d["last_contribution_date"] = d["user"].get("last_contribution_date", None)
-            d.pop("user_id", None)
-            d["user"].pop("id", None)
-            d["user"].pop("last_contribution_date", None)
+            d["last_contribution_date"] = u.pop("last_contribution_date", None)
+            u.pop("id")
+            d["rank"] = page_start + len(data) + 1
             data.append(d)
 
-        # One last sort, since ES didn't return the users in any particular order.
-        data.sort(key=lambda d: d[sort_key], reverse=sort_reverse)
-
-        # Add ranks to the objects.
-        for i, contributor in enumerate(data, 1):
-            contributor["rank"] = page_start + i
-
         return {
             "results": data,
-            "count": full_count,
+            "count": len(leaderboard),
             "filters": self.query_values,
             "allowed_orderings": self.get_allowed_orderings(),
             "warnings": self.warnings,
         }
 
 
-class TopContributorsLocalization(TopContributorsBase):
+class TopContributorsQuestions(TopContributorsBase):
     def get_default_query(self):
-        filters = super(TopContributorsLocalization, self).get_default_query()
-        filters["ordering"] = "-revision_count"
+        filters = super(TopContributorsQuestions, self).get_default_query()
+        filters["ordering"] = "-answer_count"
         return filters
 
     def get_allowed_orderings(self):
         return [
-            "revision_count",
-            "review_count",
+            "answer_count",
+            "solution_count",
+            "helpful_vote_count",
         ]
 
-    def get_data(self, request):
-        super(TopContributorsLocalization, self).get_data(request)
-
-        # This is the base of all the metrics. Each metric branches off from
-        # this to get a particular metric type, since we can't do Aggregates.
-        base_query = RevisionMetricsMappingType.search()
-        base_filters = self.get_filters()
-
-        # This branch is to get the number of revisions made by each user.
-        revision_query = base_query.filter(base_filters).facet(
-            "creator_id", filtered=True, size=BIG_NUMBER
-        )
+    def get_filters(self):
+        f = super(TopContributorsQuestions, self).get_filters()
+        f &= F(by_asker=False)
+        return f
 
-        # This branch is to get the number of reviews done by each user.
-        reviewer_query = base_query.filter(base_filters).facet(
-            "reviewer_id", filtered=True, size=BIG_NUMBER
+    def get_data(self, request):
+        super(TopContributorsQuestions, self).get_data(request)
+        return self.get_page(self.get_leaderboard())
+
+    def compute_leaderboard(self, filters):
+        sort_key, sort_reverse = self.get_ordering()
+        # ES sorts the contributors by the number of answers (the number of
+        # documents in their bucket), or by one of the other metrics.
+        order_by = "_count" if sort_key == "answer_count" else sort_key
+
+        aggregations = self.aggregate(
+            AnswerMetricsMappingType,
+            filters,
+            {
+                "contributors": {
+                    "terms": {
+                        "field": "creator_id",
+                        "size": BIG_NUMBER,
+                        "order": {order_by: "desc" if sort_reverse else "asc"},
+                    },
+                    "aggs": {
+                        "solution_count": {"filter": {"term": {"is_solution": True}}},
+                        "helpful_vote_count": {"sum": {"field": "helpful_count"}},
+                    },
+                }
+            },
         )
 
-        # Collect two lists of objects that correlates users and the appropriate metric count
-        revision_creator_counts = revision_query.facet_counts()["creator_id"]["terms"]
-        revision_reviewer_counts = reviewer_query.facet_counts()["reviewer_id"]["terms"]
-
-        # Combine all the metric types into one big list.
-        combined = defaultdict(lambda: {"revision_count": 0, "review_count": 0,})
-
-        for d in revision_creator_counts:
-            combined[d["term"]]["user_id"] = d["term"]
-            combined[d["term"]]["revision_count"] = d["count"]
-
-        for d in revision_reviewer_counts:
-            combined[d["term"]]["user_id"] = d["term"]
-            combined[d["term"]]["review_count"] = d["count"]
+        return [
+            {
+                "user_id": b["key"],
+                "answer_count": b["doc_count"],
+                "solution_count": b["solution_count"]["doc_count"],
+                "helpful_vote_count": int(b["helpful_vote_count"]["value"]),
+            }
+            for b in aggregations["contributors"]["buckets"]
+        ]
 
-        # Sort by revision count, and get just the ids into a list.
-        sort_key = self.query_values["ordering"]
-        if sort_key[0] == "-":
-            sort_reverse = True
-            sort_key = sort_key[1:]
-        else:
-            sort_reverse = False
 
-        top_contributors = list(combined.values())
-        top_contributors.sort(key=lambda d: d[sort_key], reverse=sort_reverse)
-        user_ids = [c["user_id"] for c in top_contributors]
-        full_count = len(user_ids)
+class TopContributorsLocalization(TopContributorsBase):
+    def get_default_query(self):
+        filters = super(TopContributorsLocalization, self).get_default_query()
+        filters["ordering"] = "-revision_count"
+        return filters
 
-        # Paginate those user ids.
-        page_start = (self.query_values["page"] - 1) * self.query_values["page_size"]
-        page_end = page_start + self.query_values["page_size"]
-        user_ids = user_ids[page_start:page_end]
+    def get_allowed_orderings(self):
+        return [
+            "revision_count",
+            "review_count",
+        ]
 
-        # Get full user objects for every id on this page.
-        users = UserMappingType.reshape(
-            UserMappingType.search()
-            .filter(id__in=user_ids)
-            .values_dict("id", "username", "display_name", "avatar", "last_contribution_date")[
-                : self.query_values["page_size"]
-            ]
+    def get_data(self, request):
+        super(TopContributorsLocalization, self).get_data(request)
+        return self.get_page(self.get_leaderboard())
+
+    def compute_leaderboard(self, filters):
+        # Revisions and reviews are counted by different users, so they're
+        # two aggregations, combined here.
+        aggregations = self.aggregate(
+            RevisionMetricsMappingType,
+            filters,
+            {
+                "revision_count": {"terms": {"field": "creator_id", "size": BIG_NUMBER}},
+                "review_count": {"terms": {"field": "reviewer_id", "size": BIG_NUMBER}},
+            },
         )
 
-        # For ever user object found, mix in the metrics counts for that user,
-        # and then reshape the data to make more sense to clients.
-        data = []
-        for u in users:
-            d = combined[u["id"]]
-            d["user"] = u
-            d["last_contribution_date"] = d["user"].get("last_contribution_date", None)
-            d.pop("user_id", None)
-            d["user"].pop("id", None)
-            d["user"].pop("last_contribution_date", None)
-            data.append(d)
+        combined = defaultdict(lambda: {"revision_count": 0, "review_count": 0})
+        for metric in ("revision_count", "review_count"):
+            for b in aggregations[metric]["buckets"]:
+                combined[b["key"]]["user_id"] = b["key"]
+                combined[b["key"]][metric] = b["doc_count"]
 
-        # One last sort, since ES didn't return the users in any particular order.
-        data.sort(key=lambda d: d[sort_key], reverse=sort_reverse)
-
-        # Add ranks to the objects.
-        for i, contributor in enumerate(data, 1):
-            contributor["rank"] = page_start + i
-
-        return {
-            "results": data,
-            "count": full_count,
-            "filters": self.query_values,
-            "allowed_orderings": self.get_allowed_orderings(),
-            "warnings": self.warnings,
-        }
+        sort_key, sort_reverse = self.get_ordering()
+        leaderboard = list(combined.values())
+        leaderboard.sort(key=lambda d: d[sort_key], reverse=sort_reverse)
+        return leaderboard
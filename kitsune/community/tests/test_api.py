@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from nose.tools import eq_
 
 from django.test.client import RequestFactory
+from django.test.utils import override_settings
 
 from kitsune.community import api
 from kitsune.products.tests import ProductFactory
@@ -106,6 +107,51 @@ class TestTopContributorsQuestions(ElasticTestCase):
         eq_(data["count"], 2)
         eq_(len(data["results"]), 1)
 
+    def test_ordering(self):
+        u1 = UserFactory()
+        u2 = UserFactory()
+
+        AnswerFactory(creator=u1)
+        AnswerFactory(creator=u1)
+        a3 = AnswerFactory(creator=u2)
+        AnswerVoteFactory(answer=a3, helpful=True)
+
+        self.refresh()
+
+        req = self.factory.get("/", {"ordering": "-helpful_vote_count"})
+        data = self.api.get_data(req)
+        eq_([u2.username, u1.username], [r["user"]["username"] for r in data["results"]])
+
+        req = self.factory.get("/", {"ordering": "answer_count"})
+        data = self.api.get_data(req)
+        eq_([u2.username, u1.username], [r["user"]["username"] for r in data["results"]])
+
+    @override_settings(TOP_CONTRIBUTORS_CACHE_TIMEOUT=60)
+    def test_leaderboard_cached(self):
+        u1 = UserFactory()
+        u2 = UserFactory()
+
+        AnswerFactory(creator=u1)
+        AnswerFactory(creator=u1)
+        AnswerFactory(creator=u2)
+
+        self.refresh()
+
+        req = self.factory.get("/", {"page_size": 1})
+        data = self.api.get_data(req)
+        eq_(data["count"], 2)
+        eq_(data["results"][0]["user"]["username"], u1.username)
+
+        # The other pages come from the same leaderboard.
+        AnswerFactory(creator=UserFactory())
+        self.refresh()
+
+        req = self.factory.get("/", {"page_size": 1, "page": 2})
+        data = self.api.get_data(req)
+        eq_(data["count"], 2)
+        eq_(data["results"][0]["user"]["username"], u2.username)
+        eq_(data["results"][0]["rank"], 2)
+
     def test_filter_last_contribution(self):
         u1 = UserFactory()
         u2 = UserFactory()
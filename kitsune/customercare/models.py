@@ -4,6 +4,7 @@ from datetime import datetime
 
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.signals import post_save
 
 from kitsune.search.models import (
     SearchMappingType,
@@ -12,7 +13,7 @@ from kitsune.search.models import (
     register_mapping_type,
 )
 from kitsune.sumo.models import ModelBase
-from kitsune.users.models import get_profile
+from kitsune.users.models import get_profile, update_last_contribution_date
 
 
 class TwitterAccount(ModelBase):
@@ -114,28 +115,26 @@ class ReplyMetricsMappingType(SearchMappingType):
         }
 
     @classmethod
-    def extract_document(cls, obj_id, obj=None):
-        """Extracts indexable attributes from an Answer."""
+    def extract_documents(cls, ids):
+        """Extracts indexable attributes from Replies."""
         fields = ["id", "created", "user_id", "locale"]
 
-        if obj is None:
-            model = cls.get_model()
-            obj_dict = model.objects.values(*fields).get(pk=obj_id)
-        else:
-            obj_dict = dict((field, getattr(obj, field)) for field in fields)
+        documents = {}
+        for obj in cls.get_model().objects.filter(pk__in=ids).values(*fields):
+            d = {}
+            d["id"] = obj["id"]
+            d["model"] = cls.get_mapping_type_name()
 
-        d = {}
-        d["id"] = obj_dict["id"]
-        d["model"] = cls.get_mapping_type_name()
+            d["indexed_on"] = int(time.time())
 
-        d["indexed_on"] = int(time.time())
+            d["created"] = obj["created"]
 
-        d["created"] = obj_dict["created"]
+            d["locale"] = obj["locale"]
+            d["creator_id"] = obj["user_id"]
 
-        d["locale"] = obj_dict["locale"]
-        d["creator_id"] = obj_dict["user_id"]
+            documents[obj["id"]] = d
 
-        return d
+        return documents
 
 
 register_for_indexing("replies", Reply)
@@ -143,3 +142,11 @@ register_for_indexing("replies", Reply)
 register_for_indexing(
     "users", Reply, instance_to_indexee=(lambda i: get_profile(i.user) if i.user else None)
 )
+
+
+def reply_contributed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_last_contribution_date(instance.user_id, instance.created)
+
+
+post_save.connect(reply_contributed, sender=Reply, dispatch_uid="reply_last_contribution_date")
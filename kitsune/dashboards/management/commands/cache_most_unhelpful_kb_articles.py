@@ -1,9 +1,28 @@
+from datetime import date, timedelta
+
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db import connection
+from django.db.models import F, Sum
 
 from kitsune.sumo.redis_utils import redis_client
-from kitsune.wiki.models import Document
+from kitsune.wiki.models import Document, HelpfulVoteDaily
+
+
+def _get_unhelpful(start, end):
+    """Return the en-US documents that got more Not Helpful than Helpful
+    votes from `start` up to, but not including, `end`.
+
+    Returns a list of (document id, helpful votes, not helpful votes).
+    """
+    return (
+        HelpfulVoteDaily.objects.filter(
+            date__gte=start, date__lt=end, revision__document__locale="en-US"
+        )
+        .values("revision__document_id")
+        .annotate(yes=Sum("helpful"), no=Sum("unhelpful"))
+        .filter(no__gt=F("yes"))
+        .values_list("revision__document_id", "yes", "no")
+    )
 
 
 def _get_old_unhelpful():
@@ -13,36 +32,11 @@ def _get_old_unhelpful():
     """
 
     old_formatted = {}
-    cursor = connection.cursor()
-
-    cursor.execute(
-        """SELECT doc_id, yes, no
-        FROM
-            (SELECT wiki_revision.document_id as doc_id,
-                SUM(limitedvotes.helpful) as yes,
-                SUM(NOT(limitedvotes.helpful)) as no
-            FROM
-                (SELECT * FROM wiki_helpfulvote
-                    WHERE created <= DATE_SUB(CURDATE(), INTERVAL 1 WEEK)
-                    AND created >= DATE_SUB(DATE_SUB(CURDATE(),
-                        INTERVAL 1 WEEK), INTERVAL 1 WEEK)
-                ) as limitedvotes
-            INNER JOIN wiki_revision ON
-                limitedvotes.revision_id=wiki_revision.id
-            INNER JOIN wiki_document ON
-                wiki_document.id=wiki_revision.document_id
-            WHERE wiki_document.locale="en-US"
-            GROUP BY doc_id
-            HAVING no > yes
-            ) as calculated"""
-    )
-
-    old_data = cursor.fetchall()
+    today = date.today()
 
-    for data in old_data:
-        doc_id = data[0]
-        yes = float(data[1])
-        no = float(data[2])
+    for doc_id, yes, no in _get_unhelpful(today - timedelta(weeks=2), today - timedelta(weeks=1)):
+        yes = float(yes)
+        no = float(no)
         total = yes + no
         if total == 0:
             continue
@@ -55,34 +49,11 @@ def _get_current_unhelpful(old_formatted):
     """Gets the data for the past week and formats it as return value."""
 
     final = {}
-    cursor = connection.cursor()
-
-    cursor.execute(
-        """SELECT doc_id, yes, no
-        FROM
-            (SELECT wiki_revision.document_id as doc_id,
-                SUM(limitedvotes.helpful) as yes,
-                SUM(NOT(limitedvotes.helpful)) as no
-            FROM
-                (SELECT * FROM wiki_helpfulvote
-                    WHERE created >= DATE_SUB(CURDATE(), INTERVAL 1 WEEK)
-                ) as limitedvotes
-            INNER JOIN wiki_revision ON
-                limitedvotes.revision_id=wiki_revision.id
-            INNER JOIN wiki_document ON
-                wiki_document.id=wiki_revision.document_id
-            WHERE wiki_document.locale="en-US"
-            GROUP BY doc_id
-            HAVING no > yes
-            ) as calculated"""
-    )
+    today = date.today()
 
-    current_data = cursor.fetchall()
-
-    for data in current_data:
-        doc_id = data[0]
-        yes = float(data[1])
-        no = float(data[2])
+    for doc_id, yes, no in _get_unhelpful(today - timedelta(weeks=1), today + timedelta(days=1)):
+        yes = float(yes)
+        no = float(no)
         total = yes + no
         if total == 0:
             continue
@@ -141,14 +112,18 @@ class Command(BaseCommand):
 
         redis = redis_client("helpfulvotes")
 
-        redis.delete(REDIS_KEY)
-
         max_total = max([b[1] for b in sorted_final])
+        docs = Document.objects.in_bulk([entry[0] for entry in sorted_final])
 
+        # Build the new list under another key and swap it in at once, so
+        # the readout never sees it empty or half done.
+        tmp_key = "%s:tmp" % REDIS_KEY
+        pipe = redis.pipeline()
+        pipe.delete(tmp_key)
         for entry in sorted_final:
-            doc = Document.objects.get(pk=entry[0])
-            redis.rpush(
-                REDIS_KEY,
+            doc = docs[entry[0]]
+            pipe.rpush(
+                tmp_key,
                 (
                     "%s::%s::%s::%s::%s::%s::%s"
                     % (
@@ -162,3 +137,5 @@ class Command(BaseCommand):
                     )
                 ),
             )
+        pipe.rename(tmp_key, REDIS_KEY)
+        pipe.execute()
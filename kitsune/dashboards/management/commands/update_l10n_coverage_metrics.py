@@ -4,10 +4,17 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from kitsune.dashboards.models import L10N_ALL_CODE, L10N_TOP20_CODE, L10N_TOP100_CODE, WikiMetric
-from kitsune.dashboards.readouts import l10n_overview_rows
+from kitsune.dashboards.readouts import compute_l10n_coverage
 from kitsune.products.models import Product
 
 
+def _percent(numerator, denominator):
+    try:
+        return 100.0 * float(numerator) / denominator
+    except ZeroDivisionError:
+        return 0.0
+
+
 class Command(BaseCommand):
     help = "Calculate and store the l10n metrics for each locale/product."
 
@@ -15,58 +22,42 @@ class Command(BaseCommand):
         """
         The metrics are:
         * Percent localized of top 20 articles
+        * Percent localized of top 100 articles
         * Percent localized of all articles
         """
         today = date.today()
 
-        # Loop through all locales.
-        for locale in settings.SUMO_LANGUAGES:
-
-            # Skip en-US, it is always 100% localized.
-            if locale == settings.WIKI_DEFAULT_LANGUAGE:
-                continue
-
-            # Loop through all enabled products, including None (really All).
-            for product in [None] + list(Product.objects.filter(visible=True)):
-
-                # (Ab)use the l10n_overview_rows helper from the readouts.
-                rows = l10n_overview_rows(locale=locale, product=product)
-
-                # % of top 20 articles
-                top20 = rows["top-20"]
-
-                try:
-                    percent = 100.0 * float(top20["numerator"]) / top20["denominator"]
-                except ZeroDivisionError:
-                    percent = 0.0
-
-                WikiMetric.objects.create(
-                    code=L10N_TOP20_CODE, locale=locale, product=product, date=today, value=percent
-                )
-
-                # % of top 100 articles
-                top100 = rows["top-100"]
-
-                try:
-                    percent = 100.0 * float(top100["numerator"]) / top100["denominator"]
-                except ZeroDivisionError:
-                    percent = 0.0
-
-                WikiMetric.objects.create(
-                    code=L10N_TOP100_CODE,
-                    locale=locale,
-                    product=product,
-                    date=today,
-                    value=percent,
-                )
-
-                # % of all articles
-                all_ = rows["all"]
-                try:
-                    percent = 100 * float(all_["numerator"]) / all_["denominator"]
-                except ZeroDivisionError:
-                    percent = 0.0
-
-                WikiMetric.objects.create(
-                    code=L10N_ALL_CODE, locale=locale, product=product, date=today, value=percent
-                )
+        # All locales, skipping en-US, it is always 100% localized.
+        locales = [
+            locale
+            for locale in settings.SUMO_LANGUAGES
+            if locale != settings.WIKI_DEFAULT_LANGUAGE
+        ]
+        # All enabled products, including None (really All).
+        products = [None] + list(Product.objects.filter(visible=True))
+
+        # This works out the coverage of everything in one go, which also
+        # primes the cache behind the dashboards' overview.
+        coverage = compute_l10n_coverage(locales)
+
+        metrics = []
+        for locale in locales:
+            for product in products:
+                counts = coverage[(locale, product.id if product else None)]
+                total_docs = counts["total_docs"]
+                for code, numerator, denominator in [
+                    (L10N_TOP20_CODE, counts["top_20"], min(20, total_docs)),
+                    (L10N_TOP100_CODE, counts["top_100"], min(100, total_docs)),
+                    (L10N_ALL_CODE, counts["translated_docs"], total_docs),
+                ]:
+                    metrics.append(
+                        WikiMetric(
+                            code=code,
+                            locale=locale,
+                            product=product,
+                            date=today,
+                            value=_percent(numerator, denominator),
+                        )
+                    )
+
+        WikiMetric.objects.bulk_create(metrics)
@@ -2,15 +2,17 @@ import logging
 from datetime import date, timedelta
 
 from django.conf import settings
-from django.db import connection, close_old_connections
+from django.db import close_old_connections
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.utils.translation import ugettext_lazy as _lazy
 
 from kitsune.dashboards import LAST_7_DAYS, LAST_30_DAYS, LAST_90_DAYS, ALL_TIME, PERIODS
 from kitsune.products.models import Product
 from kitsune.sumo.models import ModelBase, LocaleField
 from kitsune.sumo import googleanalytics
-from kitsune.wiki.models import Document
+from kitsune.sumo.utils import bulk_upsert, bump_cache_generation, chunked
+from kitsune.wiki.models import Document, Revision
 
 
 log = logging.getLogger("k.dashboards")
@@ -51,25 +53,91 @@ class WikiDocumentVisits(ModelBase):
             # them out at 5 minutes and the GA calls take forever.
             close_old_connections()
 
-            # Delete and remake the rows:
-            # Horribly inefficient until
-            # http://code.djangoproject.com/ticket/9519 is fixed.
-            # cls.objects.filter(period=period).delete()
-
-            # Instead, we use raw SQL!
-            cursor = connection.cursor()
-            cursor.execute(
-                "DELETE FROM `dashboards_wikidocumentvisits`" "    WHERE `period` = %s", [period]
-            )
-
-            # Now we create them again with fresh data.
-            for doc_id, visits in counts.items():
-                cls.objects.create(document=Document(pk=doc_id), visits=visits, period=period)
+            # Update the rows in place, so the stats don't go missing while
+            # they're reloaded, and then drop the ones GA no longer has.
+            bulk_upsert(cls, "document", counts, "visits", period=period)
+            stale = set(
+                cls.objects.filter(period=period).values_list("document_id", flat=True)
+            ) - set(counts)
+            for chunk in chunked(list(stale), 1000):
+                cls.objects.filter(period=period, document_id__in=chunk).delete()
+
+            if period == LAST_30_DAYS:
+                invalidate_l10n_coverage()
+            invalidate_readouts()
         else:
             # Don't erase interesting data if there's nothing to replace it:
             log.warning("Google Analytics returned no interesting data," " so I kept what I had.")
 
 
+# Holds the l10n coverage generation. It's part of the key of the cached
+# coverage (see kitsune.dashboards.readouts.l10n_coverage), so bumping it
+# invalidates all of it.
+L10N_COVERAGE_GENERATION_KEY = "dashboards:l10n_coverage_generation"
+
+
+def invalidate_l10n_coverage(**kwargs):
+    """Forget the cached l10n coverage of all locales.
+
+    This is connected to the signals of the models it's computed from.
+
+    """
+    bump_cache_generation(L10N_COVERAGE_GENERATION_KEY)
+
+
+for sender in (Document, Revision):
+    post_save.connect(invalidate_l10n_coverage, sender=sender, dispatch_uid="l10n_coverage_save")
+    post_delete.connect(
+        invalidate_l10n_coverage, sender=sender, dispatch_uid="l10n_coverage_delete"
+    )
+m2m_changed.connect(
+    invalidate_l10n_coverage,
+    sender=Document.products.through,
+    dispatch_uid="l10n_coverage_products",
+)
+
+
+# Hold the generations of the cached readout rows, one for the readouts
+# of each locale and one for all of them. They're part of the keys of
+# the cached rows (see kitsune.dashboards.readouts.Readout.rows).
+READOUTS_GENERATION_KEY = "dashboards:readouts_generation:%s"
+
+
+def invalidate_readouts(locale=None, **kwargs):
+    """Forget the cached readout rows of locale, or of all locales."""
+    bump_cache_generation(READOUTS_GENERATION_KEY % (locale or "all"))
+
+
+def invalidate_readouts_for_instance(sender, instance, **kwargs):
+    """Forget the cached readout rows an edit to a document or revision
+    affects.
+
+    English documents show up in the readouts of every locale, others
+    only in the readouts of their own locale.
+
+    """
+    try:
+        locale = instance.locale if isinstance(instance, Document) else instance.document.locale
+    except Document.DoesNotExist:
+        locale = None
+
+    if locale == settings.WIKI_DEFAULT_LANGUAGE:
+        locale = None
+    invalidate_readouts(locale)
+
+
+for sender in (Document, Revision):
+    post_save.connect(
+        invalidate_readouts_for_instance, sender=sender, dispatch_uid="readouts_save"
+    )
+    post_delete.connect(
+        invalidate_readouts_for_instance, sender=sender, dispatch_uid="readouts_delete"
+    )
+m2m_changed.connect(
+    invalidate_readouts, sender=Document.products.through, dispatch_uid="readouts_products"
+)
+
+
 L10N_TOP20_CODE = "percent_localized_top20"
 L10N_TOP100_CODE = "percent_localized_top100"
 L10N_ALL_CODE = "percent_localized_all"
@@ -5,24 +5,40 @@ is_localizable=False or is_archived=True and Revisions with
 is_ready_for_localization=False do not exist.
 
 """
+import hashlib
+import json
 import logging
 
 from collections import OrderedDict
 from datetime import datetime
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connections, router
+from django.db.models import Case, CharField, Exists, F, Max, OuterRef, Subquery, When
 from django.template.loader import render_to_string
-from django.utils.translation import ugettext as _, ugettext_lazy as _lazy, pgettext_lazy
+from django.utils.translation import (
+    get_language,
+    ugettext as _,
+    ugettext_lazy as _lazy,
+    pgettext_lazy,
+)
 
 from jinja2 import Markup
 
 from kitsune.dashboards import LAST_30_DAYS, PERIODS
+from kitsune.dashboards.models import (
+    L10N_COVERAGE_GENERATION_KEY,
+    READOUTS_GENERATION_KEY,
+    WikiDocumentVisits,
+)
+from kitsune.products.models import Product
 from kitsune.questions.models import QuestionLocale
 from kitsune.sumo.templatetags.jinja_helpers import urlparams
 from kitsune.sumo.redis_utils import redis_client, RedisError
 from kitsune.sumo.urlresolvers import reverse
-from kitsune.wiki.models import Document
+from kitsune.sumo.utils import get_cache_generation
+from kitsune.wiki.models import Document, Revision
 from kitsune.wiki.config import (
     MEDIUM_SIGNIFICANCE,
     MAJOR_SIGNIFICANCE,
@@ -37,6 +53,8 @@ from kitsune.wiki.config import (
 
 log = logging.getLogger("k.dashboards.readouts")
 
+L10N_COVERAGE_CACHE_TIMEOUT = 24 * 60 * 60  # 24 hours
+
 
 MOST_VIEWED = 1
 MOST_RECENT = 2
@@ -225,16 +243,38 @@ def kb_overview_rows(mode=None, max=None, locale=None, product=None, category=No
     if category:
         docs = docs.filter(category__in=[category])
 
+    # Whether the document has a revision that's ready for l10n, and
+    # the comment of the first revision that's waiting for review since
+    # the current one. Without a current revision, any revision is.
+    revisions = Revision.objects.filter(document=OuterRef("pk")).order_by("id")
+    docs = docs.select_related("current_revision").annotate(
+        ready_for_l10n=Exists(revisions.filter(is_approved=True, is_ready_for_localization=True)),
+        unapproved_comment=Case(
+            When(current_revision__isnull=True, then=Subquery(revisions.values("comment")[:1])),
+            default=Subquery(
+                revisions.filter(reviewed=None, id__gt=OuterRef("current_revision_id")).values(
+                    "comment"
+                )[:1]
+            ),
+            output_field=CharField(),
+        ),
+    )
+
     docs = docs.order_by("-num_visits", "title")
 
     if max:
         docs = docs[:max]
 
-    rows = []
-
-    if docs.count():
+    docs = list(docs)
+    if docs:
         max_visits = docs[0].num_visits
 
+    # Get the translated docs
+    needs_update = {}
+    if locale != settings.WIKI_DEFAULT_LANGUAGE and docs:
+        needs_update = _translations_outdated(locale, [d.id for d in docs])
+
+    rows = []
     for d in docs:
         data = {
             "url": reverse("wiki.document", args=[d.slug], locale=settings.WIKI_DEFAULT_LANGUAGE),
@@ -243,9 +283,7 @@ def kb_overview_rows(mode=None, max=None, locale=None, product=None, category=No
             ),
             "title": d.title,
             "num_visits": d.num_visits,
-            "ready_for_l10n": d.revisions.filter(
-                is_approved=True, is_ready_for_localization=True
-            ).exists(),
+            "ready_for_l10n": d.ready_for_l10n,
         }
 
         if d.current_revision:
@@ -258,22 +296,14 @@ def kb_overview_rows(mode=None, max=None, locale=None, product=None, category=No
             data["stale"] = data["expiry_date"] < datetime.now()
 
         # Check L10N status
-        if d.current_revision:
-            unapproved_revs = d.revisions.filter(reviewed=None, id__gt=d.current_revision.id)[:1]
-        else:
-            unapproved_revs = d.revisions.all()
-
-        if unapproved_revs.count():
-            data["revision_comment"] = unapproved_revs[0].comment
+        if d.unapproved_comment is not None:
+            data["revision_comment"] = d.unapproved_comment
         else:
             data["latest_revision"] = True
 
-        # Get the translated doc
         if locale != settings.WIKI_DEFAULT_LANGUAGE:
-            transdoc = d.translations.filter(locale=locale, is_archived=False).first()
-
-            if transdoc:
-                data["needs_update"] = transdoc.is_outdated()
+            if d.id in needs_update:
+                data["needs_update"] = needs_update[d.id]
         else:  # For en-US we show the needs_changes comment.
             data["needs_update"] = d.needs_change
             data["needs_update_comment"] = d.needs_change_comment
@@ -283,137 +313,273 @@ def kb_overview_rows(mode=None, max=None, locale=None, product=None, category=No
     return rows
 
 
-def l10n_overview_rows(locale, product=None):
-    """Return the iterable of dicts needed to draw the Overview table."""
-    # The Overview table is a special case: it has only a static number of
-    # rows, so it has no expanded, all-rows view, and thus needs no slug, no
-    # "max" kwarg on rows(), etc. It doesn't fit the Readout signature, so we
-    # don't shoehorn it in.
+def _translations_outdated(locale, parent_ids, level=MEDIUM_SIGNIFICANCE):
+    """Return {parent id: whether its translation is outdated} for the
+    unarchived translations into locale of the given documents.
 
-    def percent_or_100(num, denom):
-        return int(round(num / float(denom) * 100)) if denom else 100
+    This is Document.is_outdated() for all of them in one query.
 
-    def single_result(sql, params):
-        """Return the first column of the first row returned by a query."""
-        cursor = _cursor()
-        cursor.execute(sql, params)
-        return cursor.fetchone()[0]
-
-    total = Document.objects.filter(
-        locale=settings.WIKI_DEFAULT_LANGUAGE,
-        is_archived=False,
-        current_revision__isnull=False,
-        is_localizable=True,
-        latest_localizable_revision__isnull=False,
+    """
+    ready = Revision.objects.filter(
+        document=OuterRef("parent"),
+        is_approved=True,
+        is_ready_for_localization=True,
+        significance__gte=level,
+    )
+    translations = (
+        Document.objects.filter(locale=locale, parent__in=parent_ids, is_archived=False)
+        .annotate(
+            current_based_on_id=F("current_revision__based_on"),
+            any_ready=Exists(ready),
+            ready_since_based_on=Exists(
+                ready.filter(id__gt=OuterRef("current_revision__based_on"))
+            ),
+        )
+        .values_list(
+            "parent_id",
+            "current_revision_id",
+            "current_based_on_id",
+            "any_ready",
+            "ready_since_based_on",
+        )
     )
-    total = total.exclude(html__startswith=REDIRECT_HTML)
 
-    if product:
-        total = total.filter(products=product)
-        has_forum = product.questions_locales.filter(locale=locale).exists()
+    outdated = {}
+    for parent_id, current_id, based_on_id, any_ready, ready_since in translations:
+        if not current_id:
+            outdated[parent_id] = False
+        elif based_on_id:
+            outdated[parent_id] = ready_since
+        else:
+            outdated[parent_id] = any_ready
+    return outdated
 
-    ignore_categories = [
-        str(ADMINISTRATION_CATEGORY),
-        str(NAVIGATION_CATEGORY),
-        str(HOW_TO_CONTRIBUTE_CATEGORY),
-    ]
 
-    if product and not has_forum:
-        ignore_categories.append(str(CANNED_RESPONSES_CATEGORY))
+def _l10n_ignored_categories(canned_responses=True):
+    """Return the categories the l10n overview doesn't count."""
+    ignore_categories = [ADMINISTRATION_CATEGORY, NAVIGATION_CATEGORY, HOW_TO_CONTRIBUTE_CATEGORY]
+    if not canned_responses:
+        ignore_categories.append(CANNED_RESPONSES_CATEGORY)
+    return ignore_categories
 
-    total = total.exclude(category__in=ignore_categories)
 
-    total_docs = total.filter(is_template=False).count()
-    total_templates = total.filter(is_template=True).count()
+def compute_l10n_coverage(locales):
+    """Work out how much of the KB is translated into each of locales.
 
-    if product:
-        extra_joins = PRODUCT_FILTER
-        prod_param = (product.id,)
-    else:
-        extra_joins = ""
-        prod_param = tuple()
-
-    # Translations whose based_on revision has no >10-significance, ready-for-
-    # l10n revisions after it. It *might* be possible to do this with the ORM
-    # by passing wheres and tables to extra():
-    up_to_date_translation_count = (
-        "SELECT COUNT(*) FROM wiki_document transdoc "
-        "INNER JOIN wiki_document engdoc ON transdoc.parent_id=engdoc.id "
-        "INNER JOIN wiki_revision curtransrev "
-        "    ON transdoc.current_revision_id=curtransrev.id "
-        + extra_joins
-        + "WHERE transdoc.locale=%s "
-        "    AND engdoc.category NOT IN "
-        "        (" + ",".join(ignore_categories) + ")"
-        "    AND transdoc.is_template=%s "
-        "    AND NOT transdoc.is_archived "
-        "    AND NOT engdoc.is_archived "
-        "    AND engdoc.latest_localizable_revision_id IS NOT NULL "
-        "    AND engdoc.is_localizable "
-        '    AND engdoc.html NOT LIKE "<p>REDIRECT <a%%" '
-        "    AND NOT EXISTS " + ANY_SIGNIFICANT_UPDATES
-    )
-    translated_docs = single_result(
-        up_to_date_translation_count, prod_param + (locale, False, MEDIUM_SIGNIFICANCE)
-    )
-    translated_templates = single_result(
-        up_to_date_translation_count, prod_param + (locale, True, MEDIUM_SIGNIFICANCE)
-    )
+    This covers every product (and no product, meaning all of them) at
+    once, from a handful of queries that each scan the table they read
+    once, no matter how many locales and products there are.
+
+    Returns {(locale, product id or None): coverage}, where coverage is
+    a dict with:
+
+    * total_docs, total_templates: how many articles and templates are
+      ready to be translated
+    * translated_docs, translated_templates: how many of those have a
+      translation with no significant changes to the English since
+    * top_20, top_50, top_100: how many of the top N most visited
+      articles in the last 30 days have one
 
-    # Of the top N most visited English articles, how many have up-to-date
-    # translations into German?
-    #
-    # TODO: Be very suspicious of this query. It selects from a subquery (known
-    # to MySQL's EXPLAIN as a "derived" table), and MySQL always materializes
-    # such subqueries and never builds indexes on them. However, it seems to be
-    # fast in practice.
-    top_n_query = (
-        "SELECT SUM(istranslated) FROM "
-        "    (SELECT transdoc.current_revision_id IS NOT NULL "
-        # And there have been no significant updates since the current
-        # translation:
-        "        AND NOT EXISTS "
-        + ANY_SIGNIFICANT_UPDATES
-        + "        AS istranslated "
-        + most_visited_translation_from(
-            extra_joins="LEFT JOIN wiki_revision curtransrev "
-            "ON transdoc.current_revision_id=curtransrev.id " + extra_joins,
-            extra_where="AND engdoc.category NOT IN ("
-            + ",".join(ignore_categories)
-            + ") "
-            + "AND NOT engdoc.is_template "
-            + 'AND engdoc.html NOT LIKE "<p>REDIRECT <a%%" ',
+    The results are also cached for l10n_coverage().
+
+    """
+    locales = set(locales)
+    # Anything that changes while this runs bumps the generation, so
+    # get it first, or the results could be cached stale.
+    generation = get_cache_generation(L10N_COVERAGE_GENERATION_KEY)
+
+    # The English documents that can be translated.
+    eng_docs = (
+        Document.objects.filter(
+            locale=settings.WIKI_DEFAULT_LANGUAGE,
+            is_archived=False,
+            is_localizable=True,
+            latest_localizable_revision__isnull=False,
         )
-        + "LIMIT %s) t1 "
+        .exclude(html__startswith=REDIRECT_HTML)
+        .values_list("id", "title", "category", "is_template", "current_revision_id")
+    )
+    eng_docs = dict((row[0], row) for row in eng_docs)
+
+    # The latest significant change that's ready to translate, for each
+    # English document. A translation that isn't based on it or a later
+    # revision is out of date.
+    latest_significant = dict(
+        Revision.objects.filter(
+            document__locale=settings.WIKI_DEFAULT_LANGUAGE,
+            is_ready_for_localization=True,
+            significance__gte=MEDIUM_SIGNIFICANCE,
+        )
+        .values_list("document")
+        .annotate(Max("id"))
     )
 
-    top_20_translated = int(
-        single_result(  # Driver returns a Decimal.
-            top_n_query,
-            (MEDIUM_SIGNIFICANCE, locale, LAST_30_DAYS)
-            + prod_param
-            + (settings.WIKI_DEFAULT_LANGUAGE, 20),
+    # The translations. In the top N, a translation all of whose
+    # revisions were rejected is treated as if it didn't exist.
+    translations = {}
+    not_rejected = Revision.objects.filter(document=OuterRef("pk")).exclude(
+        is_approved=False, reviewed__isnull=False
+    )
+    trans_docs = (
+        Document.objects.filter(locale__in=locales, parent__isnull=False)
+        .annotate(not_rejected=Exists(not_rejected))
+        .values_list(
+            "locale",
+            "parent_id",
+            "title",
+            "is_template",
+            "is_archived",
+            "current_revision_id",
+            "current_revision__based_on_id",
+            "not_rejected",
         )
-        or 0
-    )  # SUM can return NULL.
-    top_50_translated = int(
-        single_result(  # Driver returns a Decimal.
-            top_n_query,
-            (MEDIUM_SIGNIFICANCE, locale, LAST_30_DAYS)
-            + prod_param
-            + (settings.WIKI_DEFAULT_LANGUAGE, 50),
+    )
+    for (
+        locale,
+        parent_id,
+        title,
+        is_template,
+        is_archived,
+        current_id,
+        based_on_id,
+        ok,
+    ) in trans_docs:
+        if parent_id not in eng_docs:
+            continue
+        up_to_date = bool(current_id) and not (
+            based_on_id and latest_significant.get(parent_id, 0) > based_on_id
         )
-        or 0
-    )  # SUM can return NULL.
-    top_100_translated = int(
-        single_result(  # Driver returns a Decimal.
-            top_n_query,
-            (MEDIUM_SIGNIFICANCE, locale, LAST_30_DAYS)
-            + prod_param
-            + (settings.WIKI_DEFAULT_LANGUAGE, 100),
+        translations.setdefault(locale, {})[parent_id] = (
+            title,
+            is_template,
+            is_archived,
+            up_to_date,
+            ok,
         )
-        or 0
-    )  # SUM can return NULL.
+
+    visits = dict(
+        WikiDocumentVisits.objects.filter(period=LAST_30_DAYS).values_list("document_id", "visits")
+    )
+
+    doc_products = {}
+    for doc_id, product_id in Document.products.through.objects.filter(
+        document__locale=settings.WIKI_DEFAULT_LANGUAGE
+    ).values_list("document_id", "product_id"):
+        doc_products.setdefault(doc_id, []).append(product_id)
+
+    forum_products = {}
+    for locale, product_id in QuestionLocale.objects.values_list("locale", "products"):
+        forum_products.setdefault(locale, set()).add(product_id)
+
+    product_ids = [None] + list(Product.objects.values_list("id", flat=True))
+    ignored = _l10n_ignored_categories()
+    ignored_without_forum = _l10n_ignored_categories(canned_responses=False)
+    top_n = (20, 50, 100)
+
+    coverage = {}
+    for locale in locales:
+        locale_translations = translations.get(locale, {})
+        has_forum = forum_products.get(locale, set())
+        for product_id in product_ids:
+            coverage[(locale, product_id)] = dict(
+                total_docs=0,
+                total_templates=0,
+                translated_docs=0,
+                translated_templates=0,
+                top_20=0,
+                top_50=0,
+                top_100=0,
+            )
+
+        def counted(doc_id, product_id):
+            if product_id is not None and product_id not in has_forum:
+                return eng_docs[doc_id][2] not in ignored_without_forum
+            return eng_docs[doc_id][2] not in ignored
+
+        for doc_id, (_id, _title, _category, is_template, current_id) in eng_docs.items():
+            trans = locale_translations.get(doc_id)
+            for product_id in [None] + doc_products.get(doc_id, []):
+                if not counted(doc_id, product_id):
+                    continue
+                counts = coverage[(locale, product_id)]
+                if current_id:
+                    counts["total_templates" if is_template else "total_docs"] += 1
+                if trans and not trans[2] and trans[3]:
+                    counts["translated_templates" if trans[1] else "translated_docs"] += 1
+
+        # Most visited first, then by title, the translated one if any.
+        def visited(doc_id):
+            trans = locale_translations.get(doc_id)
+            title = trans[0] if trans and trans[4] else eng_docs[doc_id][1]
+            return (-visits.get(doc_id, -1), title.lower())
+
+        most_visited = sorted((d for d in eng_docs if not eng_docs[d][3]), key=visited)
+        seen = dict((product_id, 0) for product_id in product_ids)
+        for doc_id in most_visited:
+            trans = locale_translations.get(doc_id)
+            translated = bool(trans and trans[4] and trans[3])
+            for product_id in [None] + doc_products.get(doc_id, []):
+                if seen[product_id] >= max(top_n) or not counted(doc_id, product_id):
+                    continue
+                seen[product_id] += 1
+                if translated:
+                    for n in top_n:
+                        if seen[product_id] <= n:
+                            coverage[(locale, product_id)]["top_%s" % n] += 1
+
+    cache.set_many(
+        dict(
+            (_l10n_coverage_key(generation, locale), _locale_coverage(coverage, locale))
+            for locale in locales
+        ),
+        L10N_COVERAGE_CACHE_TIMEOUT,
+    )
+    return coverage
+
+
+def _l10n_coverage_key(generation, locale):
+    return "dashboards:l10n_coverage:%s:%s" % (generation, locale)
+
+
+def _locale_coverage(coverage, locale):
+    return dict(
+        (product_id, counts) for (loc, product_id), counts in coverage.items() if loc == locale
+    )
+
+
+def l10n_coverage(locale, product=None):
+    """Return the coverage of locale, for product if given.
+
+    See compute_l10n_coverage() for what's in it. It's cached until
+    anything it's computed from changes.
+
+    """
+    key = _l10n_coverage_key(get_cache_generation(L10N_COVERAGE_GENERATION_KEY), locale)
+    product_id = product.id if product else None
+    coverage = cache.get(key)
+    if coverage is None or product_id not in coverage:
+        coverage = _locale_coverage(compute_l10n_coverage([locale]), locale)
+    return coverage[product_id]
+
+
+def l10n_overview_rows(locale, product=None):
+    """Return the iterable of dicts needed to draw the Overview table."""
+    # The Overview table is a special case: it has only a static number of
+    # rows, so it has no expanded, all-rows view, and thus needs no slug, no
+    # "max" kwarg on rows(), etc. It doesn't fit the Readout signature, so we
+    # don't shoehorn it in.
+
+    def percent_or_100(num, denom):
+        return int(round(num / float(denom) * 100)) if denom else 100
+
+    coverage = l10n_coverage(locale, product=product)
+    total_docs = coverage["total_docs"]
+    total_templates = coverage["total_templates"]
+    translated_docs = coverage["translated_docs"]
+    translated_templates = coverage["translated_templates"]
+    top_20_translated = coverage["top_20"]
+    top_50_translated = coverage["top_50"]
+    top_100_translated = coverage["top_100"]
 
     return {
         "top-20": {
@@ -522,7 +688,39 @@ class Readout(object):
 
         Limit to `max` rows.
 
+        If DASHBOARD_READOUT_CACHE_TIMEOUT is set, the rows are cached
+        until something they're computed from changes.
+
         """
+        timeout = settings.DASHBOARD_READOUT_CACHE_TIMEOUT
+        if not timeout:
+            return self._rows(max)
+
+        key = self._cache_key(max)
+        rows = cache.get(key)
+        if rows is None:
+            rows = self._rows(max)
+            cache.set(key, rows, timeout)
+        return rows
+
+    def _cache_key(self, max):
+        """Return the key the rows are cached under."""
+        params = [
+            self.locale,
+            self.product.id if self.product else None,
+            self.mode,
+            max,
+            # Some rows are translated when they're made.
+            get_language(),
+            get_cache_generation(READOUTS_GENERATION_KEY % "all"),
+            get_cache_generation(READOUTS_GENERATION_KEY % self.locale),
+        ]
+        return "dashboards:readout:%s:%s" % (
+            self.slug,
+            hashlib.md5(json.dumps(params).encode()).hexdigest(),
+        )
+
+    def _rows(self, max):
         cursor = _cursor()
         cursor.execute(*self._query_and_params(max))
         return self.sort_and_truncate([self._format_row(r) for r in cursor.fetchall()], max)
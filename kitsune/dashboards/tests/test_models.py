@@ -3,7 +3,12 @@ from unittest.mock import patch
 from nose.tools import eq_
 
 from kitsune.dashboards import models
-from kitsune.dashboards.models import WikiDocumentVisits, LAST_7_DAYS, googleanalytics
+from kitsune.dashboards.models import (
+    WikiDocumentVisits,
+    LAST_7_DAYS,
+    LAST_30_DAYS,
+    googleanalytics,
+)
 from kitsune.sumo.tests import TestCase
 from kitsune.wiki.tests import ApprovedRevisionFactory
 
@@ -35,6 +40,31 @@ class DocumentVisitsTests(TestCase):
         wdv2 = WikiDocumentVisits.objects.get(document=d2)
         eq_(LAST_7_DAYS, wdv2.period)
 
+    @patch.object(models, "close_old_connections")
+    @patch.object(googleanalytics, "pageviews_by_document")
+    def test_reload_replaces_stats(self, pageviews_by_document, close_old_connections):
+        """Reloading updates, adds and drops rows, leaving other periods be."""
+        d1 = ApprovedRevisionFactory().document
+        d2 = ApprovedRevisionFactory().document
+        d3 = ApprovedRevisionFactory().document
+        WikiDocumentVisits.objects.create(document=d1, visits=1, period=LAST_30_DAYS)
+
+        pageviews_by_document.return_value = {d1.id: 10, d2.id: 20}
+        WikiDocumentVisits.reload_period_from_analytics(LAST_7_DAYS)
+
+        pageviews_by_document.return_value = {d2.id: 25, d3.id: 30, 123459: 3}
+        WikiDocumentVisits.reload_period_from_analytics(LAST_7_DAYS)
+
+        eq_(
+            {d2.id: 25, d3.id: 30},
+            dict(
+                WikiDocumentVisits.objects.filter(period=LAST_7_DAYS).values_list(
+                    "document_id", "visits"
+                )
+            ),
+        )
+        eq_(1, WikiDocumentVisits.objects.get(period=LAST_30_DAYS).visits)
+
 
 PAGEVIEWS_BY_DOCUMENT_RESPONSE = {
     "kind": "analytics#gaData",
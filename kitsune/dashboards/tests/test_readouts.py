@@ -2,11 +2,13 @@ from datetime import datetime
 
 from kitsune.sumo.models import ModelBase
 from django.conf import settings
+from django.test.utils import override_settings
 
 from nose.tools import eq_
 
 from kitsune.dashboards.readouts import (
     UnreviewedReadout,
+    compute_l10n_coverage,
     kb_overview_rows,
     TemplateTranslationsReadout,
     l10n_overview_rows,
@@ -92,6 +94,28 @@ class KBOverviewTests(TestCase):
         eq_(0, len(kb_overview_rows(category=CATEGORIES[0][0])))
         eq_(1, len(kb_overview_rows(category=CATEGORIES[1][0])))
 
+    def test_review_and_translation_status(self):
+        trans = TranslatedRevisionFactory(document__locale="de")
+        parent = trans.document.parent
+        RevisionFactory(document=parent, comment="Please review", is_approved=False)
+        for i in range(3):
+            TranslatedRevisionFactory(document__locale="de")
+
+        with self.assertNumQueries(2):
+            data = kb_overview_rows(locale="de")
+        eq_(4, len(data))
+        row = [r for r in data if r["title"] == parent.title][0]
+        eq_("Please review", row["revision_comment"])
+        eq_(False, row["needs_update"])
+
+        ApprovedRevisionFactory(
+            document=parent, is_ready_for_localization=True, significance=MAJOR_SIGNIFICANCE
+        )
+        row = [r for r in kb_overview_rows(locale="de") if r["title"] == parent.title][0]
+        assert "revision_comment" not in row
+        eq_(True, row["latest_revision"])
+        eq_(True, row["needs_update"])
+
 
 class L10NOverviewTests(TestCase):
     """Tests for Overview readout"""
@@ -310,6 +334,36 @@ class L10NOverviewTests(TestCase):
         eq_(1, overview["all"]["denominator"])
         eq_(1, overview["all"]["numerator"])
 
+    def test_cached_until_changed(self):
+        """The overview is cached until a document or revision changes."""
+        t = TranslatedRevisionFactory(document__locale="de", is_approved=True)
+        eq_(1, l10n_overview_rows("de")["all"]["numerator"])
+
+        with self.assertNumQueries(0):
+            eq_(1, l10n_overview_rows("de")["all"]["numerator"])
+
+        ApprovedRevisionFactory(
+            document=t.document.parent,
+            significance=MEDIUM_SIGNIFICANCE,
+            is_ready_for_localization=True,
+        )
+        eq_(0, l10n_overview_rows("de")["all"]["numerator"])
+
+    def test_coverage_for_all_locales_and_products(self):
+        """compute_l10n_coverage agrees with the overview of each locale."""
+        p = ProductFactory()
+        t = TranslatedRevisionFactory(document__locale="de", is_approved=True)
+        t.document.parent.products.add(p)
+        TranslatedRevisionFactory(document__locale="fr", is_approved=True)
+
+        coverage = compute_l10n_coverage(["de", "fr"])
+        eq_(1, coverage[("de", p.id)]["translated_docs"])
+        eq_(1, coverage[("de", p.id)]["top_20"])
+        eq_(1, coverage[("de", None)]["translated_docs"])
+        eq_(2, coverage[("de", None)]["total_docs"])
+        eq_(0, coverage[("fr", p.id)]["translated_docs"])
+        eq_(1, coverage[("fr", None)]["top_100"])
+
 
 class UnreviewedChangesTests(ReadoutTestCase):
     """Tests for the Unreviewed Changes readout
@@ -360,6 +414,21 @@ class UnreviewedChangesTests(ReadoutTestCase):
         unreviewed.document.parent.products.add(p)
         eq_(self.row(product=p)["title"], unreviewed.document.title)
 
+    @override_settings(DASHBOARD_READOUT_CACHE_TIMEOUT=60)
+    def test_cached_until_changed(self):
+        """Rows are cached until a revision in the locale changes."""
+        unreviewed = TranslatedRevisionFactory(
+            is_approved=False, reviewed=None, document__locale="de"
+        )
+        eq_([unreviewed.document.title], self.titles())
+
+        with self.assertNumQueries(0):
+            eq_([unreviewed.document.title], self.titles())
+
+        unreviewed.reviewed = datetime.now()
+        unreviewed.save()
+        eq_([], self.titles())
+
 
 class MostVisitedDefaultLanguageTests(ReadoutTestCase):
     """Tests for the Most Visited Default Language readout."""
@@ -238,52 +238,54 @@ class ThreadMappingType(SearchMappingType):
         }
 
     @classmethod
-    def extract_document(cls, obj_id, obj=None):
-        """Extracts interesting thing from a Thread and its Posts"""
-        if obj is None:
-            model = cls.get_model()
-            obj = model.objects.select_related("last_post").get(pk=obj_id)
-
-        d = {}
-        d["id"] = obj.id
-        d["model"] = cls.get_mapping_type_name()
-        d["url"] = obj.get_absolute_url()
-        d["indexed_on"] = int(time.time())
-
-        # TODO: Sphinx stores created and updated as seconds since the
-        # epoch, so we convert them to that format here so that the
-        # search view works correctly. When we ditch Sphinx, we should
-        # see if it's faster to filter on ints or whether we should
-        # switch them to dates.
-        d["created"] = int(time.mktime(obj.created.timetuple()))
-
-        if obj.last_post is not None:
-            d["updated"] = int(time.mktime(obj.last_post.created.timetuple()))
-        else:
-            d["updated"] = None
-
-        d["post_forum_id"] = obj.forum.id
-        d["post_title"] = obj.title
-        d["post_is_sticky"] = obj.is_sticky
-        d["post_is_locked"] = obj.is_locked
-
-        d["post_replies"] = obj.replies
-
-        author_ids = set()
-        author_ords = set()
-        content = []
-
-        posts = Post.objects.filter(thread_id=obj.id).select_related("author")
-        for post in posts:
-            author_ids.add(post.author.id)
-            author_ords.add(post.author.username)
-            content.append(post.content)
-
-        d["post_author_id"] = list(author_ids)
-        d["post_author_ord"] = list(author_ords)
-        d["post_content"] = content
-
-        return d
+    def extract_documents(cls, ids):
+        """Extracts interesting thing from Threads and their Posts"""
+        objs = list(
+            cls.get_model().objects.filter(pk__in=ids).select_related("last_post", "forum")
+        )
+
+        posts = {}
+        post_values = Post.objects.filter(thread__in=[obj.id for obj in objs]).values_list(
+            "thread_id", "author_id", "author__username", "content"
+        )
+        for thread_id, author_id, author_username, content in post_values:
+            posts.setdefault(thread_id, []).append((author_id, author_username, content))
+
+        documents = {}
+        for obj in objs:
+            d = {}
+            d["id"] = obj.id
+            d["model"] = cls.get_mapping_type_name()
+            d["url"] = obj.get_absolute_url()
+            d["indexed_on"] = int(time.time())
+
+            # TODO: Sphinx stores created and updated as seconds since the
+            # epoch, so we convert them to that format here so that the
+            # search view works correctly. When we ditch Sphinx, we should
+            # see if it's faster to filter on ints or whether we should
+            # switch them to dates.
+            d["created"] = int(time.mktime(obj.created.timetuple()))
+
+            if obj.last_post is not None:
+                d["updated"] = int(time.mktime(obj.last_post.created.timetuple()))
+            else:
+                d["updated"] = None
+
+            d["post_forum_id"] = obj.forum.id
+            d["post_title"] = obj.title
+            d["post_is_sticky"] = obj.is_sticky
+            d["post_is_locked"] = obj.is_locked
+
+            d["post_replies"] = obj.replies
+
+            thread_posts = posts.get(obj.id, [])
+            d["post_author_id"] = list(set(p[0] for p in thread_posts))
+            d["post_author_ord"] = list(set(p[1] for p in thread_posts))
+            d["post_content"] = [p[2] for p in thread_posts]
+
+            documents[obj.id] = d
+
+        return documents
 
 
 register_for_indexing("forums", Thread)
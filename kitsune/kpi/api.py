@@ -1,3 +1,5 @@
+import time
+import uuid
 from collections import defaultdict
 from datetime import date, timedelta
 from operator import itemgetter
@@ -5,6 +7,8 @@ from operator import itemgetter
 from django.core.cache import cache
 from django.db import connections, router
 from django.db.models import Count, F
+from django.http import HttpRequest, QueryDict
+from django.utils.http import urlencode
 
 import django_filters
 from django_filters.rest_framework import DjangoFilterBackend
@@ -26,8 +30,12 @@ from kitsune.kpi.models import (
     EXIT_SURVEY_YES_CODE,
     EXIT_SURVEY_NO_CODE,
     EXIT_SURVEY_DONT_KNOW_CODE,
+    KPI_API_GENERATION_KEY,
 )
+from kitsune.kpi.tasks import refresh_cached_api_view
 from kitsune.questions.models import Question, Answer, AnswerVote
+from kitsune.search.utils import to_class_path
+from kitsune.sumo.utils import get_cache_generation
 from kitsune.wiki.models import HelpfulVote
 from functools import reduce
 
@@ -35,26 +43,89 @@ from functools import reduce
 class CachedAPIView(APIView):
     """An APIView that caches the objects to be returned.
 
+    The objects stay fresh for ``cache_timeout`` seconds, or until new
+    metrics are written. Stale objects are still returned for up to
+    ``stale_timeout`` seconds while a celery task computes them again,
+    so that a burst of requests doesn't compute them all at once.
+
     Subclasses must implement the get_objects() method.
     """
 
+    cache_timeout = 60 * 60 * 3
+    stale_timeout = 60 * 60 * 24
+    # How long to wait for the objects to be computed before someone else
+    # gives it a go.
+    lock_timeout = 60 * 5
+
     def _cache_key(self, request):
         params = []
         for key, value in list(request.GET.items()):
             params.append("%s=%s" % (key, value))
-        return "{viewname}:{params}".format(
+        return "kpi:api:{viewname}:{params}".format(
             viewname=self.__class__.__name__, params=":".join(sorted(params))
         )
 
     def get(self, request):
         cache_key = self._cache_key(request)
+        lock_key = cache_key + ":lock"
+        # Whoever takes the lock leaves this in it, so that nobody else
+        # lets go of it.
+        token = uuid.uuid4().hex
+
+        cached = cache.get(cache_key)
+        if cached is None:
+            # Nothing to return while waiting, so compute it here. But if
+            # someone is already at it, give them a moment first.
+            if cache.add(lock_key, token, self.lock_timeout):
+                return Response({"objects": self._compute(request, cache_key, lock_key, token)})
+            for i in range(10):
+                time.sleep(0.5)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    return Response({"objects": cached[0]})
+            return Response({"objects": self._compute(request, cache_key, lock_key)})
+
+        objs, fresh_until, generation = cached
+        stale = time.time() > fresh_until or generation != get_cache_generation(
+            KPI_API_GENERATION_KEY
+        )
+        if stale and cache.add(lock_key, token, self.lock_timeout):
+            refresh_cached_api_view.delay(
+                to_class_path(self.__class__), list(request.GET.items()), token
+            )
+
+        return Response({"objects": objs})
 
-        objs = cache.get(cache_key)
-        if objs is None:
+    def _compute(self, request, cache_key, lock_key, token=None):
+        """Compute the objects and cache them.
+
+        ``token`` is what's in the lock if this call took it. It lets go
+        of the lock then, and only then.
+        """
+        # Read it first, so metrics written while computing make them stale.
+        generation = get_cache_generation(KPI_API_GENERATION_KEY)
+        try:
             objs = self.get_objects(request)
-            cache.add(cache_key, objs, 60 * 60 * 3)
+            cache.set(
+                cache_key, (objs, time.time() + self.cache_timeout, generation), self.stale_timeout
+            )
+        finally:
+            if token is not None and cache.get(lock_key) == token:
+                cache.delete(lock_key)
+        return objs
 
-        return Response({"objects": objs})
+    @classmethod
+    def refresh(cls, params, token=None):
+        """Compute the objects for the query string params again.
+
+        ``params`` is a list of (key, value) tuples. ``token`` is what's in
+        the lock, if it was taken for this.
+        """
+        request = HttpRequest()
+        request.GET = QueryDict(urlencode(params))
+        view = cls()
+        cache_key = view._cache_key(request)
+        view._compute(request, cache_key, cache_key + ":lock", token)
 
     def get_objects(self, request):
         """Returns a list of dicts the API view will return."""
@@ -51,28 +51,33 @@ class Command(BaseCommand):
 
         for kind, querysets in reports:
             cohort_kind, _ = CohortKind.objects.get_or_create(code=kind)
+            active, first = utils._get_contributors_by_range(querysets, ranges)
 
-            for i, cohort_range in enumerate(ranges):
-                cohort_users = utils._get_cohort(querysets, cohort_range)
-
-                # Sometimes None will be added to the cohort_users list, so remove it
-                if None in cohort_users:
-                    cohort_users.remove(None)
-
-                cohort, _ = Cohort.objects.update_or_create(
-                    kind=cohort_kind,
-                    start=cohort_range[0],
-                    end=cohort_range[1],
-                    defaults={"size": len(cohort_users)},
+            utils._bulk_update_or_create(
+                Cohort.objects.filter(kind=cohort_kind),
+                ("kind_id", "start", "end"),
+                dict(
+                    ((cohort_kind.id, start.date(), end.date()), {"size": len(users)})
+                    for (start, end), users in zip(ranges, first)
+                ),
+            )
+            cohorts = dict(
+                (cohort.start, cohort)
+                for cohort in Cohort.objects.filter(
+                    kind=cohort_kind, start__in=[start.date() for start, end in ranges]
                 )
+            )
 
-                for retention_range in ranges[i:]:
-                    retained_user_count = utils._count_contributors_in_range(
-                        querysets, cohort_users, retention_range
-                    )
-                    RetentionMetric.objects.update_or_create(
-                        cohort=cohort,
-                        start=retention_range[0],
-                        end=retention_range[1],
-                        defaults={"size": retained_user_count},
-                    )
+            retention = {}
+            for i, (start, end) in enumerate(ranges):
+                cohort = cohorts[start.date()]
+                for j in range(i, len(ranges)):
+                    retention_start, retention_end = ranges[j]
+                    retention[(cohort.id, retention_start.date(), retention_end.date())] = {
+                        "size": len(first[i] & active[j])
+                    }
+            utils._bulk_update_or_create(
+                RetentionMetric.objects.filter(cohort__in=list(cohorts.values())),
+                ("cohort_id", "start", "end"),
+                retention,
+            )
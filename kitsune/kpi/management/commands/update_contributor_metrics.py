@@ -1,8 +1,10 @@
 import argparse
 from datetime import date, datetime, timedelta
+from heapq import merge
+from operator import itemgetter
 
 from django.core.management.base import BaseCommand
-from django.db.models import Count, F
+from django.db.models import F
 
 from kitsune.customercare.models import Reply
 from kitsune.kpi.management import utils
@@ -13,6 +15,7 @@ from kitsune.kpi.models import (
     SUPPORT_FORUM_CONTRIBUTORS_METRIC_CODE,
     Metric,
     MetricKind,
+    invalidate_kpi_api,
 )
 from kitsune.questions.models import Answer
 from kitsune.wiki.models import Revision
@@ -20,7 +23,7 @@ from kitsune.wiki.models import Revision
 
 def valid_date(s):
     try:
-        return datetime.strptime(s, "%Y-%m-%d")
+        return datetime.strptime(s, "%Y-%m-%d").date()
     except ValueError:
         msg = "Not a valid date: '{0}'.".format(s)
         raise argparse.ArgumentTypeError(msg)
@@ -38,6 +41,41 @@ class Command(BaseCommand):
         update_aoa_contributors_metric(day)
 
 
+def _get_start(metric_code, default):
+    """Return the day to start updating a metric from."""
+    latest_metric = utils._get_latest_metric(metric_code)
+    if latest_metric is not None:
+        # Start updating the day after the last updated.
+        return latest_metric.end + timedelta(days=1)
+    return default
+
+
+def _contributions(queryset, date_field, contributor_field, start, end):
+    """Yield the (date, contributor) of everything in queryset in the
+    30 days before start up to end, in date order."""
+    rows = (
+        queryset.filter(
+            **{"%s__gte" % date_field: start - timedelta(days=30), "%s__lt" % date_field: end,}
+        )
+        .order_by(date_field)
+        .values_list(date_field, contributor_field)
+        .iterator()
+    )
+    for when, contributor in rows:
+        yield when.date(), contributor
+
+
+def _save_metrics(metric_code, counts):
+    """Save the (day, count) tuples in counts as the metric's values."""
+    metric_kind = MetricKind.objects.get_or_create(code=metric_code)[0]
+    Metric.objects.bulk_create(
+        Metric(kind=metric_kind, start=day - timedelta(days=30), end=day, value=count)
+        for day, count in counts
+    )
+    # bulk_create doesn't send the signals that do this.
+    invalidate_kpi_api()
+
+
 def update_support_forum_contributors_metric(day=None):
     """Calculate and save the support forum contributor counts.
 
@@ -47,37 +85,19 @@ def update_support_forum_contributors_metric(day=None):
     if day:
         start = end = day
     else:
-        latest_metric = utils._get_latest_metric(SUPPORT_FORUM_CONTRIBUTORS_METRIC_CODE)
-        if latest_metric is not None:
-            # Start updating the day after the last updated.
-            start = latest_metric.end + timedelta(days=1)
-        else:
-            start = date(2011, 1, 1)
-
+        start = _get_start(SUPPORT_FORUM_CONTRIBUTORS_METRIC_CODE, date(2011, 1, 1))
         # Update until yesterday.
         end = date.today() - timedelta(days=1)
 
-    # Loop through all the days from start to end, calculating and saving.
-    day = start
-    while day <= end:
-        # Figure out the number of contributors from the last 30 days.
-        thirty_days_back = day - timedelta(days=30)
-        contributors = (
-            Answer.objects.exclude(creator=F("question__creator"))
-            .filter(created__gte=thirty_days_back, created__lt=day)
-            .values("creator")
-            .annotate(count=Count("creator"))
-            .filter(count__gte=10)
-        )
-        count = contributors.count()
+    if start > end:
+        return
 
-        # Save the value to Metric table.
-        metric_kind = MetricKind.objects.get_or_create(
-            code=SUPPORT_FORUM_CONTRIBUTORS_METRIC_CODE
-        )[0]
-        Metric.objects.create(kind=metric_kind, start=thirty_days_back, end=day, value=count)
-
-        day = day + timedelta(days=1)
+    answers = Answer.objects.exclude(creator=F("question__creator"))
+    contributions = _contributions(answers, "created", "creator", start, end)
+    _save_metrics(
+        SUPPORT_FORUM_CONTRIBUTORS_METRIC_CODE,
+        utils._rolling_contributor_counts(contributions, start, end, minimum=10),
+    )
 
 
 def update_kb_contributors_metric(day=None):
@@ -89,53 +109,32 @@ def update_kb_contributors_metric(day=None):
     if day:
         start = end = day
     else:
-        latest_metric = utils._get_latest_metric(KB_ENUS_CONTRIBUTORS_METRIC_CODE)
-        if latest_metric is not None:
-            # Start updating the day after the last updated.
-            start = latest_metric.end + timedelta(days=1)
-        else:
-            start = date(2011, 1, 1)
-
+        start = _get_start(KB_ENUS_CONTRIBUTORS_METRIC_CODE, date(2011, 1, 1))
         # Update until yesterday.
         end = date.today() - timedelta(days=1)
 
-    # Loop through all the days from start to end, calculating and saving.
-    day = start
-    while day <= end:
-        # Figure out the number of contributors from the last 30 days.
-        thirty_days_back = day - timedelta(days=30)
-        editors = (
-            Revision.objects.filter(created__gte=thirty_days_back, created__lt=day)
-            .values_list("creator", flat=True)
-            .distinct()
-        )
-        reviewers = (
-            Revision.objects.filter(reviewed__gte=thirty_days_back, reviewed__lt=day)
-            .values_list("reviewer", flat=True)
-            .distinct()
-        )
+    if start > end:
+        return
 
-        en_us_count = len(
-            set(
-                list(editors.filter(document__locale="en-US"))
-                + list(reviewers.filter(document__locale="en-US"))
-            )
-        )
-        l10n_count = len(
-            set(
-                list(editors.exclude(document__locale="en-US"))
-                + list(reviewers.exclude(document__locale="en-US"))
-            )
+    def contributions(revisions):
+        # Editors and reviewers both count, so go through both in order.
+        return merge(
+            _contributions(revisions, "created", "creator", start, end),
+            _contributions(revisions, "reviewed", "reviewer", start, end),
+            key=itemgetter(0),
         )
 
-        # Save the values to Metric table.
-        metric_kind = MetricKind.objects.get_or_create(code=KB_ENUS_CONTRIBUTORS_METRIC_CODE)[0]
-        Metric.objects.create(kind=metric_kind, start=thirty_days_back, end=day, value=en_us_count)
+    en_us = Revision.objects.filter(document__locale="en-US")
+    _save_metrics(
+        KB_ENUS_CONTRIBUTORS_METRIC_CODE,
+        utils._rolling_contributor_counts(contributions(en_us), start, end),
+    )
 
-        metric_kind = MetricKind.objects.get_or_create(code=KB_L10N_CONTRIBUTORS_METRIC_CODE)[0]
-        Metric.objects.create(kind=metric_kind, start=thirty_days_back, end=day, value=l10n_count)
-
-        day = day + timedelta(days=1)
+    l10n = Revision.objects.exclude(document__locale="en-US")
+    _save_metrics(
+        KB_L10N_CONTRIBUTORS_METRIC_CODE,
+        utils._rolling_contributor_counts(contributions(l10n), start, end),
+    )
 
 
 def update_aoa_contributors_metric(day=None):
@@ -162,20 +161,10 @@ def update_aoa_contributors_metric(day=None):
         # Update until yesterday.
         end = date.today() - timedelta(days=1)
 
-    # Loop through all the days from start to end, calculating and saving.
-    day = start
-    while day <= end:
-        # Figure out the number of contributors from the last 30 days.
-        thirty_days_back = day - timedelta(days=30)
-        contributors = (
-            Reply.objects.filter(created__gte=thirty_days_back, created__lt=day)
-            .values_list("twitter_username")
-            .distinct()
-        )
-        count = contributors.count()
-
-        # Save the value to Metric table.
-        metric_kind = MetricKind.objects.get_or_create(code=AOA_CONTRIBUTORS_METRIC_CODE)[0]
-        Metric.objects.create(kind=metric_kind, start=thirty_days_back, end=day, value=count)
+    if start > end:
+        return
 
-        day = day + timedelta(days=1)
+    contributions = _contributions(Reply.objects.all(), "created", "twitter_username", start, end)
+    _save_metrics(
+        AOA_CONTRIBUTORS_METRIC_CODE, utils._rolling_contributor_counts(contributions, start, end),
+    )
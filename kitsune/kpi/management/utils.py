@@ -1,8 +1,9 @@
-import operator
+from bisect import bisect_right
+from collections import deque
 from datetime import date, timedelta
-from functools import reduce
 
-from django.db.models import Q
+from django.contrib.auth.models import User
+from django.db.models import Min
 
 from kitsune.dashboards import LAST_90_DAYS
 from kitsune.dashboards.models import WikiDocumentVisits
@@ -118,37 +119,137 @@ def _process_exit_survey_results():
         day += timedelta(days=1)
 
 
-def _count_contributors_in_range(querysets, users, date_range):
-    """Of the group ``users``, count how many made a contribution in ``date_range``."""
-    start, end = date_range
-    retained_users = set()
+def _get_contributors_by_range(querysets, ranges):
+    """Find who contributed, and who contributed for the first time, in
+    each of the consecutive (start, end) date ranges in ``ranges``.
 
-    for queryset, fields in querysets:
-        for field in fields:
-            filters = {"%s__in" % field: users, "created__gte": start, "created__lt": end}
-            retained_users |= set(getattr(o, field) for o in queryset.filter(**filters))
+    ``querysets`` is a list of (queryset, fields) tuples, where fields
+    are the names of the user foreign keys of the queryset's model that
+    count as contributing. A user's first contribution is their first
+    one by id in any one of the querysets.
 
-    return len(retained_users)
+    This loads the contributions in ranges once for each queryset, and
+    the first contributions of the users in them with one aggregate
+    query per field.
 
+    Returns (active, first), two lists with a set of user ids for each
+    range: the users who contributed in it, and the users who
+    contributed for the first time in it.
 
-def _get_cohort(querysets, date_range):
-    start, end = date_range
-    cohort = set()
+    """
+    start, end = ranges[0][0], ranges[-1][1]
+    range_starts = [range_start for range_start, range_end in ranges]
+    active = [set() for _ in ranges]
+    first = [set() for _ in ranges]
 
     for queryset, fields in querysets:
-        contributions_in_range = queryset.filter(created__gte=start, created__lt=end)
-        potential_users = set()
-
+        users = set()
+        rows = queryset.filter(created__gte=start, created__lt=end).values_list("created", *fields)
+        for row in rows:
+            i = bisect_right(range_starts, row[0]) - 1
+            for user_id in row[1:]:
+                if user_id is not None:
+                    active[i].add(user_id)
+                    users.add(user_id)
+
+        first_ids = {}
         for field in fields:
-            potential_users |= set(getattr(cont, field) for cont in contributions_in_range)
-
-        def is_in_cohort(u):
-            qs = [Q(**{field: u}) for field in fields]
-            filters = reduce(operator.or_, qs)
+            first_contribs = (
+                queryset.filter(**{"%s__in" % field: users})
+                .order_by()
+                .values_list(field)
+                .annotate(Min("id"))
+            )
+            for user_id, first_id in first_contribs:
+                first_ids[user_id] = min(first_id, first_ids.get(user_id, first_id))
+
+        created = dict(
+            queryset.model.objects.filter(id__in=list(first_ids.values())).values_list(
+                "id", "created"
+            )
+        )
+        for user_id, first_id in first_ids.items():
+            when = created[first_id]
+            if start <= when < end:
+                first[bisect_right(range_starts, when) - 1].add(user_id)
 
-            first_contrib = queryset.filter(filters).order_by("id")[0]
-            return start <= first_contrib.created < end
+    return active, first
 
-        cohort |= set(filter(is_in_cohort, potential_users))
 
-    return cohort
+def _get_cohort(querysets, date_range):
+    """Return the users whose first contribution was in ``date_range``."""
+    active, first = _get_contributors_by_range(querysets, [date_range])
+    return set(User.objects.filter(id__in=first[0]))
+
+
+def _bulk_update_or_create(queryset, keys, values):
+    """Like update_or_create, for a bunch of objects at once.
+
+    ``values`` maps tuples of the values of the ``keys`` fields to
+    dicts of the values of the other fields. Objects that exist in
+    queryset are updated with one bulk_update, the rest are created
+    with one bulk_create.
+
+    """
+    existing = dict((tuple(getattr(obj, key) for key in keys), obj) for obj in queryset)
+    to_update = []
+    to_create = []
+    for key_values, defaults in values.items():
+        obj = existing.get(key_values)
+        if obj is None:
+            to_create.append(queryset.model(**dict(zip(keys, key_values), **defaults)))
+        elif any(getattr(obj, field) != value for field, value in defaults.items()):
+            for field, value in defaults.items():
+                setattr(obj, field, value)
+            to_update.append(obj)
+
+    if to_update:
+        fields = set(field for defaults in values.values() for field in defaults)
+        queryset.model.objects.bulk_update(to_update, list(fields))
+    queryset.model.objects.bulk_create(to_create)
+
+
+def _rolling_contributor_counts(contributions, start, end, minimum=1, days=30):
+    """Count contributors over a sliding window, for each day in a range.
+
+    For each day from ``start`` to ``end``, count how many contributors
+    made at least ``minimum`` contributions in the ``days`` days before
+    it (not including the day itself).
+
+    ``contributions`` is an iterable of (date, contributor) tuples in
+    date order, covering ``start - days`` up to ``end``. It's only gone
+    through once, adding what enters the window and dropping what
+    leaves it, rather than counting the whole window again every day.
+
+    Yields (day, count) tuples.
+
+    """
+    contributions = iter(contributions)
+    window = deque()
+    counts = {}
+    num_contributors = 0
+    upcoming = next(contributions, None)
+
+    day = start
+    while day <= end:
+        # Add what happened before the day.
+        while upcoming is not None and upcoming[0] < day:
+            when, contributor = upcoming
+            if when >= day - timedelta(days=days):
+                window.append(upcoming)
+                counts[contributor] = counts.get(contributor, 0) + 1
+                if counts[contributor] == minimum:
+                    num_contributors += 1
+            upcoming = next(contributions, None)
+
+        # Drop what happened too long before it.
+        while window and window[0][0] < day - timedelta(days=days):
+            when, contributor = window.popleft()
+            if counts[contributor] == minimum:
+                num_contributors -= 1
+            counts[contributor] -= 1
+            if not counts[contributor]:
+                del counts[contributor]
+
+        yield day, num_contributors
+        day += timedelta(days=1)
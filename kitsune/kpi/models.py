@@ -1,6 +1,8 @@
 from django.db.models import CharField, DateField, ForeignKey, PositiveIntegerField, CASCADE
+from django.db.models.signals import post_delete, post_save
 
 from kitsune.sumo.models import ModelBase
+from kitsune.sumo.utils import bump_cache_generation
 
 
 VISITORS_METRIC_CODE = "general keymetrics:visitors"
@@ -74,6 +76,26 @@ class Metric(ModelBase):
         return "%s (%s thru %s): %s" % (self.kind, self.start, self.end, self.value)
 
 
+# Holds the generation of the KPI API responses. They're cached along with
+# the generation they were computed in, so bumping it makes them stale (see
+# kitsune.kpi.api.CachedAPIView).
+KPI_API_GENERATION_KEY = "kpi:api_generation"
+
+
+def invalidate_kpi_api(**kwargs):
+    """Make the cached KPI API responses stale.
+
+    This is connected to the signals of Metric. Code that writes metrics
+    without sending them, like bulk_create, has to call it itself.
+
+    """
+    bump_cache_generation(KPI_API_GENERATION_KEY)
+
+
+post_save.connect(invalidate_kpi_api, sender=Metric, dispatch_uid="kpi_api_save")
+post_delete.connect(invalidate_kpi_api, sender=Metric, dispatch_uid="kpi_api_delete")
+
+
 class CohortKind(ModelBase):
     """A programmer-readable identifier of a cohort, like 'contributor'"""
 
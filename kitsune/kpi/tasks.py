@@ -0,0 +1,15 @@
+from celery import task
+
+from kitsune.search.utils import from_class_path
+
+
+@task()
+def refresh_cached_api_view(view_path, params, token=None):
+    """Compute the objects of a kitsune.kpi.api.CachedAPIView again.
+
+    :arg view_path: class path of the view
+    :arg params: list of (key, value) tuples of the query string
+    :arg token: what's in the lock the view took for this, if any
+
+    """
+    from_class_path(view_path).refresh(params, token)
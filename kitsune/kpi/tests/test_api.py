@@ -1,5 +1,6 @@
 import json
 from datetime import date, datetime, timedelta
+from unittest import mock
 
 from django.core.cache import cache
 from django.core.management import call_command
@@ -336,6 +337,29 @@ class KpiApiTests(TestCase):
         r = self._get_api_result("api.kpi.visitors")
         eq_(r["objects"][0]["visitors"], 42)
 
+    def test_stale_while_revalidate(self):
+        """New metrics make the response stale. It's still returned once
+        while it's computed again."""
+        kind = MetricKindFactory(code=VISITORS_METRIC_CODE)
+        MetricFactory(kind=kind, start=date.today(), end=date.today(), value=42)
+        eq_(1, len(self._get_api_result("api.kpi.visitors")["objects"]))
+
+        yesterday = date.today() - timedelta(days=1)
+        MetricFactory(kind=kind, start=yesterday, end=yesterday, value=13)
+        eq_(1, len(self._get_api_result("api.kpi.visitors")["objects"]))
+        eq_(2, len(self._get_api_result("api.kpi.visitors")["objects"]))
+
+    @mock.patch("kitsune.kpi.api.time.sleep")
+    def test_waiter_keeps_others_lock(self, sleep):
+        """A request that gave up waiting on the lock doesn't let go of it."""
+        kind = MetricKindFactory(code=VISITORS_METRIC_CODE)
+        MetricFactory(kind=kind, start=date.today(), end=date.today(), value=42)
+        lock_key = "kpi:api:VisitorsMetricList:format=json:lock"
+        cache.set(lock_key, "someone else's")
+
+        eq_(1, len(self._get_api_result("api.kpi.visitors")["objects"]))
+        eq_("someone else's", cache.get(lock_key))
+
     def test_l10n_coverage(self):
         """Test l10n coverage API call."""
         # Create the metrics
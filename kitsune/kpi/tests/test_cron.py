@@ -18,10 +18,12 @@ from kitsune.kpi.models import (
     L10N_METRIC_CODE,
     SEARCH_CLICKS_METRIC_CODE,
     SEARCH_SEARCHES_METRIC_CODE,
+    SUPPORT_FORUM_CONTRIBUTORS_METRIC_CODE,
     SUPPORT_FORUM_HELPER_COHORT_CODE,
     VISITORS_METRIC_CODE,
     Cohort,
     Metric,
+    RetentionMetric,
 )
 from kitsune.kpi.tests import MetricFactory, MetricKindFactory
 from kitsune.questions.tests import AnswerFactory
@@ -181,6 +183,21 @@ class CohortAnalysisTests(TestCase):
         )
         eq_(c2.size, 0)
 
+    def test_rerun_updates(self):
+        """Running the analysis again updates the cohorts in place."""
+        num_cohorts = Cohort.objects.count()
+        num_metrics = RetentionMetric.objects.count()
+        ReplyFactory(created=self.start_of_first_week)
+
+        call_command("cohort_analysis")
+
+        eq_(num_cohorts, Cohort.objects.count())
+        eq_(num_metrics, RetentionMetric.objects.count())
+        c1 = Cohort.objects.get(
+            kind__code=AOA_CONTRIBUTOR_COHORT_CODE, start=self.start_of_first_week
+        )
+        eq_(c1.size, 3)
+
 
 class CronJobTests(TestCase):
     @patch.object(googleanalytics, "visitors")
@@ -297,6 +314,47 @@ class CronJobTests(TestCase):
         eq_(138, metrics[1].value)
         eq_(date(2013, 6, 8), metrics[2].start)
 
+    def test_rolling_contributor_counts(self):
+        """Contributors are counted over the 30 days before each day."""
+        d = date(2013, 6, 1)
+        contributions = [
+            (d - timedelta(days=31), "a"),
+            (d - timedelta(days=30), "a"),
+            (d - timedelta(days=29), "b"),
+            (d - timedelta(days=1), "b"),
+            (d, "c"),
+        ]
+        counts = kitsune.kpi.management.utils._rolling_contributor_counts(
+            contributions, d, d + timedelta(days=2)
+        )
+        eq_([(d, 2), (d + timedelta(days=1), 2), (d + timedelta(days=2), 2)], list(counts))
+
+        counts = kitsune.kpi.management.utils._rolling_contributor_counts(
+            contributions, d, d + timedelta(days=1), minimum=2
+        )
+        eq_([(d, 1), (d + timedelta(days=1), 1)], list(counts))
+
+    def test_update_contributor_metrics_catches_up(self):
+        """Every day since the last metric gets a metric."""
+        three_days_ago = datetime.now() - timedelta(days=3)
+        AnswerFactory.create_batch(10, creator=UserFactory(), created=three_days_ago)
+        yesterday = date.today() - timedelta(days=1)
+        MetricFactory(
+            kind=MetricKindFactory(code=SUPPORT_FORUM_CONTRIBUTORS_METRIC_CODE),
+            start=yesterday - timedelta(days=35),
+            end=yesterday - timedelta(days=5),
+            value=0,
+        )
+
+        call_command("update_contributor_metrics")
+
+        metrics = Metric.objects.filter(
+            kind__code=SUPPORT_FORUM_CONTRIBUTORS_METRIC_CODE,
+            end__gt=yesterday - timedelta(days=5),
+        ).order_by("end")
+        eq_([0, 0, 0, 1, 1], [m.value for m in metrics])
+        eq_(yesterday, metrics[4].end)
+
     @patch.object(surveygizmo_utils, "requests")
     def test_process_exit_surveys(self, requests):
         """Verify the metrics inserted by process_exit_surveys cron job."""
@@ -1,5 +1,4 @@
 import logging
-import time
 from datetime import datetime, timedelta
 
 from django.conf import settings
@@ -7,7 +6,7 @@ from django.core.management.base import BaseCommand
 from django.db import connection, transaction
 
 from kitsune.questions.models import Question, QuestionMappingType
-from kitsune.search.es_utils import ES_EXCEPTIONS, get_documents
+from kitsune.search.es_utils import ES_EXCEPTIONS
 from kitsune.search.tasks import index_task
 from kitsune.search.utils import to_class_path
 
@@ -59,22 +58,13 @@ class Command(BaseCommand):
                     from kitsune.search.utils import chunked
 
                     for chunk in chunked(q_ids, 100):
+                        log.info("Updating %d index documents", len(chunk))
 
-                        # Fetch all the documents we need to update.
-                        es_docs = get_documents(QuestionMappingType, chunk)
-
-                        log.info("Updating %d index documents", len(es_docs))
-
-                        documents = []
-
-                        # For each document, update the data and stick it
-                        # back in the index.
-                        for doc in es_docs:
-                            doc["question_is_archived"] = True
-                            doc["indexed_on"] = int(time.time())
-                            documents.append(doc)
-
-                        QuestionMappingType.bulk_index(documents)
+                        missing = QuestionMappingType.bulk_update(
+                            dict((id_, {"question_is_archived": True}) for id_ in chunk)
+                        )
+                        if missing:
+                            index_task.delay(to_class_path(QuestionMappingType), missing)
 
                 except ES_EXCEPTIONS:
                     # Something happened with ES, so let's push index
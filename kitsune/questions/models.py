@@ -12,9 +12,8 @@ from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelatio
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
 from django.db import close_old_connections, connection, models
-from django.db.models import Q
-from django.db.models.signals import post_save, pre_save
-from django.db.utils import IntegrityError
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.http import Http404
 from django.urls import resolve
@@ -25,22 +24,29 @@ from kitsune.flagit.models import FlaggedObject
 from kitsune.products.models import Product, Topic
 from kitsune.questions import config
 from kitsune.questions.managers import AnswerManager, QuestionLocaleManager, QuestionManager
-from kitsune.questions.tasks import update_answer_pages, update_question_votes
-from kitsune.search.es_utils import ES_EXCEPTIONS, UnindexMeBro
+from kitsune.questions.tasks import (
+    update_answer_pages,
+    update_answer_votes,
+    update_question_votes,
+)
+from kitsune.search.es_utils import ES_EXCEPTIONS
 from kitsune.search.models import (
     SearchMappingType,
     SearchMixin,
+    call_later,
     register_for_indexing,
     register_mapping_type,
 )
-from kitsune.search.tasks import index_task
+from kitsune.search.tasks import update_task
 from kitsune.search.utils import to_class_path
 from kitsune.sumo.models import LocaleField, ModelBase
 from kitsune.sumo.templatetags.jinja_helpers import urlparams, wiki_to_html
 from kitsune.sumo.urlresolvers import reverse, split_path
+from kitsune.sumo.utils import bulk_upsert
 from kitsune.tags.models import BigVocabTaggableMixin
 from kitsune.tags.utils import add_existing_tag
 from kitsune.upload.models import ImageAttachment
+from kitsune.users.models import update_last_contribution_date
 from kitsune.wiki.models import Document
 
 log = logging.getLogger("k.questions")
@@ -738,8 +744,19 @@ class QuestionMappingType(SearchMappingType):
         }
 
     @classmethod
-    def extract_document(cls, obj_id, obj=None):
-        """Extracts indexable attributes from a Question and its answers."""
+    def get_has_helpful(cls, question_ids):
+        """Return the ids of the questions with a non-spam answer that was
+        voted helpful. That's question_has_helpful."""
+        return set(
+            Answer.objects.filter(question__in=question_ids, is_spam=False, votes__helpful=True)
+            .order_by()
+            .values_list("question_id", flat=True)
+            .distinct()
+        )
+
+    @classmethod
+    def extract_documents(cls, ids):
+        """Extracts indexable attributes from Questions and their answers."""
         fields = [
             "id",
             "title",
@@ -754,79 +771,94 @@ class QuestionMappingType(SearchMappingType):
             "locale",
             "product_id",
             "topic_id",
-            "is_spam",
+            "creator__username",
         ]
-        composed_fields = ["creator__username"]
-        all_fields = fields + composed_fields
-
-        if obj is None:
-            # Note: Need to keep this in sync with
-            # tasks.update_question_vote_chunk.
-            model = cls.get_model()
-            obj = model.objects.values(*all_fields).get(pk=obj_id)
-        else:
-            fixed_obj = dict([(field, getattr(obj, field)) for field in fields])
-            fixed_obj["creator__username"] = obj.creator.username
-            obj = fixed_obj
-
-        if obj["is_spam"]:
-            raise UnindexMeBro()
-
-        d = {}
-        d["id"] = obj["id"]
-        d["model"] = cls.get_mapping_type_name()
-
-        # We do this because get_absolute_url is an instance method
-        # and we don't want to create an instance because it's a DB
-        # hit and expensive. So we do it by hand. get_absolute_url
-        # doesn't change much, so this is probably ok.
-        d["url"] = reverse("questions.details", kwargs={"question_id": obj["id"]})
-
-        d["indexed_on"] = int(time.time())
-
-        d["created"] = int(time.mktime(obj["created"].timetuple()))
-        d["updated"] = int(time.mktime(obj["updated"].timetuple()))
-
-        topics = Topic.objects.filter(id=obj["topic_id"])
-        products = Product.objects.filter(id=obj["product_id"])
-        d["topic"] = [t.slug for t in topics]
-        d["product"] = [p.slug for p in products]
-
-        d["question_title"] = obj["title"]
-        d["question_content"] = obj["content"]
-        d["question_num_answers"] = obj["num_answers"]
-        d["question_is_solved"] = bool(obj["solution_id"])
-        d["question_is_locked"] = obj["is_locked"]
-        d["question_is_archived"] = obj["is_archived"]
-        d["question_has_answers"] = bool(obj["num_answers"])
-
-        d["question_creator"] = obj["creator__username"]
-        d["question_num_votes"] = QuestionVote.objects.filter(question=obj["id"]).count()
-        d["question_num_votes_past_week"] = obj["num_votes_past_week"]
-
-        d["question_tag"] = list(
-            TaggedItem.tags_for(Question, Question(pk=obj_id)).values_list("name", flat=True)
-        )
 
-        d["question_locale"] = obj["locale"]
+        # Note: Need to keep this in sync with
+        # tasks.update_question_vote_chunk.
+        objs = list(cls.get_model().objects.filter(pk__in=ids, is_spam=False).values(*fields))
+        question_ids = [obj["id"] for obj in objs]
 
-        answer_values = list(
-            Answer.objects.filter(question=obj_id, is_spam=False).values_list(
-                "content", "creator__username"
+        topics = dict(
+            Topic.objects.filter(id__in=set(obj["topic_id"] for obj in objs)).values_list(
+                "id", "slug"
+            )
+        )
+        products = dict(
+            Product.objects.filter(id__in=set(obj["product_id"] for obj in objs)).values_list(
+                "id", "slug"
             )
         )
 
-        d["question_answer_content"] = [a[0] for a in answer_values]
-        d["question_answer_creator"] = list(set(a[1] for a in answer_values))
+        num_votes = dict(
+            QuestionVote.objects.filter(question__in=question_ids)
+            .order_by()
+            .values("question")
+            .annotate(num=Count("id"))
+            .values_list("question", "num")
+        )
 
-        if not answer_values:
-            d["question_has_helpful"] = False
-        else:
-            d["question_has_helpful"] = (
-                Answer.objects.filter(question=obj_id).filter(votes__helpful=True).exists()
-            )
+        tags = {}
+        tagged = TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Question), object_id__in=question_ids
+        ).values_list("object_id", "tag__name")
+        for question_id, name in tagged:
+            tags.setdefault(question_id, []).append(name)
+
+        answers = {}
+        answer_values = Answer.objects.filter(
+            question__in=question_ids, is_spam=False
+        ).values_list("question_id", "content", "creator__username")
+        for question_id, content, creator in answer_values:
+            answers.setdefault(question_id, []).append((content, creator))
+
+        has_helpful = cls.get_has_helpful(question_ids)
 
-        return d
+        documents = {}
+        for obj in objs:
+            d = {}
+            d["id"] = obj["id"]
+            d["model"] = cls.get_mapping_type_name()
+
+            # We do this because get_absolute_url is an instance method
+            # and we don't want to create an instance because it's a DB
+            # hit and expensive. So we do it by hand. get_absolute_url
+            # doesn't change much, so this is probably ok.
+            d["url"] = reverse("questions.details", kwargs={"question_id": obj["id"]})
+
+            d["indexed_on"] = int(time.time())
+
+            d["created"] = int(time.mktime(obj["created"].timetuple()))
+            d["updated"] = int(time.mktime(obj["updated"].timetuple()))
+
+            d["topic"] = [topics[obj["topic_id"]]] if obj["topic_id"] in topics else []
+            d["product"] = [products[obj["product_id"]]] if obj["product_id"] in products else []
+
+            d["question_title"] = obj["title"]
+            d["question_content"] = obj["content"]
+            d["question_num_answers"] = obj["num_answers"]
+            d["question_is_solved"] = bool(obj["solution_id"])
+            d["question_is_locked"] = obj["is_locked"]
+            d["question_is_archived"] = obj["is_archived"]
+            d["question_has_answers"] = bool(obj["num_answers"])
+
+            d["question_creator"] = obj["creator__username"]
+            d["question_num_votes"] = num_votes.get(obj["id"], 0)
+            d["question_num_votes_past_week"] = obj["num_votes_past_week"]
+
+            d["question_tag"] = tags.get(obj["id"], [])
+
+            d["question_locale"] = obj["locale"]
+
+            question_answers = answers.get(obj["id"], [])
+            d["question_answer_content"] = [a[0] for a in question_answers]
+            d["question_answer_creator"] = list(set(a[1] for a in question_answers))
+
+            d["question_has_helpful"] = obj["id"] in has_helpful
+
+            documents[obj["id"]] = d
+
+        return documents
 
 
 register_for_indexing("questions", Question)
@@ -872,29 +904,8 @@ class QuestionVisits(ModelBase):
             # them out at 5 minutes and the GA calls take forever.
             close_old_connections()
 
-            for question_id, visits in counts.items():
-                # We are trying to minimize db calls here. Let's try to update
-                # first, that will be the common case.
-                num = cls.objects.filter(question_id=question_id).update(visits=visits)
-
-                # If we were able to update, we are done.
-                if num > 0:
-                    continue
-                # If it doesn't exist yet, create it.
-                try:
-                    # For some reason unbeknowest to me,
-                    # IntegrityError doesn't get kicked up in the
-                    # QuestionVisits tests when running the tests with
-                    # a clean db. So to deal with that, we explicitly
-                    # check the db to see if the question exists.
-                    # This happens with Django 1.4.6 and South
-                    # 0.8.2. If we update either, we might want to see
-                    # if this is still a problem.
-                    Question.objects.get(pk=question_id)
-                    cls.objects.create(question_id=question_id, visits=visits)
-                except (Question.DoesNotExist, IntegrityError):
-                    # The question doesn't exist anymore, move on.
-                    continue
+            # Questions that don't exist anymore are skipped.
+            bulk_upsert(cls, "question", counts, "visits")
         else:
             log.warning("Google Analytics returned no interesting data," " so I kept what I had.")
 
@@ -1188,60 +1199,72 @@ class AnswerMetricsMappingType(SearchMappingType):
         }
 
     @classmethod
-    def extract_document(cls, obj_id, obj=None):
-        """Extracts indexable attributes from an Answer."""
-        fields = ["id", "created", "creator_id", "question_id"]
-        composed_fields = [
+    def extract_documents(cls, ids):
+        """Extracts indexable attributes from Answers."""
+        fields = [
+            "id",
+            "created",
+            "creator_id",
+            "question_id",
             "question__locale",
             "question__solution_id",
             "question__creator_id",
             "question__product_id",
         ]
-        all_fields = fields + composed_fields
 
-        if obj is None:
-            model = cls.get_model()
-            obj_dict = model.objects.values(*all_fields).get(pk=obj_id)
-        else:
-            obj_dict = dict([(field, getattr(obj, field)) for field in fields])
-            obj_dict["question__locale"] = obj.question.locale
-            obj_dict["question__solution_id"] = obj.question.solution_id
-            obj_dict["question__creator_id"] = obj.question.creator_id
-            obj_dict["question__product_id"] = obj.question.product_id
+        objs = list(cls.get_model().objects.filter(pk__in=ids).values(*fields))
 
-        d = {}
-        d["id"] = obj_dict["id"]
-        d["model"] = cls.get_mapping_type_name()
+        products = dict(
+            Product.objects.filter(
+                id__in=set(obj["question__product_id"] for obj in objs)
+            ).values_list("id", "slug")
+        )
+
+        vote_counts = {}
+        votes = (
+            AnswerVote.objects.filter(answer__in=[obj["id"] for obj in objs])
+            .order_by()
+            .values("answer", "helpful")
+            .annotate(num=Count("id"))
+            .values_list("answer", "helpful", "num")
+        )
+        for answer_id, helpful, num in votes:
+            vote_counts[(answer_id, helpful)] = num
 
-        # We do this because get_absolute_url is an instance method
-        # and we don't want to create an instance because it's a DB
-        # hit and expensive. So we do it by hand. get_absolute_url
-        # doesn't change much, so this is probably ok.
-        url = reverse("questions.details", kwargs={"question_id": obj_dict["question_id"]})
-        d["url"] = urlparams(url, hash="answer-%s" % obj_dict["id"])
+        documents = {}
+        for obj in objs:
+            d = {}
+            d["id"] = obj["id"]
+            d["model"] = cls.get_mapping_type_name()
 
-        d["indexed_on"] = int(time.time())
+            # We do this because get_absolute_url is an instance method
+            # and we don't want to create an instance because it's a DB
+            # hit and expensive. So we do it by hand. get_absolute_url
+            # doesn't change much, so this is probably ok.
+            url = reverse("questions.details", kwargs={"question_id": obj["question_id"]})
+            d["url"] = urlparams(url, hash="answer-%s" % obj["id"])
 
-        d["created"] = obj_dict["created"]
+            d["indexed_on"] = int(time.time())
 
-        d["locale"] = obj_dict["question__locale"]
-        d["is_solution"] = obj_dict["id"] == obj_dict["question__solution_id"]
-        d["creator_id"] = obj_dict["creator_id"]
-        d["by_asker"] = obj_dict["creator_id"] == obj_dict["question__creator_id"]
+            d["created"] = obj["created"]
 
-        products = Product.objects.filter(id=obj_dict["question__product_id"])
-        d["product"] = [p.slug for p in products]
+            d["locale"] = obj["question__locale"]
+            d["is_solution"] = obj["id"] == obj["question__solution_id"]
+            d["creator_id"] = obj["creator_id"]
+            d["by_asker"] = obj["creator_id"] == obj["question__creator_id"]
 
-        related_votes = AnswerVote.objects.filter(answer_id=obj_dict["id"])
-        d["helpful_count"] = related_votes.filter(helpful=True).count()
-        d["unhelpful_count"] = related_votes.filter(helpful=False).count()
+            product_id = obj["question__product_id"]
+            d["product"] = [products[product_id]] if product_id in products else []
 
-        return d
+            d["helpful_count"] = vote_counts.get((obj["id"], True), 0)
+            d["unhelpful_count"] = vote_counts.get((obj["id"], False), 0)
+
+            documents[obj["id"]] = d
+
+        return documents
 
 
 register_for_indexing("answers", Answer)
-# This below is needed to update the is_solution field on the answer.
-register_for_indexing("answers", Question, instance_to_indexee=(lambda i: i.solution))
 
 
 register_for_indexing("questions", Answer, instance_to_indexee=lambda a: a.question)
@@ -1249,12 +1272,27 @@ register_for_indexing("questions", Answer, instance_to_indexee=lambda a: a.quest
 
 # This below is needed to update the is_solution field on the answer.
 def reindex_questions_answers(sender, instance, **kw):
-    """When a question is saved, we need to reindex it's answers.
+    """When a question is saved, we need to update it's answers.
 
-    This is needed because the solution may have changed."""
+    This is needed because the solution may have changed. The answers
+    only carry a few fields from the question, so just those get
+    updated."""
     if instance.id:
+        product = [instance.product.slug] if instance.product_id else []
         answer_ids = instance.answers.all().values_list("id", flat=True)
-        index_task.delay(to_class_path(AnswerMetricsMappingType), list(answer_ids))
+        updates = dict(
+            (
+                answer_id,
+                {
+                    "is_solution": answer_id == instance.solution_id,
+                    "locale": instance.locale,
+                    "product": product,
+                },
+            )
+            for answer_id in answer_ids
+        )
+        if updates:
+            update_task.delay(to_class_path(AnswerMetricsMappingType), updates)
 
 
 post_save.connect(
@@ -1297,9 +1335,6 @@ class QuestionVote(ModelBase):
         VoteMetadata.objects.create(vote=self, key=key, value=value[:VOTE_METADATA_MAX_LENGTH])
 
 
-register_for_indexing("questions", QuestionVote, instance_to_indexee=lambda v: v.question)
-
-
 class AnswerVote(ModelBase):
     """Helpful or Not Helpful vote on Answer."""
 
@@ -1315,11 +1350,24 @@ class AnswerVote(ModelBase):
         VoteMetadata.objects.create(vote=self, key=key, value=value[:VOTE_METADATA_MAX_LENGTH])
 
 
-# TODO: We only need to update the helpful bit.  It's possible
-# we could ignore all AnswerVotes that aren't helpful and if
-# they're marked as helpful, then update the index.  Look into
-# this.
-register_for_indexing("questions", AnswerVote, instance_to_indexee=lambda v: v.answer.question)
+def update_answer_vote_counts(sender, instance, created=True, raw=False, **kw):
+    """When an answer is voted on, update the vote counts in the index.
+
+    Only the counts on the answer and the helpful bit on the question
+    change, so just those get updated, once the vote is committed."""
+    # Only new and deleted votes change the counts.
+    if created and not raw:
+        call_later(update_answer_votes.delay, instance.answer_id, instance.answer.question_id)
+
+
+post_save.connect(
+    update_answer_vote_counts, sender=AnswerVote, dispatch_uid="questions_answer_vote_counts"
+)
+post_delete.connect(
+    update_answer_vote_counts,
+    sender=AnswerVote,
+    dispatch_uid="questions_answer_vote_counts_delete",
+)
 
 
 class VoteMetadata(ModelBase):
@@ -1332,13 +1380,17 @@ class VoteMetadata(ModelBase):
     value = models.CharField(max_length=VOTE_METADATA_MAX_LENGTH)
 
 
-def send_vote_update_task(**kwargs):
-    if kwargs.get("created"):
-        q = kwargs.get("instance").question
-        update_question_votes.delay(q.id)
+def send_vote_update_task(sender, instance, created=True, raw=False, **kwargs):
+    # Only new and deleted votes change the counts. They're updated once
+    # the vote is committed.
+    if created and not raw:
+        call_later(update_question_votes.delay, instance.question_id)
 
 
 post_save.connect(send_vote_update_task, sender=QuestionVote)
+post_delete.connect(
+    send_vote_update_task, sender=QuestionVote, dispatch_uid="questions_question_vote_delete"
+)
 
 
 _tenths_version_pattern = re.compile(r"(\d+\.\d+).*")
@@ -1386,6 +1438,12 @@ def add_action_for_new_question(sender, instance, created, **kwargs):
         actstream.action.send(instance.creator, verb="asked", action_object=instance)
 
 
+@receiver(post_save, sender=Answer, dispatch_uid="answer_last_contribution_date")
+def update_answerer_last_contribution_date(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_last_contribution_date(instance.creator_id, instance.created)
+
+
 @receiver(post_save, sender=Answer, dispatch_uid="answer_create_actionstream")
 def add_action_for_new_answer(sender, instance, created, **kwargs):
     if created:
@@ -8,13 +8,14 @@ from celery import task
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import connection, transaction
+from django.db.models import Count
 from multidb.pinning import pin_this_thread, unpin_this_thread
 from sentry_sdk import capture_exception
 
 from kitsune.kbadge.utils import get_or_create_badge
 from kitsune.questions.config import ANSWERS_PER_PAGE
 from kitsune.search.es_utils import ES_EXCEPTIONS
-from kitsune.search.tasks import index_task
+from kitsune.search.tasks import index_task, update_task
 from kitsune.search.utils import to_class_path
 
 log = logging.getLogger("k.task")
@@ -22,7 +23,7 @@ log = logging.getLogger("k.task")
 
 @task(rate_limit="1/s")
 def update_question_votes(question_id):
-    from kitsune.questions.models import Question
+    from kitsune.questions.models import Question, QuestionMappingType
 
     log.debug("Got a new QuestionVote for question_id=%s." % question_id)
 
@@ -31,14 +32,67 @@ def update_question_votes(question_id):
 
     try:
         q = Question.objects.get(id=question_id)
-        q.sync_num_votes_past_week()
-        q.save(force_update=True)
+        num_votes_past_week = q.sync_num_votes_past_week()
+        # Only the vote counts changed, so skip save() and the full
+        # reindex it triggers and update just those fields.
+        Question.objects.filter(id=q.id).update(num_votes_past_week=num_votes_past_week)
+        update_task.delay(
+            to_class_path(QuestionMappingType),
+            {
+                q.id: {
+                    "question_num_votes": q.num_votes,
+                    "question_num_votes_past_week": num_votes_past_week,
+                }
+            },
+        )
     except Question.DoesNotExist:
         log.info("Question id=%s deleted before task." % question_id)
 
     unpin_this_thread()
 
 
+@task(rate_limit="4/s")
+def update_answer_votes(answer_id, question_id):
+    """Update the vote counts of an answer, and the helpful bit of its
+    question, in the index."""
+    from kitsune.questions.models import (
+        Answer,
+        AnswerMetricsMappingType,
+        AnswerVote,
+        QuestionMappingType,
+    )
+
+    # Pin to master db to avoid lag delay issues.
+    pin_this_thread()
+
+    if Answer.objects.filter(id=answer_id).exists():
+        votes = dict(
+            AnswerVote.objects.filter(answer=answer_id)
+            .order_by()
+            .values("helpful")
+            .annotate(num=Count("id"))
+            .values_list("helpful", "num")
+        )
+        update_task.delay(
+            to_class_path(AnswerMetricsMappingType),
+            {
+                answer_id: {
+                    "helpful_count": votes.get(True, 0),
+                    "unhelpful_count": votes.get(False, 0),
+                }
+            },
+        )
+    else:
+        log.info("Answer id=%s deleted before task." % answer_id)
+
+    has_helpful = question_id in QuestionMappingType.get_has_helpful([question_id])
+    update_task.delay(
+        to_class_path(QuestionMappingType), {question_id: {"question_has_helpful": has_helpful}}
+    )
+
+    unpin_this_thread()
+
+
 @task(rate_limit="4/s")
 def update_question_vote_chunk(data):
     """Update num_votes_past_week for a number of questions."""
@@ -84,22 +138,18 @@ def update_question_vote_chunk(data):
         # convert that directly to a dict.
         id_to_num = dict(cursor.fetchall())
 
-        try:
-            # Fetch all the documents we need to update.
-            from kitsune.questions.models import QuestionMappingType
-            from kitsune.search import es_utils
-
-            es_docs = es_utils.get_documents(QuestionMappingType, data)
+        from kitsune.questions.models import QuestionMappingType
 
-            # For each document, update the data and stick it back in the
-            # index.
-            for doc in es_docs:
-                # Note: Need to keep this in sync with
-                # Question.extract_document.
-                num = id_to_num[int(doc["id"])]
-                doc["question_num_votes_past_week"] = num
-
-                QuestionMappingType.index(doc, id_=doc["id"])
+        try:
+            # Note: Need to keep this in sync with
+            # QuestionMappingType.extract_documents.
+            missing = QuestionMappingType.bulk_update(
+                dict(
+                    (id_, {"question_num_votes_past_week": num}) for id_, num in id_to_num.items()
+                )
+            )
+            if missing:
+                index_task.delay(to_class_path(QuestionMappingType), missing)
         except ES_EXCEPTIONS:
             # Something happened with ES, so let's push index updating
             # into an index_task which retries when it fails because
@@ -3,7 +3,7 @@ from datetime import datetime, timedelta
 from nose.tools import eq_
 from pyquery import PyQuery as pq
 
-from kitsune.products.tests import ProductFactory
+from kitsune.products.tests import ProductFactory, TopicFactory
 from kitsune.questions.models import QuestionMappingType, AnswerMetricsMappingType
 from kitsune.questions.tests import (
     QuestionFactory,
@@ -158,6 +158,44 @@ class QuestionUpdateTests(ElasticTestCase):
         eq_(search.query(question_answer_content__match="spam").count(), 0)
 
 
+class QuestionExtractDocumentsTests(ElasticTestCase):
+    def test_extract_documents(self):
+        p = ProductFactory()
+        t = TopicFactory(product=p)
+        q1 = QuestionFactory(title="first", product=p, topic=t, tags=["hiphop"])
+        a1 = AnswerFactory(question=q1, content="helpful answer")
+        AnswerFactory(question=q1, content="spam answer", is_spam=True)
+        AnswerVoteFactory(answer=a1, helpful=True)
+        QuestionVoteFactory(question=q1)
+        QuestionVoteFactory(question=q1)
+        q2 = QuestionFactory(title="second")
+        spam = QuestionFactory(title="spam", is_spam=True)
+
+        docs = QuestionMappingType.extract_documents([q1.id, q2.id, spam.id])
+
+        eq_(sorted(docs.keys()), sorted([q1.id, q2.id]))
+
+        eq_(docs[q1.id]["question_title"], "first")
+        eq_(docs[q1.id]["question_tag"], ["hiphop"])
+        eq_(docs[q1.id]["question_num_votes"], 2)
+        eq_(docs[q1.id]["question_answer_content"], ["helpful answer"])
+        eq_(docs[q1.id]["question_answer_creator"], [a1.creator.username])
+        eq_(docs[q1.id]["question_has_helpful"], True)
+        eq_(docs[q1.id]["product"], [p.slug])
+        eq_(docs[q1.id]["topic"], [t.slug])
+
+        eq_(docs[q2.id]["product"], [])
+        eq_(docs[q2.id]["question_tag"], [])
+        eq_(docs[q2.id]["question_num_votes"], 0)
+        eq_(docs[q2.id]["question_answer_content"], [])
+        eq_(docs[q2.id]["question_has_helpful"], False)
+
+        # The single document version builds the same thing.
+        doc = QuestionMappingType.extract_document(q1.id)
+        del doc["indexed_on"], docs[q1.id]["indexed_on"]
+        eq_(doc, docs[q1.id])
+
+
 class QuestionSearchTests(ElasticTestCase):
     """Tests about searching for questions"""
 
@@ -219,6 +257,70 @@ class AnswerMetricsTests(ElasticTestCase):
         data = AnswerMetricsMappingType.search()[0]
         eq_(data["by_asker"], True)
 
+    def test_vote_updates_counts(self):
+        """Voting updates the counts on the answer document."""
+        a = AnswerFactory()
+        self.refresh()
+
+        AnswerVoteFactory(answer=a, helpful=True)
+        AnswerVoteFactory(answer=a, helpful=False)
+        AnswerVoteFactory(answer=a, helpful=True)
+        self.refresh()
+
+        data = AnswerMetricsMappingType.search()[0]
+        eq_(data["helpful_count"], 2)
+        eq_(data["unhelpful_count"], 1)
+        eq_(data["creator_id"], a.creator_id)
+
+        data = QuestionMappingType.search().filter(id=a.question_id)[0]
+        eq_(data["question_has_helpful"], True)
+
+    def test_vote_delete_updates_counts(self):
+        """Deleting a vote updates the counts too."""
+        a = AnswerFactory()
+        vote = AnswerVoteFactory(answer=a, helpful=True)
+        self.refresh()
+
+        vote.delete()
+        self.refresh()
+
+        data = AnswerMetricsMappingType.search()[0]
+        eq_(data["helpful_count"], 0)
+        data = QuestionMappingType.search().filter(id=a.question_id)[0]
+        eq_(data["question_has_helpful"], False)
+
+    def test_vote_on_spam_isnt_helpful(self):
+        """A helpful vote on a spam answer doesn't make the question
+        helpful, same as a full reindex."""
+        a = AnswerFactory()
+        spam = AnswerFactory(question=a.question, is_spam=True)
+        AnswerVoteFactory(answer=spam, helpful=True)
+        self.refresh()
+
+        data = QuestionMappingType.search().filter(id=a.question_id)[0]
+        eq_(data["question_has_helpful"], False)
+
+    def test_bulk_update(self):
+        """bulk_update only touches the fields it's given."""
+        a1 = AnswerFactory()
+        a2 = AnswerFactory()
+        self.refresh()
+
+        missing = AnswerMetricsMappingType.bulk_update(
+            {a1.id: {"helpful_count": 5}, a2.id: {"unhelpful_count": 3}, a2.id + 1000: {}}
+        )
+        self.refresh()
+
+        eq_(missing, [a2.id + 1000])
+        docs = dict(
+            (int(doc["id"]), doc) for doc in AnswerMetricsMappingType.search().values_dict()
+        )
+        eq_(docs[a1.id]["helpful_count"], 5)
+        eq_(docs[a1.id]["unhelpful_count"], 0)
+        eq_(docs[a1.id]["creator_id"], a1.creator_id)
+        eq_(docs[a2.id]["helpful_count"], 0)
+        eq_(docs[a2.id]["unhelpful_count"], 3)
+
 
 class SupportForumTopContributorsTests(ElasticTestCase):
     client_class = LocalizingClient
@@ -61,7 +61,7 @@ from kitsune.sumo.utils import build_paged_url, is_ratelimited, paginate, simple
 from kitsune.tags.utils import add_existing_tag
 from kitsune.upload.models import ImageAttachment
 from kitsune.upload.views import upload_imageattachment
-from kitsune.users.models import Setting
+from kitsune.users.models import Setting, prefetch_profiles
 from kitsune.users.templatetags.jinja_helpers import display_name
 from kitsune.wiki.facets import topics_for
 from kitsune.wiki.utils import get_featured_articles
@@ -1420,7 +1420,11 @@ def _answers_data(request, question_id, form=None, watch_form=None, answer_previ
     if not request.user.has_perm("flagit.can_moderate"):
         answers_ = answers_.filter(is_spam=False)
 
-    answers_ = paginate(request, answers_, per_page=config.ANSWERS_PER_PAGE)
+    answers_ = paginate(
+        request, answers_.select_related("creator"), per_page=config.ANSWERS_PER_PAGE
+    )
+    # The page shows the avatars and names of everyone who answered.
+    prefetch_profiles([question.creator] + [answer.creator for answer in answers_])
     feed_urls = (
         (
             reverse("questions.answers.feed", kwargs={"question_id": question_id}),
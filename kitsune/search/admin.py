@@ -1,5 +1,4 @@
 import logging
-import time
 from datetime import datetime
 
 import requests
@@ -26,7 +25,7 @@ from kitsune.search.es_utils import (
 )
 from kitsune.search.models import Record, get_mapping_types, Synonym
 from kitsune.search.tasks import index_chunk_task, update_synonyms_task
-from kitsune.search.utils import chunked, to_class_path
+from kitsune.search.utils import chunked, create_batch_id, to_class_path
 
 
 log = logging.getLogger("k.es")
@@ -44,14 +43,6 @@ class DeleteError(Exception):
     pass
 
 
-def create_batch_id():
-    """Returns a batch_id"""
-    # TODO: This is silly, but it's a good enough way to distinguish
-    # between batches by looking at a Record. This is just over the
-    # number of seconds in a day.
-    return str(int(time.time()))[-6:]
-
-
 def handle_delete(request):
     """Deletes an index"""
     index_to_delete = request.POST.get("delete_index")
@@ -9,6 +9,7 @@ from kitsune.products.models import Product
 from kitsune.questions.models import Question, QuestionMappingType
 from kitsune.questions.api import QuestionSerializer
 from kitsune.search import es_utils
+from kitsune.search.cache import cached_search, normalize_query
 from kitsune.sumo.api_utils import GenericAPIException
 from kitsune.wiki.api import DocumentDetailSerializer
 from kitsune.wiki.models import Document, DocumentMappingType
@@ -80,8 +81,8 @@ def suggest(request):
 
     data = serializer.validated_data
 
-    return Response(
-        {
+    def _suggest():
+        return {
             "questions": _question_suggestions(
                 searcher, data["q"], data["locale"], data["product"], data["max_questions"]
             ),
@@ -89,6 +90,17 @@ def suggest(request):
                 searcher, data["q"], data["locale"], data["product"], data["max_documents"]
             ),
         }
+
+    return Response(
+        cached_search(
+            "suggest",
+            _suggest,
+            q=normalize_query(data["q"]),
+            locale=data["locale"],
+            product=data["product"],
+            max_questions=data["max_questions"],
+            max_documents=data["max_documents"],
+        )
     )
 
 
@@ -0,0 +1,65 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from kitsune.sumo.utils import LRUCache, bump_cache_generation, get_cache_generation
+
+# Holds the index generation. It's part of the key of every cached
+# search result, so changing it invalidates all of them.
+INDEX_GENERATION_KEY = "search:index_generation"
+
+_results = LRUCache(settings.SEARCH_RESULT_CACHE_SIZE)
+
+
+def get_index_generation():
+    """Return the current index generation"""
+    return get_cache_generation(INDEX_GENERATION_KEY)
+
+
+def bump_index_generation():
+    """Invalidate all cached search results"""
+    bump_cache_generation(INDEX_GENERATION_KEY)
+
+
+def normalize_query(query):
+    """Normalize a query so that queries that search the same share a key"""
+    return " ".join(query.lower().split())
+
+
+def cached_search(name, fun, **params):
+    """Return the results of fun(), cached by name and params
+
+    The results have to be picklable. They're cached for
+    ``SEARCH_RESULT_CACHE_TIMEOUT`` seconds, or until the index
+    generation changes. Reindexing, live indexing and unindexing, and
+    partial updates all change it.
+
+    :arg name: name of the search, so different searches with the same
+        params don't collide
+    :arg fun: function that does the search and returns the results
+    :arg params: everything the results depend on; these have to be
+        serializable into JSON
+
+    """
+    timeout = settings.SEARCH_RESULT_CACHE_TIMEOUT
+    if not timeout:
+        return fun()
+
+    params = json.dumps(params, sort_keys=True)
+    key = "search:results:%s:%s:%s" % (
+        name,
+        get_index_generation(),
+        hashlib.md5(params.encode()).hexdigest(),
+    )
+
+    results = _results.get(key)
+    if results is None:
+        results = cache.get(key)
+        if results is None:
+            results = fun()
+            cache.set(key, results, timeout)
+        _results.set(key, results, timeout)
+
+    return results
@@ -1,21 +1,25 @@
+import datetime
 import json
 import logging
+import multiprocessing
 import pprint
 import time
 from functools import wraps
 
 from django.conf import settings
-from django.db import reset_queries
+from django.db import connections, reset_queries
 from django.http import HttpResponse
 from django.shortcuts import render
 from django.utils.translation import ugettext as _
 
 import requests
+from elasticsearch.exceptions import TransportError
 from elasticutils import S as UntypedS
 from elasticutils.contrib.django import S, F, get_es, ES_EXCEPTIONS  # noqa
 
 from kitsune.search import config
-from kitsune.search.utils import chunked
+from kitsune.search.cache import bump_index_generation
+from kitsune.search.utils import chunked, create_batch_id, from_class_path, to_class_path
 
 
 # These used to be constants, but that was problematic. Things like
@@ -251,6 +255,43 @@ def get_documents(cls, ids):
     return cls.reshape(ret)
 
 
+def msearch(searchers):
+    """Executes several searches in one request to Elasticsearch
+
+    The results get stored on each S just like executing it would, so
+    iterating over them or calling ``.count()`` afterwards doesn't go
+    back to Elasticsearch.
+
+    :arg searchers: list of S to execute; they're sent using the
+        Elasticsearch of the first one
+
+    :returns: list of SearchResults in the same order
+    """
+    if not searchers:
+        return []
+
+    body = []
+    for searcher in searchers:
+        header = {"index": searcher.get_indexes(), "type": searcher.get_doctypes()}
+        if searcher.search_type:
+            header["search_type"] = searcher.search_type
+        body.append(header)
+        body.append(searcher.build_search())
+
+    responses = searchers[0].get_es().msearch(body=body)["responses"]
+
+    for searcher, response in zip(searchers, responses):
+        if "error" in response:
+            raise TransportError(500, response["error"])
+
+        results = searcher.to_python(response.get("hits", {}).get("hits", []))
+        searcher._results_cache = searcher.get_results_class()(
+            searcher.type, response, results, searcher.fields
+        )
+
+    return [searcher._results_cache for searcher in searchers]
+
+
 def get_analysis():
     """Generate all our custom analyzers, tokenizers, and filters
 
@@ -402,15 +443,50 @@ def get_indexable(percent=100, seconds_ago=0, mapping_types=None):
     return to_index
 
 
-def index_chunk(cls, id_list, reraise=False):
+def _extract_one_by_one(cls, ids, reraise=False):
+    """Extract documents for ids individually.
+
+    This is the slow path used when extracting a whole batch fails so
+    that one bad id doesn't keep the rest of the batch out of the
+    index.
+
+    :returns: (dict of id -> document, list of ids that failed)
+
+    """
+    documents = {}
+    failed = []
+    for id_ in ids:
+        try:
+            documents[id_] = cls.extract_document(id_)
+
+        except UnindexMeBro:
+            # extract_document throws this in cases where we need
+            # to remove the item from the index.
+            pass
+
+        except Exception:
+            log.exception("Unable to extract/index document (id: %d)", id_)
+            if reraise:
+                raise
+            failed.append(id_)
+
+    return documents, failed
+
+
+def index_chunk(cls, id_list, reraise=False, es=None):
     """Index a chunk of documents.
 
     :arg cls: The MappingType class.
     :arg id_list: Iterable of ids of that MappingType to index.
     :arg reraise: False if you want errors to be swallowed and True
         if you want errors to be thrown.
+    :arg es: The Elasticsearch to use. Defaults to the mapping type's.
+
+    :returns: list of ids that couldn't be extracted
 
     """
+    all_failed = []
+
     # Note: This bulk indexes in batches of 80. I didn't arrive at
     # this number through a proper scientific method. It's possible
     # there's a better number. It takes a while to fiddle with,
@@ -419,32 +495,129 @@ def index_chunk(cls, id_list, reraise=False):
     # --criticalmass, runs overnight and returns a more "optimal"
     # number.
     for ids in chunked(id_list, 80):
-        documents = []
-        for id_ in ids:
-            try:
-                documents.append(cls.extract_document(id_))
-
-            except UnindexMeBro:
-                # extract_document throws this in cases where we need
-                # to remove the item from the index.
-                cls.unindex(id_)
+        failed = []
+        try:
+            documents = cls.extract_documents(ids)
+        except Exception:
+            log.exception(
+                "Unable to extract %s batch, falling back to one at a time",
+                cls.get_mapping_type_name(),
+            )
+            documents, failed = _extract_one_by_one(cls, ids, reraise=reraise)
+            all_failed.extend(failed)
 
-            except Exception:
-                log.exception("Unable to extract/index document (id: %d)", id_)
-                if reraise:
-                    raise
+        for id_ in ids:
+            # extract_documents leaves out things we need to remove
+            # from the index. Things that failed stay as they are.
+            if id_ not in documents and id_ not in failed:
+                cls.unindex(id_, es=es)
 
         if documents:
-            cls.bulk_index(documents, id_field="id")
+            cls.bulk_index(list(documents.values()), id_field="id", es=es)
 
         if settings.DEBUG:
             # Nix queries so that this doesn't become a complete
             # memory hog and make Will's computer sad when DEBUG=True.
             reset_queries()
 
+    # Cached search results may be out of date now.
+    bump_index_generation()
+
+    return all_failed
+
+
+# The Elasticsearch object an indexing worker process uses. See
+# _init_index_worker.
+_worker_es = None
+
+
+def _init_index_worker():
+    """Set up a process in the parallel reindexing pool.
+
+    Each worker gets its own Elasticsearch connection rather than
+    sharing the sockets of the one it inherited from the parent
+    process. Database connections are closed in the parent before
+    forking, so workers open their own as soon as they need one.
+
+    """
+    global _worker_es
+    _worker_es = get_es(force_new=True)
+
+
+def _index_chunk_in_worker(args):
+    """Index a chunk in a pool worker.
+
+    :arg args: (class path, id_list) tuple
+
+    :returns: (id_list, list of ids that failed)
+
+    """
+    cls_path, id_list = args
+    failed = index_chunk(from_class_path(cls_path), id_list, es=_worker_es)
+    return id_list, failed
+
+
+def _index_chunks(cls, indexable, pool=None):
+    """Index indexable in chunks of 1000.
+
+    :arg cls: The MappingType class.
+    :arg indexable: Iterable of ids of that MappingType to index.
+    :arg pool: If not None, the multiprocessing pool to spread the
+        chunks across.
+
+    :returns: generator of (chunk, list of ids that failed) for each
+        chunk. Chunks come back in order even when a pool is indexing
+        them, so everything up to the last chunk is done.
+
+    """
+    chunks = chunked(indexable, 1000)
+    if pool is None:
+        for chunk in chunks:
+            yield chunk, index_chunk(cls, chunk)
+    else:
+        cls_path = to_class_path(cls)
+        tasks = ((cls_path, chunk) for chunk in chunks)
+        for result in pool.imap(_index_chunk_in_worker, tasks):
+            yield result
+
+
+def _get_checkpoints(mapping_type_names, resume=False):
+    """Returns the Records to checkpoint a reindex run in.
+
+    :arg mapping_type_names: names of the mapping types being indexed
+    :arg resume: whether to pick up the records of the last run
+
+    :returns: dict of mapping type name -> Record
+
+    """
+    # Avoid circular import
+    from kitsune.search.models import Record
+
+    checkpoints = {}
+    batch_id = create_batch_id()
+    if resume:
+        for rec in Record.objects.latest_checkpoints():
+            checkpoints[rec.mapping_type] = rec
+            batch_id = rec.batch_id
+
+    for name in mapping_type_names:
+        if name not in checkpoints:
+            checkpoints[name] = Record.objects.create(
+                batch_id=batch_id, name="Reindexing: %s" % name, mapping_type=name
+            )
+
+    return checkpoints
+
 
 def es_reindex_cmd(
-    percent=100, delete=False, mapping_types=None, criticalmass=False, seconds_ago=0, log=log
+    percent=100,
+    delete=False,
+    mapping_types=None,
+    criticalmass=False,
+    seconds_ago=0,
+    workers=1,
+    resume=False,
+    log=log,
 ):
     """Rebuild ElasticSearch indexes
 
@@ -455,6 +628,13 @@ def es_reindex_cmd(
         things
     :arg seconds_ago: things updated less than this number of seconds
         ago should be reindexed
+    :arg workers: the number of processes to index with. With more
+        than one, the ids of each mapping type get split into chunks
+        that are spread across a pool of worker processes.
+    :arg resume: whether to pick up where the last run stopped. Each
+        run records how far it got through each mapping type and which
+        ids failed. Resuming skips mapping types that finished and ids
+        that were already indexed, and retries the ones that failed.
     :arg log: the logger to use
 
     """
@@ -502,6 +682,7 @@ def es_reindex_cmd(
     else:
         all_indexable = get_indexable(percent, seconds_ago)
 
+    pool = None
     try:
         old_refreshes = {}
         # We're doing a lot of indexing, so we get the refresh_interval of
@@ -511,23 +692,63 @@ def es_reindex_cmd(
             # Disable automatic refreshing
             es.indices.put_settings(index=index, body={"index": {"refresh_interval": "-1"}})
 
+        if workers > 1:
+            # Workers shouldn't inherit our database connections, so
+            # close them all before forking.
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(
+                workers, initializer=_init_index_worker
+            )
+            log.info("indexing with %s workers", workers)
+
+        # Avoid circular import
+        from kitsune.search.models import Record
+
+        checkpoints = _get_checkpoints(
+            [cls.get_mapping_type_name() for cls, indexable in all_indexable], resume
+        )
+
         start_time = time.time()
         for cls, indexable in all_indexable:
             cls_start_time = time.time()
+            rec = checkpoints[cls.get_mapping_type_name()]
+
+            if rec.status == Record.STATUS_SUCCESS:
+                log.info("skipping %s. done in the last run.", cls.get_mapping_type_name())
+                continue
+
+            if rec.last_id is not None:
+                log.info("resuming %s after id %s", cls.get_mapping_type_name(), rec.last_id)
+                indexable = [id_ for id_ in indexable if id_ > rec.last_id]
+
+            # Ids that failed last time get retried at the end with the
+            # ones that fail this time.
+            failed = rec.get_failed_ids()
+
+            rec.start_time = datetime.datetime.now()
+            rec.status = Record.STATUS_IN_PROGRESS
+            rec.message = "Reindexing into %s" % cls.get_index()
+            rec.save()
+
             total = len(indexable)
 
-            if total == 0:
+            if total == 0 and not failed:
+                rec.mark_success()
                 continue
 
             chunk_start_time = time.time()
             log.info("reindexing %s. %s to index....", cls.get_mapping_type_name(), total)
 
             i = 0
-            for chunk in chunked(indexable, 1000):
-                chunk_start_time = time.time()
-                index_chunk(cls, chunk)
-
+            for chunk, chunk_failed in _index_chunks(cls, indexable, pool):
                 i += len(chunk)
+                failed.extend(chunk_failed)
+
+                rec.last_id = chunk[-1]
+                rec.indexed += len(chunk) - len(chunk_failed)
+                rec.set_failed_ids(failed)
+                rec.save()
+
                 time_to_go = (total - i) * ((time.time() - cls_start_time) / i)
                 per_1000 = (time.time() - cls_start_time) / (i / 1000.0)
                 this_1000 = time.time() - chunk_start_time
@@ -540,18 +761,36 @@ def es_reindex_cmd(
                     format_time(per_1000),
                     format_time(time_to_go),
                 )
+                chunk_start_time = time.time()
+
+            if failed:
+                log.info("   retrying %s that failed...", len(failed))
+                retried = len(failed)
+                failed = index_chunk(cls, failed)
+                rec.indexed += retried - len(failed)
+                rec.set_failed_ids(failed)
+
+            if failed:
+                log.error("   %s failed to index: %s", len(failed), failed)
+                rec.mark_fail("%s failed to index" % len(failed))
+            else:
+                rec.mark_success()
 
             delta_time = time.time() - cls_start_time
             log.info(
                 "   done! (%s total, %s/1000 avg)",
                 format_time(delta_time),
-                format_time(delta_time / (total / 1000.0)),
+                format_time(delta_time / (max(total, 1) / 1000.0)),
             )
 
         delta_time = time.time() - start_time
         log.info("done! (%s total)", format_time(delta_time))
 
     finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
         # Re-enable automatic refreshing
         for index, old_refresh in list(old_refreshes.items()):
             es.indices.put_settings(index=index, body={"index": {"refresh_interval": old_refresh}})
@@ -52,6 +52,19 @@ class Command(BaseCommand):
             dest="criticalmass",
             help="Indexes a critical mass of things",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            dest="workers",
+            default=1,
+            help="Number of processes to index with",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            dest="resume",
+            help="Continue where the last reindex stopped",
+        )
 
     # We (ab)use override_settings to force ES_LIVE_INDEXING for the
     # duration of this command so that it actually indexes stuff.
@@ -64,6 +77,8 @@ class Command(BaseCommand):
         seconds_ago = options["seconds_ago"]
         seconds_ago += options["minutes_ago"] * 60
         seconds_ago += options["hours_ago"] * 3600
+        workers = options["workers"]
+        resume = options["resume"]
         if mapping_types:
             mapping_types = mapping_types.split(",")
         if not 1 <= percent <= 100:
@@ -76,6 +91,12 @@ class Command(BaseCommand):
             raise CommandError("you can't specify criticalmass and percent")
         if mapping_types and criticalmass:
             raise CommandError("you can't specify criticalmass and mapping_types")
+        if workers < 1:
+            raise CommandError("workers should be at least 1")
+        if resume and delete:
+            raise CommandError("you can't specify resume and delete")
+        if resume and criticalmass:
+            raise CommandError("you can't specify resume and criticalmass")
 
         es_reindex_cmd(
             percent=percent,
@@ -83,5 +104,7 @@ class Command(BaseCommand):
             mapping_types=mapping_types,
             criticalmass=criticalmass,
             seconds_ago=seconds_ago,
+            workers=workers,
+            resume=resume,
             log=FakeLogger(self.stdout),
         )
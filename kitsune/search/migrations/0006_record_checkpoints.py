@@ -0,0 +1,33 @@
+# Generated by Django 2.2.14 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0005_auto_20200629_0826'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='failed_ids',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='indexed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='last_id',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='mapping_type',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import datetime
 import logging
+import time
 from threading import local
 
 from django.conf import settings
@@ -8,10 +9,12 @@ from django.db import models
 from django.db.models.signals import m2m_changed, post_save, pre_delete
 from django.dispatch import receiver
 from elasticsearch.exceptions import NotFoundError
+from elasticsearch.helpers import BulkIndexError, streaming_bulk
 from elasticutils.contrib.django import MLT, Indexable, MappingType
 
 from kitsune.search import es_utils
-from kitsune.search.tasks import index_task, unindex_task
+from kitsune.search.cache import bump_index_generation
+from kitsune.search.tasks import index_task, queue_index, unindex_task
 from kitsune.search.utils import to_class_path
 from kitsune.sumo.models import ModelBase
 
@@ -45,6 +48,16 @@ def _local_tasks():
     return _local.tasks
 
 
+def call_later(fun, *args):
+    """Register fun(*args) to be called at the end of the request.
+
+    That's after the request's transaction is committed. Like the
+    indexing tasks, identical calls are only made once.
+
+    """
+    _local_tasks().add((fun, args))
+
+
 class SearchMixin(object):
     """A mixin which adds ES indexing support for the model
 
@@ -68,9 +81,11 @@ class SearchMixin(object):
 
     def index_later(self):
         """Register myself to be indexed at the end of the request."""
-        _local_tasks().add(
-            (index_task.delay, (to_class_path(self.get_mapping_type()), (self.pk,)))
-        )
+        if settings.ES_INDEX_QUEUE_DELAY:
+            fun = queue_index
+        else:
+            fun = index_task.delay
+        _local_tasks().add((fun, (to_class_path(self.get_mapping_type()), (self.pk,))))
 
     def unindex_later(self):
         """Register myself to be unindexed at the end of the request."""
@@ -86,7 +101,7 @@ class SearchMappingType(MappingType, Indexable):
 
     1. get_mapping needs to return {'properties': { ... fields ... }}
     2. get_query_fields should return a list of fields for query
-    3. extract_document
+    3. extract_documents
     4. get_model
     5. the mapping type class should be decorated with
        ``@register_mapping_type``
@@ -138,6 +153,41 @@ class SearchMappingType(MappingType, Indexable):
 
         return qs
 
+    @classmethod
+    def extract_documents(cls, ids):
+        """Extracts indexable documents for a batch of ids
+
+        Implementations should fetch everything they need with a fixed
+        number of queries per batch rather than a handful per id.
+
+        :arg ids: list of ids of this mapping type's model
+
+        :returns: dict of id -> document. Ids that shouldn't be in the
+            index (they don't exist anymore, are spam, are redirects,
+            etc) are left out.
+
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def extract_document(cls, obj_id, obj=None):
+        """Extracts the indexable document for a single id
+
+        This goes through ``extract_documents`` so that both paths
+        always build identical documents.
+
+        :raises UnindexMeBro: if the document should be removed from
+            the index
+
+        """
+        if obj is not None:
+            obj_id = obj.pk
+
+        documents = cls.extract_documents([obj_id])
+        if obj_id not in documents:
+            raise es_utils.UnindexMeBro()
+        return documents[obj_id]
+
     @classmethod
     def reshape(cls, results):
         """Reshapes the results so lists are lists and everything is not"""
@@ -174,6 +224,61 @@ class SearchMappingType(MappingType, Indexable):
             # not there.
             pass
 
+    @classmethod
+    def bulk_update(cls, updates, es=None, index=None):
+        """Updates some of the fields of a batch of documents.
+
+        Only the fields passed in get sent to Elasticsearch, so this is
+        a lot cheaper than indexing the whole document when all that
+        changed is a vote count or a flag. ``indexed_on`` gets bumped,
+        too.
+
+        :arg updates: dict of id -> dict of fields to update
+        :arg es: The `Elasticsearch` to use. Defaults to `cls.get_es()`.
+        :arg index: The index to use. Defaults to `cls.get_index()`.
+
+        :returns: list of ids of documents that aren't in the index, so
+            couldn't be updated. Those need to be indexed in full.
+
+        """
+        if not settings.ES_LIVE_INDEXING or not updates:
+            return []
+
+        if es is None:
+            es = cls.get_es()
+
+        if index is None:
+            index = cls.get_index()
+
+        indexed_on = int(time.time())
+        actions = (
+            {
+                "_op_type": "update",
+                "_index": index,
+                "_type": cls.get_mapping_type_name(),
+                "_id": id_,
+                "doc": dict(fields, indexed_on=indexed_on),
+            }
+            for id_, fields in updates.items()
+        )
+
+        missing = []
+        for ok, item in streaming_bulk(es, actions, raise_on_error=False):
+            if ok:
+                continue
+
+            item = item["update"]
+            if item.get("status") == 404:
+                missing.append(int(item["_id"]))
+            else:
+                raise BulkIndexError(
+                    "Failed to update %s: %s" % (item["_id"], item.get("error")), [item]
+                )
+
+        # Cached search results may show the old values.
+        bump_index_generation()
+        return missing
+
     @classmethod
     def morelikethis(cls, id_, s, fields):
         """MoreLikeThis API"""
@@ -304,8 +409,20 @@ signals.request_finished.connect(generate_tasks)
 
 class RecordManager(models.Manager):
     def outstanding(self):
-        """Return outstanding records"""
-        return self.filter(status__in=Record.STATUS_OUTSTANDING)
+        """Return outstanding records of the admin's reindexing chunks
+
+        esreindex checkpoints are left out. They stay outstanding after a
+        run is stopped, so that it can be resumed.
+        """
+        return self.filter(status__in=Record.STATUS_OUTSTANDING, mapping_type="")
+
+    def latest_checkpoints(self):
+        """Return the checkpoint records of the most recent esreindex run"""
+        checkpoints = self.exclude(mapping_type="")
+        latest = checkpoints.order_by("-creation_time").first()
+        if latest is None:
+            return self.none()
+        return checkpoints.filter(batch_id=latest.batch_id)
 
 
 class Record(ModelBase):
@@ -333,6 +450,14 @@ class Record(ModelBase):
     status = models.IntegerField(choices=STATUS_CHOICES, default=STATUS_NEW)
     message = models.CharField(max_length=255, blank=True)
 
+    # esreindex keeps one of these per mapping type as a checkpoint so
+    # an interrupted run can be resumed. They're blank for the chunk
+    # records created by the admin.
+    mapping_type = models.CharField(max_length=255, blank=True)
+    last_id = models.IntegerField(null=True)
+    indexed = models.IntegerField(default=0)
+    failed_ids = models.TextField(blank=True)
+
     objects = RecordManager()
 
     class Meta:
@@ -345,6 +470,13 @@ class Record(ModelBase):
             return self.end_time - self.start_time
         return None
 
+    def get_failed_ids(self):
+        """Return the list of ids that failed to index."""
+        return [int(id_) for id_ in self.failed_ids.split(",") if id_]
+
+    def set_failed_ids(self, ids):
+        self.failed_ids = ",".join(str(id_) for id_ in ids)
+
     def _complete(self, status, msg="Done"):
         self.end_time = datetime.datetime.now()
         self.status = status
@@ -1,14 +1,18 @@
 import datetime
 import logging
 import sys
+import time
 import traceback
 
 from celery import task
+from django.conf import settings
 from elasticutils.contrib.django import get_es
 from multidb.pinning import pin_this_thread, unpin_this_thread
 
-from kitsune.search.es_utils import UnindexMeBro, get_analysis, index_chunk, write_index
+from kitsune.search.cache import bump_index_generation
+from kitsune.search.es_utils import get_analysis, index_chunk, write_index
 from kitsune.search.utils import from_class_path
+from kitsune.sumo.redis_utils import RedisError, redis_client
 
 # This is present in memcached when reindexing is in progress and
 # holds the number of outstanding index chunks. Once it hits 0,
@@ -17,6 +21,14 @@ OUTSTANDING_INDEX_CHUNKS = "search:outstanding_index_chunks"
 
 CHUNK_SIZE = 50000
 
+# Redis sorted set of "class_path|id" things waiting to be indexed by
+# drain_index_queue. The score is when they were first queued.
+INDEX_QUEUE_KEY = "search:index_queue"
+
+# This is present in redis while a drain_index_queue task is scheduled
+# so that there's only ever one.
+INDEX_QUEUE_SCHEDULED_KEY = "search:index_queue:scheduled"
+
 log = logging.getLogger("k.task")
 
 
@@ -111,13 +123,17 @@ def index_task(cls_path, id_list, **kw):
         pin_this_thread()
 
         qs = cls.get_model().objects.filter(pk__in=id_list).values_list("pk", flat=True)
-        for id_ in qs:
-            try:
-                cls.index(cls.extract_document(id_), id_=id_)
-            except UnindexMeBro:
-                # If extract_document throws this, then we need to
-                # remove this item from the index.
+        ids = list(qs)
+        documents = cls.extract_documents(ids)
+        for id_ in ids:
+            if id_ in documents:
+                cls.index(documents[id_], id_=id_)
+            else:
+                # extract_documents leaves out things we need to
+                # remove from the index.
                 cls.unindex(id_)
+        # Cached search results may show these.
+        bump_index_generation()
 
     except Exception as exc:
         retries = index_task.request.retries
@@ -131,6 +147,113 @@ def index_task(cls_path, id_list, **kw):
         unpin_this_thread()
 
 
+@task()
+def update_task(cls_path, updates, **kw):
+    """Update some fields of documents specified by cls and ids
+
+    :arg cls_path: the class path of the mapping type
+    :arg updates: dict of id -> dict of fields to update
+
+    Documents that aren't in the index yet get indexed in full.
+
+    """
+    cls = from_class_path(cls_path)
+    try:
+        # The ids are strings after going through json.
+        missing = cls.bulk_update(dict((int(id_), fields) for id_, fields in updates.items()))
+        if missing:
+            index_task.delay(cls_path, missing)
+
+    except Exception as exc:
+        retries = update_task.request.retries
+        if retries >= MAX_RETRIES:
+            # Some exceptions aren't pickleable and we need this to
+            # throw things that are pickleable.
+            raise IndexingTaskError()
+
+        update_task.retry(exc=exc, max_retries=MAX_RETRIES, countdown=RETRY_TIMES[retries])
+
+
+def _schedule_index_queue_drain(redis):
+    """Schedule a drain_index_queue task unless one is already scheduled."""
+    delay = settings.ES_INDEX_QUEUE_DELAY
+    # The key expires in case the task gets lost, so the queue can't
+    # get stuck.
+    if redis.set(INDEX_QUEUE_SCHEDULED_KEY, 1, nx=True, ex=delay * 2 + 60):
+        drain_index_queue.apply_async(countdown=delay)
+
+
+def queue_index(cls_path, id_list):
+    """Queue documents to be indexed by drain_index_queue.
+
+    The first thing queued schedules a drain ES_INDEX_QUEUE_DELAY
+    seconds later. Everything queued until then, including things that
+    get saved again and again, gets indexed once in bulk.
+
+    If redis isn't available, this indexes right away like
+    ``index_task`` does.
+
+    :arg cls_path: the class path of the mapping type
+    :arg id_list: list of ids to index
+
+    """
+    try:
+        redis = redis_client("default")
+    except RedisError:
+        log.exception("Unable to queue for indexing")
+        index_task.delay(cls_path, id_list)
+        return
+
+    members = dict(("%s|%s" % (cls_path, id_), time.time()) for id_ in id_list)
+    # nx keeps the time it was first queued.
+    redis.zadd(INDEX_QUEUE_KEY, members, nx=True)
+    _schedule_index_queue_drain(redis)
+
+
+@task()
+def drain_index_queue():
+    """Bulk index everything in the index queue"""
+    redis = redis_client("default")
+
+    # Grab everything and empty the queue in one go. Anything queued
+    # after this schedules the next drain.
+    pipe = redis.pipeline()
+    pipe.zrange(INDEX_QUEUE_KEY, 0, -1)
+    pipe.delete(INDEX_QUEUE_KEY)
+    pipe.delete(INDEX_QUEUE_SCHEDULED_KEY)
+    members = pipe.execute()[0]
+
+    if not members or not settings.ES_LIVE_INDEXING:
+        return
+
+    to_index = {}
+    for member in members:
+        cls_path, id_ = member.rsplit("|", 1)
+        to_index.setdefault(cls_path, []).append(int(id_))
+
+    try:
+        # Pin to master db to avoid replication lag issues and stale
+        # data.
+        pin_this_thread()
+
+        # Things that fail to extract get logged and skipped. It's
+        # errors talking to Elasticsearch that get the queue retried.
+        for cls_path, id_list in to_index.items():
+            index_chunk(from_class_path(cls_path), id_list)
+
+    except Exception:
+        log.exception("Error while draining the index queue")
+        # Put everything back so it gets another go in the next drain.
+        redis.zadd(INDEX_QUEUE_KEY, dict((member, time.time()) for member in members), nx=True)
+        _schedule_index_queue_drain(redis)
+        # Some exceptions aren't pickleable and we need this to throw
+        # things that are pickleable.
+        raise IndexingTaskError()
+
+    finally:
+        unpin_this_thread()
+
+
 @task()
 def unindex_task(cls_path, id_list, **kw):
     """Unindex documents specified by cls and ids"""
@@ -141,6 +264,7 @@ def unindex_task(cls_path, id_list, **kw):
         pin_this_thread()
         for id_ in id_list:
             cls.unindex(id_)
+        bump_index_generation()
     except Exception as exc:
         retries = unindex_task.request.retries
         if retries >= MAX_RETRIES:
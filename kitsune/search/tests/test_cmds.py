@@ -1,11 +1,14 @@
 from django.core.management import call_command
 
 from unittest import mock
+from nose.tools import eq_
 
 from kitsune.products.tests import ProductFactory
-from kitsune.search import es_utils
+from kitsune.search import admin, es_utils
+from kitsune.search.models import Record
 from kitsune.search.tests import ElasticTestCase
 from kitsune.search.utils import FakeLogger
+from kitsune.wiki.models import DocumentMappingType
 from kitsune.wiki.tests import DocumentFactory, RevisionFactory
 
 
@@ -38,6 +41,73 @@ class ESCommandTests(ElasticTestCase):
         call_command("esreindex", "--mapping_types=wiki_documents")
         call_command("esreindex", "--delete")
 
+    @mock.patch.object(FakeLogger, "_out")
+    def test_reindex_records_checkpoints(self, _out):
+        doc = DocumentFactory()
+        RevisionFactory(document=doc, is_approved=True)
+        name = DocumentMappingType.get_mapping_type_name()
+
+        call_command("esreindex", "--mapping_types=%s" % name)
+
+        rec = Record.objects.get(mapping_type=name)
+        eq_(rec.status, Record.STATUS_SUCCESS)
+        eq_(rec.last_id, doc.id)
+        eq_(rec.indexed, 1)
+
+        # Everything is done, so resuming doesn't index anything.
+        with mock.patch.object(es_utils, "index_chunk") as index_chunk:
+            call_command("esreindex", "--resume", "--mapping_types=%s" % name)
+        eq_(index_chunk.call_count, 0)
+
+    @mock.patch.object(FakeLogger, "_out")
+    def test_reindex_resume(self, _out):
+        doc0 = DocumentFactory()
+        RevisionFactory(document=doc0, is_approved=True)
+        doc1 = DocumentFactory()
+        RevisionFactory(document=doc1, is_approved=True)
+        doc2 = DocumentFactory()
+        RevisionFactory(document=doc2, is_approved=True)
+        name = DocumentMappingType.get_mapping_type_name()
+
+        # A run that stopped after doc1 and failed to index doc0.
+        Record.objects.create(
+            batch_id="123456",
+            name="Reindexing: %s" % name,
+            mapping_type=name,
+            status=Record.STATUS_IN_PROGRESS,
+            last_id=doc1.id,
+            failed_ids=str(doc0.id),
+        )
+
+        with mock.patch.object(es_utils, "index_chunk", return_value=[]) as index_chunk:
+            call_command("esreindex", "--resume", "--mapping_types=%s" % name)
+
+        ids = [id_ for call in index_chunk.call_args_list for id_ in call[0][1]]
+        # doc1 isn't indexed again, doc2 is new and doc0 gets retried.
+        eq_(sorted(ids), sorted([doc0.id, doc2.id]))
+        eq_(Record.objects.get(mapping_type=name).status, Record.STATUS_SUCCESS)
+
+    def test_checkpoints_dont_block_admin_reindex(self):
+        """An unfinished esreindex run doesn't hold up the admin's."""
+        doc = DocumentFactory()
+        RevisionFactory(document=doc, is_approved=True)
+        name = DocumentMappingType.get_mapping_type_name()
+        checkpoint = Record.objects.create(
+            batch_id="123456",
+            name="Reindexing: %s" % name,
+            mapping_type=name,
+            status=Record.STATUS_IN_PROGRESS,
+        )
+
+        with mock.patch.object(admin, "index_chunk_task") as index_chunk_task:
+            admin.reindex([name])
+        eq_(index_chunk_task.delay.call_count, 1)
+
+        # Resetting the admin's records leaves the checkpoint to resume.
+        request = mock.Mock(path="/admin/search/")
+        admin.handle_reset(request)
+        eq_(Record.objects.get(id=checkpoint.id).status, Record.STATUS_IN_PROGRESS)
+
     @mock.patch.object(FakeLogger, "_out")
     def test_status(self, _out):
         p = ProductFactory(title="firefox", slug="desktop")
@@ -3,15 +3,19 @@ import json
 import unittest
 
 from django.contrib.sites.models import Site
+from django.test.utils import override_settings
 
 from unittest import mock
 from nose.tools import eq_
 
 from kitsune.questions.models import QuestionMappingType
 from kitsune.questions.tests import QuestionFactory, AnswerFactory, AnswerVoteFactory
-from kitsune.search import es_utils
+from kitsune.search import es_utils, tasks
 from kitsune.search.models import generate_tasks
 from kitsune.search.tests import ElasticTestCase
+from kitsune.search.utils import to_class_path
+from kitsune.sumo.redis_utils import RedisError, redis_client
+from kitsune.sumo.tests import SkipTest
 from kitsune.sumo.urlresolvers import reverse
 from kitsune.wiki.models import DocumentMappingType
 from kitsune.wiki.tests import DocumentFactory, ApprovedRevisionFactory
@@ -60,6 +64,47 @@ class TestUtils(ElasticTestCase):
         docs = es_utils.get_documents(QuestionMappingType, [q.id])
         eq_(docs[0]["id"], q.id)
 
+    def test_msearch(self):
+        QuestionFactory(title="apple")
+        QuestionFactory(title="banana")
+        self.refresh()
+
+        s1 = QuestionMappingType.search().query(question_title__match="apple")
+        s2 = QuestionMappingType.search()
+        results = es_utils.msearch([s1, s2])
+
+        eq_([r.count for r in results], [1, 2])
+        # The results are stored on the searchers, so using them
+        # doesn't search again.
+        with mock.patch.object(es_utils.Sphilastic, "raw") as raw:
+            eq_(s1.count(), 1)
+            eq_([doc["question_title"] for doc in s1], ["apple"])
+            eq_(len(s2), 2)
+            assert not raw.called
+
+    def test_index_chunk_falls_back_to_one_at_a_time(self):
+        q1 = QuestionFactory(title="good")
+        q2 = QuestionFactory(title="bad")
+        self.refresh()
+        QuestionMappingType.unindex(q1.id)
+        self.refresh()
+
+        extract_documents = QuestionMappingType.extract_documents
+
+        def broken_batch(ids):
+            if q2.id in ids:
+                raise ValueError("broken")
+            return extract_documents(ids)
+
+        with mock.patch.object(QuestionMappingType, "extract_documents", side_effect=broken_batch):
+            failed = es_utils.index_chunk(QuestionMappingType, [q1.id, q2.id])
+        self.refresh()
+
+        eq_(failed, [q2.id])
+        # The good one got indexed despite the bad one and the bad one
+        # was left alone rather than unindexed.
+        eq_(QuestionMappingType.search().count(), 2)
+
 
 class TestTasks(ElasticTestCase):
     @mock.patch.object(QuestionMappingType, "index")
@@ -95,6 +140,69 @@ class TestTasks(ElasticTestCase):
         eq_(index_fun.call_count, 1)
 
 
+@override_settings(ES_INDEX_QUEUE_DELAY=30)
+class TestIndexQueue(ElasticTestCase):
+    def setUp(self):
+        super(TestIndexQueue, self).setUp()
+        try:
+            self.redis = redis_client("default")
+            self.redis.flushdb()
+        except RedisError:
+            raise SkipTest
+
+    def tearDown(self):
+        self.redis.flushdb()
+        super(TestIndexQueue, self).tearDown()
+
+    def _clear_queue(self, apply_async):
+        # Factories queue up all kinds of related things, like the
+        # profiles of the users they create.
+        generate_tasks()
+        self.redis.flushdb()
+        apply_async.reset_mock()
+
+    @mock.patch.object(tasks.drain_index_queue, "apply_async")
+    def test_saves_are_coalesced(self, apply_async):
+        q = QuestionFactory(title="coalesce me")
+        self._clear_queue(apply_async)
+
+        q.save()
+        generate_tasks()
+        q.save()
+        generate_tasks()
+
+        # One thing in the queue and one drain scheduled.
+        eq_(self.redis.zcard(tasks.INDEX_QUEUE_KEY), 1)
+        eq_(apply_async.call_count, 1)
+
+        with mock.patch.object(QuestionMappingType, "bulk_index") as bulk_index:
+            tasks.drain_index_queue()
+
+        eq_(bulk_index.call_count, 1)
+        eq_([doc["id"] for doc in bulk_index.call_args[0][0]], [q.id])
+        eq_(self.redis.zcard(tasks.INDEX_QUEUE_KEY), 0)
+
+    @mock.patch.object(tasks.drain_index_queue, "apply_async")
+    def test_requeued_on_failure(self, apply_async):
+        q = QuestionFactory()
+        self._clear_queue(apply_async)
+
+        q.save()
+        generate_tasks()
+
+        with mock.patch.object(QuestionMappingType, "bulk_index", side_effect=ValueError):
+            with self.assertRaises(tasks.IndexingTaskError):
+                tasks.drain_index_queue()
+
+        eq_(
+            self.redis.zrange(tasks.INDEX_QUEUE_KEY, 0, -1),
+            ["%s|%s" % (to_class_path(QuestionMappingType), q.id)],
+        )
+        # The first drain was scheduled when q was queued. The second
+        # one is for the retry.
+        eq_(apply_async.call_count, 2)
+
+
 class TestMappings(unittest.TestCase):
     def test_mappings(self):
         # This is more of a linter than a test. If it passes, then
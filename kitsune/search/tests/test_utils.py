@@ -1,7 +1,13 @@
+from django.test.utils import override_settings
+
+from unittest.mock import Mock, patch
 from nose.tools import eq_
 
+from kitsune.search.cache import bump_index_generation, cached_search, get_index_generation
+from kitsune.search.tasks import unindex_task
 from kitsune.search.utils import chunked, from_class_path, to_class_path
 from kitsune.sumo.tests import TestCase
+from kitsune.wiki.models import DocumentMappingType
 
 
 class ChunkedTests(TestCase):
@@ -34,3 +40,36 @@ def test_to_class_path():
     eq_(
         to_class_path(FooBarClassOfAwesome), "kitsune.search.tests.test_utils:FooBarClassOfAwesome"
     )
+
+
+@override_settings(SEARCH_RESULT_CACHE_TIMEOUT=60)
+class CachedSearchTests(TestCase):
+    def test_cached(self):
+        fun = Mock(return_value={"results": [1]})
+        eq_(cached_search("test", fun, q="foo", page=1), {"results": [1]})
+        eq_(cached_search("test", fun, page=1, q="foo"), {"results": [1]})
+        eq_(fun.call_count, 1)
+
+        # Different params are cached separately.
+        cached_search("test", fun, q="foo", page=2)
+        eq_(fun.call_count, 2)
+
+    def test_bump_index_generation(self):
+        fun = Mock(return_value={"results": [1]})
+        cached_search("test", fun, q="bar")
+        bump_index_generation()
+        cached_search("test", fun, q="bar")
+        eq_(fun.call_count, 2)
+
+    def test_live_unindexing_bumps_generation(self):
+        generation = get_index_generation()
+        with patch.object(DocumentMappingType, "unindex"):
+            unindex_task(to_class_path(DocumentMappingType), [1])
+        assert get_index_generation() != generation
+
+    @override_settings(SEARCH_RESULT_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        fun = Mock(return_value={"results": [1]})
+        cached_search("test", fun, q="baz")
+        cached_search("test", fun, q="baz")
+        eq_(fun.call_count, 2)
@@ -70,6 +70,14 @@ def chunked(iterable, n):
             return
 
 
+def create_batch_id():
+    """Returns a batch_id"""
+    # TODO: This is silly, but it's a good enough way to distinguish
+    # between batches by looking at a Record. This is just over the
+    # number of seconds in a day.
+    return str(int(time.time()))[-6:]
+
+
 def to_class_path(cls):
     """Returns class path for a class
 
@@ -23,6 +23,7 @@ from kitsune.products.models import Product
 from kitsune.questions.models import QuestionMappingType
 from kitsune.search.utils import locale_or_default, clean_excerpt
 from kitsune.search import es_utils
+from kitsune.search.cache import cached_search, normalize_query
 from kitsune.search.forms import SimpleSearchForm, AdvancedSearchForm
 from kitsune.search.es_utils import F, AnalyzerS, handle_es_errors
 from kitsune.search.search_utils import apply_boosts, generate_simple_search
@@ -30,8 +31,8 @@ from kitsune.sumo.api_utils import JSONRenderer
 from kitsune.sumo.templatetags.jinja_helpers import Paginator
 from kitsune.sumo.json_utils import markup_json
 from kitsune.sumo.urlresolvers import reverse
-from kitsune.sumo.utils import paginate
-from kitsune.wiki.facets import documents_for
+from kitsune.sumo.utils import paginate, smart_int
+from kitsune.wiki.facets import cache_documents_for, documents_for, documents_for_searches
 from kitsune.wiki.models import DocumentMappingType
 
 
@@ -171,15 +172,59 @@ def simple_search(request):
     searcher = searcher[: settings.SEARCH_MAX_RESULTS]
 
     # 5. Generate output.
-    pages = paginate(request, searcher, settings.SEARCH_RESULTS_PER_PAGE)
+    page = smart_int(request.GET.get("page"), 1)
 
-    if pages.paginator.count == 0:
-        fallback_results = _fallback_results(language, cleaned["product"])
-        results = []
+    def _search():
+        per_page = settings.SEARCH_RESULTS_PER_PAGE
+        bottom = (max(page, 1) - 1) * per_page
+        page_searcher = searcher[bottom : bottom + per_page]
 
-    else:
-        fallback_results = None
-        results = build_results_list(pages, request.IS_JSON)
+        # In case there are no results, get the fallback results in the
+        # same request unless they're cached already. The page of
+        # results comes with the total, so this is the only request.
+        products = list(Product.objects.filter(slug__in=cleaned["product"]))
+        fallback_searches = documents_for_searches(language, products=products)
+        es_utils.msearch([page_searcher] + list(fallback_searches.values()))
+        cache_documents_for(fallback_searches, products=products)
+
+        pages = paginate(request, searcher, per_page, count=page_searcher.count())
+        if pages.number == max(page, 1):
+            pages.object_list = page_searcher
+
+        if pages.paginator.count == 0:
+            fallback_results = _fallback_results(language, cleaned["product"])
+            results = []
+
+        else:
+            fallback_results = None
+            # The template doesn't need the result objects and they
+            # can't be cached, so leave them out like for json.
+            results = build_results_list(pages, True)
+
+        return {
+            "num_results": pages.paginator.count,
+            "results": results,
+            "fallback_results": fallback_results,
+        }
+
+    data = dict(
+        cached_search(
+            "simple_search",
+            _search,
+            q=normalize_query(cleaned["q"]),
+            language=language,
+            product=sorted(cleaned["product"]),
+            w=cleaned["w"],
+            explain=cleaned["explain"],
+            page=page,
+        )
+    )
+    results = data["results"]
+
+    # We already know the count, so this doesn't hit Elasticsearch.
+    pages = paginate(
+        request, searcher, settings.SEARCH_RESULTS_PER_PAGE, count=data["num_results"]
+    )
 
     product = Product.objects.filter(slug__in=cleaned["product"])
     if product:
@@ -190,16 +235,15 @@ def simple_search(request):
     # FIXME: This is probably bad l10n.
     product_titles = ", ".join(product_titles)
 
-    data = {
-        "num_results": pages.paginator.count,
-        "results": results,
-        "fallback_results": fallback_results,
-        "product_titles": product_titles,
-        "q": cleaned["q"],
-        "w": cleaned["w"],
-        "lang_name": lang_name,
-        "products": Product.objects.filter(visible=True),
-    }
+    data.update(
+        {
+            "product_titles": product_titles,
+            "q": cleaned["q"],
+            "w": cleaned["w"],
+            "lang_name": lang_name,
+            "products": Product.objects.filter(visible=True),
+        }
+    )
 
     if request.IS_JSON:
         data["total"] = len(data["results"])
@@ -776,6 +776,10 @@ ES_WRITE_INDEXES = ES_INDEXES
 ES_INDEX_PREFIX = config("ES_INDEX_PREFIX", default="sumo")
 # Keep indexes up to date as objects are made/deleted.
 ES_LIVE_INDEXING = config("ES_LIVE_INDEXING", default=True, cast=bool)
+# When this is more than 0, live indexing waits this many seconds and
+# then indexes everything that was saved in the meantime in one go,
+# so things that get saved over and over only get indexed once.
+ES_INDEX_QUEUE_DELAY = config("ES_INDEX_QUEUE_DELAY", default=0, cast=int)
 # Timeout for querying requests
 ES_TIMEOUT = 5
 ES_USE_SSL = config("ES_USE_SSL", default=False, cast=bool)
@@ -801,6 +805,12 @@ IA_DEFAULT_CATEGORIES = (
 # and results, in minutes.
 SEARCH_CACHE_PERIOD = config("SEARCH_CACHE_PERIOD", default=15, cast=int)
 
+# How long search results are cached on the server, in seconds. 0
+# turns the cache off. The most recently used ones are also kept in
+# process. Reindexing invalidates all of them.
+SEARCH_RESULT_CACHE_TIMEOUT = config("SEARCH_RESULT_CACHE_TIMEOUT", default=0, cast=int)
+SEARCH_RESULT_CACHE_SIZE = config("SEARCH_RESULT_CACHE_SIZE", default=500, cast=int)
+
 # Maximum length of the filename. Forms should use this and raise
 # ValidationError if the length is exceeded.
 # @see http://code.djangoproject.com/ticket/9893
@@ -974,6 +984,11 @@ GA_PROFILE_ID = config(
     "GA_PROFILE_ID", default="12345678"
 )  # Google Analytics profile id for SUMO prod
 GA_START_DATE = date(2012, 11, 10)
+# How many requests to make to Google Analytics at once.
+GA_MAX_WORKERS = config("GA_MAX_WORKERS", default=4, cast=int)
+# Where to keep the responses about periods that are over, so they're only
+# fetched once. Empty means don't keep them.
+GA_CACHE_DIR = config("GA_CACHE_DIR", default="")
 GTM_CONTAINER_ID = config("GTM_CONTAINER_ID", default="")  # Google container ID
 
 REDIS_BACKENDS = {
@@ -984,6 +999,15 @@ REDIS_BACKENDS = {
 
 HELPFULVOTES_UNHELPFUL_KEY = "helpfulvotes_topunhelpful"
 
+# How long the rows of the dashboards' readouts are cached, in seconds.
+# 0 turns the cache off. Edits to the KB invalidate the readouts of the
+# locales they affect, and reloading the visits invalidates all of them.
+DASHBOARD_READOUT_CACHE_TIMEOUT = config("DASHBOARD_READOUT_CACHE_TIMEOUT", default=0, cast=int)
+
+# How long the community hub's top contributors leaderboards are cached,
+# in seconds. 0 turns the cache off.
+TOP_CONTRIBUTORS_CACHE_TIMEOUT = config("TOP_CONTRIBUTORS_CACHE_TIMEOUT", default=0, cast=int)
+
 LAST_SEARCH_COOKIE = "last_search"
 
 OPTIPNG_PATH = config("OPTIPNG_PATH", default="/usr/bin/optipng")
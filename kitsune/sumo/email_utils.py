@@ -176,9 +176,16 @@ def emails_with_users_and_watches(
 
         return mail
 
+    # to avoid circular imports
+    from kitsune.users.models import prefetch_profiles
+
+    users_and_watches = list(users_and_watches)
+    profiles = prefetch_profiles(u for u, w in users_and_watches)
+
     for u, w in users_and_watches:
-        if hasattr(u, "profile"):
-            locale = u.profile.locale
+        profile = profiles.get(getattr(u, "id", None))
+        if profile is not None:
+            locale = profile.locale
         else:
             locale = default_locale
 
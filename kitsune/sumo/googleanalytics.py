@@ -1,6 +1,12 @@
+import hashlib
+import json
 import logging
-from datetime import timedelta
-from functools import wraps
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
 
 from django.conf import settings
 
@@ -19,25 +25,18 @@ key = settings.GA_KEY
 account = settings.GA_ACCOUNT
 profile_id = settings.GA_PROFILE_ID
 
-
-def retry_503(f):
-    """Call `f`. If `f` raises an HTTP 503 exception, try again once.
-
-    This is what Google Analytics recommends:
-    https://developers.google.com/analytics/devguides/config/mgmt/v3/errors
-    """
-
-    @wraps(f)
-    def wrapper(*args, **kwargs):
-        try:
-            return f(*args, **kwargs)
-        except HttpError as e:
-            log.error("HTTP Error calling Google Analytics: %s", e)
-
-            if e.resp.status == 503:
-                return f(*args, **kwargs)
-
-    return wrapper
+# How many rows to ask for at once. This is the most GA returns.
+MAX_RESULTS = 10000
+# How many days to ask for at once, to keep the result sets small.
+WINDOW_DAYS = 91
+# GA keeps processing the data of a day for a while after it's over. The
+# responses about periods that ended longer ago than this are final.
+PROCESSING_DAYS = 2
+# How many times to try a request that GA says to retry.
+MAX_TRIES = 5
+# The errors GA says to retry with exponential backoff:
+# https://developers.google.com/analytics/devguides/reporting/core/v3/errors
+RETRY_STATUSES = (403, 429, 500, 503)
 
 
 def _build_request():
@@ -48,6 +47,164 @@ def _build_request():
     return service.data().ga()
 
 
+def _windows(start_date, end_date, days=WINDOW_DAYS):
+    """Split a date range into windows of at most `days` days.
+
+    The windows are counted from `start_date` rather than `end_date`, so
+    the ones that are over stay the same from one run to the next.
+
+    """
+    while start_date <= end_date:
+        yield start_date, min(start_date + timedelta(days - 1), end_date)
+        start_date += timedelta(days)
+
+
+class _Backoff(object):
+    """Exponential backoff shared by all the threads of a _Fetcher.
+
+    When GA tells one thread to slow down, all of them wait.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._delay = 0
+        self._until = 0
+
+    def wait(self):
+        with self._lock:
+            delay = self._until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def back_off(self):
+        with self._lock:
+            self._delay = min(max(self._delay * 2, 1), 64)
+            self._until = max(self._until, time.time() + self._delay + random.random())
+
+    def reset(self):
+        with self._lock:
+            self._delay = 0
+
+
+class _Fetcher(object):
+    """Make requests to Google Analytics, a few at a time.
+
+    The responses about periods that are over are kept as files in
+    GA_CACHE_DIR, if it's set, and never fetched again.
+
+    """
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self._backoff = _Backoff()
+        # The API client isn't thread-safe, so each thread gets its own.
+        self._local = threading.local()
+
+    def _request(self):
+        if not hasattr(self._local, "request"):
+            self._local.request = _build_request()
+        return self._local.request
+
+    def _cache_path(self, params):
+        if not settings.GA_CACHE_DIR:
+            return None
+        if params["end_date"] >= str(date.today() - timedelta(PROCESSING_DAYS)):
+            return None
+        params = json.dumps(dict(params, ids="ga:" + profile_id), sort_keys=True)
+        return os.path.join(
+            settings.GA_CACHE_DIR, hashlib.md5(params.encode()).hexdigest() + ".json"
+        )
+
+    def get(self, **params):
+        """Return the response to one request."""
+        path = self._cache_path(params)
+        if path and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+
+        for tries in range(1, MAX_TRIES + 1):
+            self._backoff.wait()
+            try:
+                response = self._request().get(ids="ga:" + profile_id, **params).execute()
+            except HttpError as e:
+                log.error("HTTP Error calling Google Analytics: %s", e)
+                if e.resp.status not in RETRY_STATUSES or tries == MAX_TRIES:
+                    raise
+                self._backoff.back_off()
+            else:
+                self._backoff.reset()
+                break
+
+        if path:
+            os.makedirs(settings.GA_CACHE_DIR, exist_ok=True)
+            # Write it under another name first, so a run that's cut short
+            # doesn't leave half a response behind.
+            tmp = "%s.%s.tmp" % (path, threading.get_ident())
+            with open(tmp, "w") as f:
+                json.dump(response, f)
+            os.replace(tmp, path)
+
+        return response
+
+    def get_many(self, queries):
+        """Return the responses to a list of requests, in order.
+
+        Each query is a dict of the params of one request.
+
+        """
+        with ThreadPoolExecutor(settings.GA_MAX_WORKERS) as executor:
+            return list(executor.map(lambda params: self.get(**params), queries))
+
+    def get_rows(self, start_date, end_date, **params):
+        """Return all the rows of a query over a date range.
+
+        The range is fetched in windows of WINDOW_DAYS days, and every
+        page of every window is a request of its own.
+
+        """
+
+        def get_page(start, end, start_index):
+            return self.get(
+                start_date=str(start),
+                end_date=str(end),
+                max_results=MAX_RESULTS,
+                start_index=start_index,
+                **params,
+            )
+
+        rows = []
+        with ThreadPoolExecutor(settings.GA_MAX_WORKERS) as executor:
+            # The first page of a window tells how many more there are.
+            first_pages = dict(
+                (executor.submit(get_page, start, end, 1), (start, end))
+                for start, end in _windows(start_date, end_date)
+            )
+            other_pages = []
+            for future in as_completed(first_pages):
+                start, end = first_pages[future]
+                results = future.result()
+                total = results.get("totalResults", 0)
+                if self.verbose:
+                    print("Fetching %s results for %s to %s." % (total, start, end))
+
+                rows.extend(results.get("rows", []))
+                for start_index in range(1 + MAX_RESULTS, total + 1, MAX_RESULTS):
+                    other_pages.append(executor.submit(get_page, start, end, start_index))
+
+            for future in other_pages:
+                rows.extend(future.result().get("rows", []))
+
+        return rows
+
+
+def _days(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield str(day)
+        day += timedelta(days=1)
+
+
 def visitors(start_date, end_date):
     """Return the number of daily unique visitors for a given date range.
 
@@ -56,21 +213,11 @@ def visitors(start_date, end_date):
          u'2012-01-23': 434618,
          u'2012-01-24': 501687,...}
     """
-    visitors = {}
-    request = _build_request()
-    date = start_date
-    while date <= end_date:
-        date_str = str(date)
-        visitors[str(date)] = int(
-            request.get(
-                ids="ga:" + profile_id,
-                start_date=date_str,
-                end_date=date_str,
-                metrics="ga:visitors",
-            ).execute()["rows"][0][0]
-        )
-        date += timedelta(days=1)
-    return visitors
+    days = list(_days(start_date, end_date))
+    responses = _Fetcher().get_many(
+        [dict(start_date=day, end_date=day, metrics="ga:visitors") for day in days]
+    )
+    return dict((day, int(r["rows"][0][0])) for day, r in zip(days, responses))
 
 
 def visitors_by_locale(start_date, end_date):
@@ -82,19 +229,12 @@ def visitors_by_locale(start_date, end_date):
          u'es': 830521,...}
     """
     visits_by_locale = {}
-    request = _build_request()
-
-    @retry_503
-    def _make_request():
-        return request.get(
-            ids="ga:" + profile_id,
-            start_date=str(start_date),
-            end_date=str(end_date),
-            metrics="ga:visitors",
-            dimensions="ga:pagePathLevel1",
-        ).execute()
-
-    results = _make_request()
+    results = _Fetcher().get(
+        start_date=str(start_date),
+        end_date=str(end_date),
+        metrics="ga:visitors",
+        dimensions="ga:pagePathLevel1",
+    )
 
     for result in results["rows"]:
         path = result[0][1:-1]  # Strip leading and trailing slash.
@@ -117,66 +257,21 @@ def pageviews_by_document(start_date, end_date, verbose=False):
          7: 1337,...}
     """
     counts = {}
-    request = _build_request()
-    max_results = 10000
-
-    end_date_step = end_date
-
-    while True:  # To reduce the size of result set request 3 months at a time
-        start_date_step = end_date_step - timedelta(90)
-
-        if start_date_step < start_date:
-            start_date_step = start_date
-
-        if verbose:
-            print("Fetching data for %s to %s:" % (start_date_step, end_date_step))
-
-        start_index = 1
-
-        while True:  # To deal with pagination
-
-            @retry_503
-            def _make_request():
-                return request.get(
-                    ids="ga:" + profile_id,
-                    start_date=str(start_date_step),
-                    end_date=str(end_date_step),
-                    metrics="ga:pageviews",
-                    dimensions="ga:pagePath",
-                    filters=("ga:pagePathLevel2==/kb/;" "ga:pagePathLevel1==/en-US/"),
-                    max_results=max_results,
-                    start_index=start_index,
-                ).execute()
-
-            results = _make_request()
-
-            if verbose:
-                d = (
-                    max_results - 1
-                    if start_index + max_results - 1 < results["totalResults"]
-                    else results["totalResults"] - start_index
-                )
-                print("- Got %s of %s results." % (start_index + d, results["totalResults"]))
-
-            for result in results.get("rows", []):
-                path = result[0]
-                pageviews = int(result[1])
-                doc = Document.from_url(path, id_only=True, check_host=False)
-                if not doc:
-                    continue
-
-                # The same document can appear multiple times due to url params
-                counts[doc.pk] = counts.get(doc.pk, 0) + pageviews
-
-            # Move to next page of results.
-            start_index += max_results
-            if start_index > results.get("totalResults", 0):
-                break
-
-        end_date_step = start_date_step - timedelta(1)
-
-        if start_date_step == start_date or end_date_step < start_date:
-            break
+    rows = _Fetcher(verbose=verbose).get_rows(
+        start_date,
+        end_date,
+        metrics="ga:pageviews",
+        dimensions="ga:pagePath",
+        filters=("ga:pagePathLevel2==/kb/;" "ga:pagePathLevel1==/en-US/"),
+    )
+
+    for path, pageviews in rows:
+        doc = Document.from_url(path, id_only=True, check_host=False)
+        if not doc:
+            continue
+
+        # The same document can appear multiple times due to url params
+        counts[doc.pk] = counts.get(doc.pk, 0) + int(pageviews)
 
     return counts
 
@@ -190,67 +285,22 @@ def pageviews_by_question(start_date, end_date, verbose=False):
          7: 1337,...}
     """
     counts = {}
-    request = _build_request()
-    max_results = 10000
-
-    end_date_step = end_date
-
-    while True:  # To reduce the size of result set request 3 months at a time
-        start_date_step = end_date_step - timedelta(90)
-
-        if start_date_step < start_date:
-            start_date_step = start_date
-
-        if verbose:
-            print("Fetching data for %s to %s:" % (start_date_step, end_date_step))
-
-        start_index = 1
-
-        while True:  # To deal with pagination
-
-            @retry_503
-            def _make_request():
-                return request.get(
-                    ids="ga:" + profile_id,
-                    start_date=str(start_date_step),
-                    end_date=str(end_date_step),
-                    metrics="ga:pageviews",
-                    dimensions="ga:pagePath",
-                    filters="ga:pagePathLevel2==/questions/",
-                    max_results=max_results,
-                    start_index=start_index,
-                ).execute()
-
-            results = _make_request()
-
-            if verbose:
-                d = (
-                    max_results - 1
-                    if start_index + max_results - 1 < results["totalResults"]
-                    else results["totalResults"] - start_index
-                )
-                print("- Got %s of %s results." % (start_index + d, results["totalResults"]))
-
-            for result in results["rows"]:
-                path = result[0]
-                pageviews = int(result[1])
-                question_id = Question.from_url(path, id_only=True)
-                if not question_id:
-                    continue
-
-                # The same question can appear multiple times due to url params
-                # and locale.
-                counts[question_id] = counts.get(question_id, 0) + pageviews
-
-            # Move to next page of results.
-            start_index += max_results
-            if start_index > results["totalResults"]:
-                break
-
-        end_date_step = start_date_step - timedelta(1)
-
-        if start_date_step == start_date or end_date_step < start_date:
-            break
+    rows = _Fetcher(verbose=verbose).get_rows(
+        start_date,
+        end_date,
+        metrics="ga:pageviews",
+        dimensions="ga:pagePath",
+        filters="ga:pagePathLevel2==/questions/",
+    )
+
+    for path, pageviews in rows:
+        question_id = Question.from_url(path, id_only=True)
+        if not question_id:
+            continue
+
+        # The same question can appear multiple times due to url params
+        # and locale.
+        counts[question_id] = counts.get(question_id, 0) + int(pageviews)
 
     return counts
 
@@ -263,20 +313,11 @@ def search_ctr(start_date, end_date):
          u'2012-01-23': 73.6,
          u'2012-01-24': 76.2,...}
     """
-    ctr = {}
-    request = _build_request()
-    date = start_date
-    while date <= end_date:
-        date_str = str(date)
-
-        # This metric name for goals in Google Analytics is gross.
-        # Sorry about that. I don't see another way to it.
-        metric_name = "ga:goal11ConversionRate"
-        ctr_str = request.get(
-            ids="ga:" + profile_id, start_date=date_str, end_date=date_str, metrics=metric_name
-        ).execute()["rows"][0][0]
-        ctr[date_str] = float(ctr_str)
-
-        date += timedelta(days=1)
-
-    return ctr
+    days = list(_days(start_date, end_date))
+    # This metric name for goals in Google Analytics is gross.
+    # Sorry about that. I don't see another way to it.
+    metric_name = "ga:goal11ConversionRate"
+    responses = _Fetcher().get_many(
+        [dict(start_date=day, end_date=day, metrics=metric_name) for day in days]
+    )
+    return dict((day, float(r["rows"][0][0])) for day, r in zip(days, responses))
@@ -2,14 +2,16 @@ from os.path import basename
 from urllib.parse import urlparse, parse_qs
 
 from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _lazy, ugettext as _
 
-from wikimarkup.parser import Parser, ALLOWED_TAGS
+from wikimarkup.parser import Parser, ALLOWED_TAGS, _internalLinkPat
 
 from kitsune.gallery.models import Image, Video
 from kitsune.sumo import email_utils
 from kitsune.sumo.urlresolvers import reverse
+from kitsune.sumo.utils import LRUCache, bump_cache_generation, get_cache_generation
 
 
 ALLOWED_ATTRIBUTES = {
@@ -44,6 +46,16 @@ IMAGE_PARAM_VALUES = {
 VIDEO_PARAMS = ["height", "width", "modal", "title", "placeholder"]
 YOUTUBE_PLACEHOLDER = "YOUTUBE_EMBED_PLACEHOLDER_%s"
 
+# Holds the generation of the resolved objects cache. It's part of
+# every key, so changing it invalidates all of them.
+RESOLVED_OBJECTS_GENERATION_KEY = "parser:resolved_objects_generation"
+RESOLVED_OBJECTS_CACHE_SIZE = 5000
+
+# (generation, model, title, locale, kwargs) -> id of what
+# get_object_fallback found, or None if it didn't find anything.
+_resolved_ids = LRUCache(RESOLVED_OBJECTS_CACHE_SIZE)
+_missing = object()
+
 
 def wiki_to_html(wiki_markup, locale=settings.WIKI_DEFAULT_LANGUAGE, nofollow=True, tags=None):
     """Wiki Markup -> HTML"""
@@ -102,19 +114,185 @@ def get_object_fallback(cls, title, locale, default=None, **kwargs):
         return default
 
 
-def _get_wiki_link(title, locale):
+def _by_title(qs, titles):
+    """Return (title -> obj, ambiguous titles, whether it's complete).
+
+    The database may match titles loosely, for example ignoring case.
+    If anything came back that isn't an exact match, then titles
+    without an exact match may still have a loose one, so the result
+    isn't complete.
+    """
+    objs = {}
+    ambiguous = set()
+    complete = True
+    for obj in qs:
+        if obj.title not in titles:
+            # Nobody asked for this title, so leave it out.
+            complete = False
+            continue
+        if obj.title in objs:
+            ambiguous.add(obj.title)
+        objs[obj.title] = obj
+    for title in ambiguous:
+        del objs[title]
+    return objs, ambiguous, complete
+
+
+def get_objects_fallback(cls, titles, locale, **kwargs):
+    """Like get_object_fallback, but for a bunch of titles at once.
+
+    This does a few IN queries rather than a few queries per title.
+
+    Returns a dict of title -> instance, or None if there isn't one.
+    Titles that can't be settled in bulk, like redirects, are left out,
+    so they can be looked up with get_object_fallback.
+
+    """
+    titles = set(titles)
+    found, ambiguous, complete = _by_title(
+        cls.objects.filter(title__in=titles, locale=locale, **kwargs), titles
+    )
+    titles = titles - set(found) - ambiguous
+    if not complete or not titles:
+        return found
+    if locale == settings.WIKI_DEFAULT_LANGUAGE:
+        # There's nothing to fall back to.
+        found.update((title, None) for title in titles)
+        return found
+
+    # Fallback
+    default_lang_objs, ambiguous, complete = _by_title(
+        cls.objects.filter(title__in=titles, locale=settings.WIKI_DEFAULT_LANGUAGE, **kwargs),
+        titles,
+    )
+    if complete:
+        for title in titles - set(default_lang_objs) - ambiguous:
+            found[title] = None
+
+    translations = {}
+    if hasattr(cls, "translated_to") and default_lang_objs:
+        translations = dict(
+            (obj.parent_id, obj)
+            for obj in cls.objects.filter(
+                locale=locale,
+                parent__in=list(default_lang_objs.values()),
+                current_revision__isnull=False,
+            )
+        )
+
+    for title, obj in default_lang_objs.items():
+        if obj.pk in translations:
+            # Return the translation of this English item.
+            found[title] = translations[obj.pk]
+        elif hasattr(obj, "redirect_document") and obj.redirect_url():
+            # Leave redirects to get_object_fallback.
+            continue
+        else:
+            found[title] = obj
+
+    return found
+
+
+def invalidate_resolved_objects(**kwargs):
+    """Forget what the parsers have looked up.
+
+    This is a signal handler for things that change what
+    get_object_fallback finds.
+    """
+    bump_cache_generation(RESOLVED_OBJECTS_GENERATION_KEY)
+
+
+post_save.connect(invalidate_resolved_objects, sender=Image, dispatch_uid="parser_image_save")
+post_delete.connect(invalidate_resolved_objects, sender=Image, dispatch_uid="parser_image_delete")
+post_save.connect(invalidate_resolved_objects, sender=Video, dispatch_uid="parser_video_save")
+post_delete.connect(invalidate_resolved_objects, sender=Video, dispatch_uid="parser_video_delete")
+
+
+class ObjectResolver(object):
+    """Looks up things by title for a parser using get_object_fallback.
+
+    Lookups are remembered for the life of the resolver, which is one
+    parse, and the ids found are shared between parses in a size-bounded
+    in-process cache. Saving a Document, Image or Video invalidates
+    that.
+    """
+
+    def __init__(self):
+        self._generation = None
+        self._objects = {}
+
+    def get(self, cls, title, locale, default=None, **kwargs):
+        key = self._key(cls, title, locale, kwargs)
+        if key not in self._objects:
+            self._objects[key] = self._resolve(key, cls, title, locale, **kwargs)
+
+        obj = self._objects[key]
+        return default if obj is None else obj
+
+    def prefetch(self, cls, titles, locale, **kwargs):
+        """Look up a bunch of titles at once so get() doesn't query."""
+        keys = dict((title, self._key(cls, title, locale, kwargs)) for title in set(titles))
+        generation = self._get_generation()
+
+        pks = {}
+        todo = []
+        for title, key in keys.items():
+            if key in self._objects:
+                continue
+            pk = _resolved_ids.get((generation,) + key, _missing)
+            if pk is _missing:
+                todo.append(title)
+            else:
+                pks[title] = pk
+
+        objs = cls.objects.in_bulk([pk for pk in pks.values() if pk is not None])
+        for title, pk in pks.items():
+            self._objects[keys[title]] = objs.get(pk)
+
+        if todo:
+            for title, obj in get_objects_fallback(cls, todo, locale, **kwargs).items():
+                if title not in keys:
+                    continue
+                self._objects[keys[title]] = obj
+                _resolved_ids.set((generation,) + keys[title], None if obj is None else obj.pk)
+
+    def _key(self, cls, title, locale, kwargs):
+        return (cls._meta.label, title, locale, tuple(sorted(kwargs.items())))
+
+    def _get_generation(self):
+        if self._generation is None:
+            self._generation = get_cache_generation(RESOLVED_OBJECTS_GENERATION_KEY)
+        return self._generation
+
+    def _resolve(self, key, cls, title, locale, **kwargs):
+        shared_key = (self._get_generation(),) + key
+        pk = _resolved_ids.get(shared_key, _missing)
+        if pk is _missing:
+            obj = get_object_fallback(cls, title, locale, **kwargs)
+            _resolved_ids.set(shared_key, None if obj is None else obj.pk)
+            return obj
+
+        if pk is None:
+            return None
+        return cls.objects.filter(pk=pk).first()
+
+
+def _get_wiki_link(title, locale, resolver=None):
     """Checks the page exists, and returns its URL or the URL to create it.
 
     Return value is a dict: {'found': boolean, 'url': string}.
     found is False if the document does not exist.
 
+    Pass a resolver to look the page up with it.
+
     """
     # Prevent circular import. sumo is conceptually a utils apps and
     # shouldn't have import-time (or really, any, but that's not going
     # to happen) dependencies on client apps.
     from kitsune.wiki.models import Document
 
-    d = get_object_fallback(Document, locale=locale, title=title, is_template=False)
+    get = resolver.get if resolver else get_object_fallback
+    d = get(Document, locale=locale, title=title, is_template=False)
     if d:
         # If the article redirects use its destination article
         while d.redirect_document():
@@ -136,7 +314,7 @@ def _get_wiki_link(title, locale):
     }
 
 
-def build_hook_params(string, locale, allowed_params=[], allowed_param_values={}):
+def build_hook_params(string, locale, allowed_params=[], allowed_param_values={}, resolver=None):
     """Parses a string of the form 'some-title|opt1|opt2=arg2|opt3...'
 
     Builds a list of items and returns relevant parameters in a dict.
@@ -180,7 +358,7 @@ def build_hook_params(string, locale, allowed_params=[], allowed_param_values={}
 
     # Handle page as a special case
     if "page" in params and params["page"] is not True:
-        link = _get_wiki_link(params["page"], locale)
+        link = _get_wiki_link(params["page"], locale, resolver)
         params["link"] = link["url"]
         params["found"] = link["found"]
 
@@ -194,7 +372,12 @@ class WikiParser(Parser):
 
     image_template = "wikiparser/hook_image.html"
 
-    def __init__(self, base_url=None):
+    def __init__(self, base_url=None, resolver=None):
+        """
+        resolver -- An ObjectResolver to look up links with. Pass one to
+            share lookups between parsers.
+
+        """
         super(WikiParser, self).__init__(base_url)
 
         # Register default hooks
@@ -205,6 +388,7 @@ class WikiParser(Parser):
         self.registerInternalLinkHook("Button", self._hook_button)
 
         self.youtube_videos = []
+        self.resolver = resolver or ObjectResolver()
 
     def parse(
         self,
@@ -241,6 +425,7 @@ class WikiParser(Parser):
             of parsing.
         """
         self.locale = locale
+        self.prefetch(text)
 
         @email_utils.safe_translation
         def _parse(locale):
@@ -262,6 +447,44 @@ class WikiParser(Parser):
 
         return html
 
+    def prefetch(self, text):
+        """Look up everything text links to before the hooks need it.
+
+        This scans text for [[...]] links and looks them up in bulk by
+        kind, so the hooks find them in the resolver and rendering
+        takes a handful of queries instead of a few per link.
+        """
+        lookups = {}
+        for space, name in _internalLinkPat.findall(text):
+            lookup = self.prefetch_lookup(space or None, name)
+            if lookup:
+                cls, title, kwargs = lookup
+                key = (cls, tuple(sorted(kwargs.items())))
+                lookups.setdefault(key, set()).add(title)
+
+        for (cls, kwargs), titles in lookups.items():
+            self.resolver.prefetch(cls, titles, self.locale, **dict(kwargs))
+
+    def prefetch_lookup(self, space, name):
+        """Return what the hook for [[space:name]] looks up.
+
+        This is (model, title, kwargs) or None if there's nothing to
+        look up. It needs to match what the hook does.
+        """
+        from kitsune.wiki.models import Document
+
+        if space is None:
+            title = name.split("|", 1)[0].split("#", 1)[0]
+            if title:
+                return Document, title, {"is_template": False}
+        elif space == "Image":
+            return Image, name.split("|", 1)[0].strip(), {}
+        elif space in ("Video", "V"):
+            title = name.split("|", 1)[0].strip()
+            if not _is_youtube_url(title):
+                return Video, title, {}
+        return None
+
     def add_youtube_embeds(self, html):
         """Insert youtube embeds.
 
@@ -295,7 +518,7 @@ class WikiParser(Parser):
                 text = hash.replace("_", " ")
             return '<a href="%s">%s</a>' % (hash, text)
 
-        link = _get_wiki_link(title, self.locale)
+        link = _get_wiki_link(title, self.locale, self.resolver)
         extra_a_attr = ""
         if not link["found"]:
             extra_a_attr += ' class="new" title="{tooltip}"'.format(
@@ -309,10 +532,12 @@ class WikiParser(Parser):
 
     def _hook_image_tag(self, parser, space, name):
         """Adds syntax for inserting images."""
-        title, params = build_hook_params(name, self.locale, IMAGE_PARAMS, IMAGE_PARAM_VALUES)
+        title, params = build_hook_params(
+            name, self.locale, IMAGE_PARAMS, IMAGE_PARAM_VALUES, resolver=self.resolver
+        )
 
         message = _lazy('The image "%s" does not exist.') % title
-        image = get_object_fallback(Image, title, self.locale, message)
+        image = self.resolver.get(Image, title, self.locale, message)
         if isinstance(image, str):
             return image
 
@@ -330,7 +555,7 @@ class WikiParser(Parser):
         message = _lazy('The video "%s" does not exist.') % title
 
         # params, only modal supported for now
-        title, params = build_hook_params(title, self.locale, VIDEO_PARAMS)
+        title, params = build_hook_params(title, self.locale, VIDEO_PARAMS, resolver=self.resolver)
 
         # If this is a youtube video, return the youtube embed
         if _is_youtube_url(title):
@@ -347,7 +572,7 @@ class WikiParser(Parser):
 
             return YOUTUBE_PLACEHOLDER % video_id
 
-        v = get_object_fallback(Video, title, self.locale, message)
+        v = self.resolver.get(Video, title, self.locale, message)
         if isinstance(v, str):
             return v
 
@@ -1,5 +1,8 @@
-from datetime import date
+import shutil
+import tempfile
+from datetime import date, timedelta
 
+from django.test.utils import override_settings
 from unittest.mock import patch
 from nose.tools import eq_
 
@@ -67,6 +70,51 @@ class GoogleAnalyticsTests(TestCase):
         eq_(2, pageviews[2])
         eq_(11, pageviews[3])
 
+    @patch.object(googleanalytics, "_build_request")
+    def test_pageviews_every_page_of_every_window(self, _build_request):
+        """Every page of every window of the range is fetched, once."""
+        get = _build_request.return_value.get
+        get.return_value.execute.return_value = dict(
+            PAGEVIEWS_BY_QUESTION_RESPONSE, totalResults=25000
+        )
+
+        pageviews = googleanalytics.pageviews_by_question(date(2013, 1, 1), date(2013, 7, 19))
+
+        # The rows are the same on every page, so it adds up to 9 times them.
+        eq_(9 * 3, pageviews[1])
+        eq_(
+            sorted(
+                (start, end, start_index)
+                for start, end in [
+                    ("2013-01-01", "2013-04-01"),
+                    ("2013-04-02", "2013-07-01"),
+                    ("2013-07-02", "2013-07-19"),
+                ]
+                for start_index in (1, 10001, 20001)
+            ),
+            sorted(
+                (c[1]["start_date"], c[1]["end_date"], c[1]["start_index"])
+                for c in get.call_args_list
+            ),
+        )
+
+    @patch.object(googleanalytics, "_build_request")
+    def test_closed_windows_cached(self, _build_request):
+        """Only the responses about periods that are over are kept."""
+        execute = _build_request.return_value.get.return_value.execute
+        execute.return_value = PAGEVIEWS_BY_QUESTION_RESPONSE
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        start = date.today() - timedelta(100)
+
+        with override_settings(GA_CACHE_DIR=cache_dir):
+            googleanalytics.pageviews_by_question(start, date.today())
+            eq_(2, execute.call_count)
+
+            pageviews = googleanalytics.pageviews_by_question(start, date.today())
+            eq_(3, execute.call_count)
+            eq_(6, pageviews[1])
+
     @patch.object(googleanalytics, "_build_request")
     def test_search_ctr(self, _build_request):
         """Test googleanalytics.search_ctr()."""
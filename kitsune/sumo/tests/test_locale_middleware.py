@@ -80,6 +80,13 @@ class BestLanguageTests(TestCase):
         best = get_best_language("en-gb, es;q=0.2")
         eq_("en-US", best)
 
+    def test_settings_changed(self):
+        """Remembered headers are forgotten when the locale settings change."""
+        eq_(False, get_best_language("xy-YY, xy;q=0.8"))
+        with override_settings(NON_SUPPORTED_LOCALES={"xy": "fr"}):
+            eq_("fr", get_best_language("xy-YY, xy;q=0.8"))
+        eq_(False, get_best_language("xy-YY, xy;q=0.8"))
+
 
 class PreferredLanguageTests(TestCase):
     def test_anonymous_change_language(self):
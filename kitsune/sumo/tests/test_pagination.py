@@ -1,6 +1,7 @@
 from django.test.client import RequestFactory
 
 import pyquery
+from unittest.mock import Mock
 from nose.tools import eq_, raises
 
 from kitsune.sumo.templatetags.jinja_helpers import paginator
@@ -46,6 +47,16 @@ def test_paginator_filter():
     eq_(13, len(doc("li")))
 
 
+def test_count_param():
+    """Passing in the count means it doesn't get counted."""
+    request = RequestFactory().get(reverse("search"))
+    queryset = Mock()
+    queryset.__getitem__ = Mock(return_value=[])
+    pager = paginate(request, queryset, per_page=10, count=0)
+    eq_(0, pager.paginator.count)
+    assert not queryset.count.called
+
+
 class SimplePaginatorTestCase(TestCase):
 
     rf = RequestFactory()
@@ -5,12 +5,14 @@ from django.conf import settings
 from nose.tools import eq_
 from pyquery import PyQuery as pq
 
+from kitsune.gallery.models import Image
 from kitsune.gallery.tests import ImageFactory
 from kitsune.sumo.parser import (
     WikiParser,
     build_hook_params,
     _get_wiki_link,
     get_object_fallback,
+    ObjectResolver,
     IMAGE_PARAMS,
     IMAGE_PARAM_VALUES,
 )
@@ -127,6 +129,69 @@ class GetObjectFallbackTests(TestCase):
         )
 
 
+class ObjectResolverTests(TestCase):
+    def test_remembers_lookups(self):
+        d = DocumentFactory(title="A doc")
+        resolver = ObjectResolver()
+        eq_(d, resolver.get(Document, "A doc", "en-US"))
+
+        eq_("!", resolver.get(Document, "A doc", "en-US", "!", is_template=True))
+
+        with self.assertNumQueries(0):
+            eq_(d, resolver.get(Document, "A doc", "en-US"))
+            eq_("!", resolver.get(Document, "A doc", "en-US", "!", is_template=True))
+
+    def test_shared_between_resolvers(self):
+        d = DocumentFactory(title="A doc")
+        ObjectResolver().get(Document, "A doc", "fr")
+        ObjectResolver().get(Document, "Another doc", "fr")
+
+        # Only the document itself gets loaded, no fallback lookups.
+        with self.assertNumQueries(1):
+            eq_(d, ObjectResolver().get(Document, "A doc", "fr"))
+        with self.assertNumQueries(0):
+            eq_("!", ObjectResolver().get(Document, "Another doc", "fr", "!"))
+
+    def test_invalidated_by_save(self):
+        ObjectResolver().get(Document, "A doc", "en-US")
+        d = DocumentFactory(title="A doc")
+        eq_(d, ObjectResolver().get(Document, "A doc", "en-US"))
+
+        d.title = "Renamed"
+        d.save()
+        eq_(None, ObjectResolver().get(Document, "A doc", "en-US"))
+
+        ObjectResolver().get(Image, "An image", "en-US")
+        img = ImageFactory(title="An image")
+        eq_(img, ObjectResolver().get(Image, "An image", "en-US"))
+
+    def test_prefetch(self):
+        en = DocumentFactory(title="A doc")
+        fr = DocumentFactory(title="Un doc", locale="fr", parent=en)
+        ApprovedRevisionFactory(document=fr)
+        untranslated = DocumentFactory(title="Another doc")
+        local = DocumentFactory(title="Un autre doc", locale="fr")
+
+        resolver = ObjectResolver()
+        resolver.prefetch(Document, ["A doc", "Another doc", "Un autre doc", "Missing doc"], "fr")
+        with self.assertNumQueries(0):
+            eq_(fr, resolver.get(Document, "A doc", "fr"))
+            eq_(untranslated, resolver.get(Document, "Another doc", "fr"))
+            eq_(local, resolver.get(Document, "Un autre doc", "fr"))
+            eq_("!", resolver.get(Document, "Missing doc", "fr", "!"))
+
+    def test_parse_prefetches(self):
+        """Rendering links costs the same few queries however many there are."""
+        for i in range(5):
+            DocumentFactory(title="Doc %s" % i)
+        ObjectResolver().get(Document, "Doc 0", "en-US", is_template=False)
+
+        content = " ".join("[[Doc %s]] [[Missing %s]]" % (i, i) for i in range(5))
+        # Load "Doc 0" from the cached id, then the rest in one query.
+        with self.assertNumQueries(2):
+            WikiParser().parse(content)
+
+
 class TestWikiParser(TestCase):
     def setUp(self):
         self.d, self.r, self.p = doc_rev_parser("Test content", "Installing Firefox")
@@ -286,6 +351,13 @@ class TestWikiInternalLinks(TestCase):
         eq_("Installing Firefox", link.text())
         assert not link.hasClass("new")
 
+    def test_case_differs(self):
+        """A link whose case differs from the title still renders.
+
+        MySQL may match it to the title ignoring case."""
+        link = pq_link(self.p, "[[installing firefox]]")
+        eq_("installing firefox", link.text())
+
     def test_simple_markup(self):
         text = "[[Installing Firefox]]"
         eq_(
@@ -13,6 +13,7 @@ from kitsune.sumo.utils import (
     chunked,
     get_next_url,
     is_ratelimited,
+    LRUCache,
     smart_int,
     truncated_json_dumps,
     get_browser,
@@ -139,6 +140,32 @@ class ChunkedTests(TestCase):
         eq_(list(chunked([1, 2, 3, 4, 5, 6, 7], 2, length=4)), [[1, 2], [3, 4]])
 
 
+class LRUCacheTests(TestCase):
+    def test_drops_least_recently_used(self):
+        lru = LRUCache(2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        # Using "a" makes "b" the least recently used.
+        eq_(lru.get("a"), 1)
+        lru.set("c", 3)
+
+        eq_(len(lru), 2)
+        eq_(lru.get("a"), 1)
+        eq_(lru.get("b"), None)
+        eq_(lru.get("c"), 3)
+
+    @patch("kitsune.sumo.utils.time")
+    def test_timeout(self, time):
+        time.time.return_value = 100
+        lru = LRUCache(2)
+        lru.set("a", 1, timeout=10)
+        eq_(lru.get("a"), 1)
+
+        time.time.return_value = 110
+        eq_(lru.get("a", "missing"), "missing")
+        eq_(len(lru), 0)
+
+
 class IsRatelimitedTest(TestCase):
     def test_ratelimited(self):
         u = UserFactory()
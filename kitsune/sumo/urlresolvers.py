@@ -1,10 +1,15 @@
 import threading
+from types import MappingProxyType
 
 from django.conf import settings
 from django.core.handlers.wsgi import WSGIRequest
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.urls import reverse as django_reverse
 from django.utils.translation.trans_real import parse_accept_lang_header
 
+from kitsune.sumo.utils import LRUCache
+
 
 # Thread-local storage for URL prefixes. Access with (get|set)_url_prefix.
 _locals = threading.local()
@@ -56,39 +61,74 @@ def reverse(
         return url
 
 
+class _LocaleTables(object):
+    """Lookup tables for finding locales, built once from the settings."""
+
+    def __init__(self):
+        LUM = settings.LANGUAGE_URL_MAP
+        NSL = settings.NON_SUPPORTED_LOCALES
+        LC = settings.LANGUAGE_CODE
+
+        # Known non-supported locales, with their fallbacks.
+        self.non_supported = MappingProxyType(
+            dict((k.lower(), v if v else LC) for k, v in NSL.items())
+        )
+
+        # Supported locales by language, e.g. "pt" -> ("pt-BR", "pt-PT").
+        by_prefix = {}
+        for k, v in LUM.items():
+            by_prefix.setdefault(k.split("-", 1)[0], []).append(v)
+        self.by_prefix = MappingProxyType(dict((k, tuple(v)) for k, v in by_prefix.items()))
+
+        # Everything Accept-Language can ask for. Non-supported locales
+        # go first to allow overriding prefix behavior.
+        best = dict(LUM)
+        best.update((k, v) for k, v in self.non_supported.items() if k not in best)
+        best.update((k.split("-")[0], v) for k, v in LUM.items() if k.split("-")[0] not in best)
+        self.best = MappingProxyType(best)
+
+
+_tables = None
+
+# Raw Accept-Language headers and the locales they got.
+_best_languages = LRUCache(1000)
+
+
+def _get_tables():
+    global _tables
+    if _tables is None:
+        _tables = _LocaleTables()
+    return _tables
+
+
+@receiver(setting_changed)
+def _reset_tables(setting, **kwargs):
+    global _tables
+    if setting in ("LANGUAGE_URL_MAP", "NON_SUPPORTED_LOCALES", "LANGUAGE_CODE"):
+        _tables = None
+        _best_languages.clear()
+
+
 def find_supported(test):
-    return [
-        settings.LANGUAGE_URL_MAP[x]
-        for x in settings.LANGUAGE_URL_MAP
-        if x.split("-", 1)[0] == test.lower().split("-", 1)[0]
-    ]
+    return list(_get_tables().by_prefix.get(test.lower().split("-", 1)[0], ()))
 
 
 def get_non_supported(lang):
     """Find known non-supported locales with fallbacks."""
-    lang = lang.lower()
-    langs = dict((k.lower(), v) for k, v in list(settings.NON_SUPPORTED_LOCALES.items()))
-    if lang in langs:
-        if langs[lang] is None:
-            return settings.LANGUAGE_CODE
-        return langs[lang]
-    return None
+    return _get_tables().non_supported.get(lang.lower())
 
 
 def get_best_language(accept_lang):
     """Given an Accept-Language header, return the best-matching language."""
+    best = _best_languages.get(accept_lang)
+    if best is None:
+        best = _get_best_language(accept_lang)
+        _best_languages.set(accept_lang, best)
+    return best
+
 
-    LUM = settings.LANGUAGE_URL_MAP
-    NSL = settings.NON_SUPPORTED_LOCALES
-    LC = settings.LANGUAGE_CODE
-    langs = dict(LUM)
-    # Add in non-supported first to allow overriding prefix behavior.
-    langs.update(
-        (k.lower(), v if v else LC) for k, v in list(NSL.items()) if k.lower() not in langs
-    )
-    langs.update(
-        (k.split("-")[0], v) for k, v in list(LUM.items()) if k.split("-")[0] not in langs
-    )
+def _get_best_language(accept_lang):
+    langs = _get_tables().best
     ranked = parse_accept_lang_header(accept_lang)
     for lang, _ in ranked:
         lang = lang.lower()
@@ -113,10 +153,11 @@ def split_path(path):
     first, _, rest = path.partition("/")
 
     lang = first.lower()
+    non_supported = get_non_supported(lang)
     if lang in settings.LANGUAGE_URL_MAP:
         return settings.LANGUAGE_URL_MAP[lang], rest
-    elif get_non_supported(lang) is not None:
-        return get_non_supported(lang), rest
+    elif non_supported is not None:
+        return non_supported, rest
     else:
         supported = find_supported(first)
         if supported:
@@ -129,7 +170,7 @@ class Prefixer(object):
     def __init__(self, request=None, locale=None):
         """If request is omitted, fall back to a default locale."""
         # to avoid circular imports
-        from kitsune.users.models import Profile
+        from kitsune.users.models import get_profile
 
         self.request = request or WSGIRequest({"REQUEST_METHOD": "bogus", "wsgi.input": None})
         self.locale, self.shortened_path = split_path(self.request.path_info)
@@ -142,10 +183,9 @@ class Prefixer(object):
                 if language:
                     self.locale = language
             else:
-                try:
-                    self.locale = Profile.objects.get(user=request.user).locale
-                except Profile.DoesNotExist:
-                    pass
+                profile = get_profile(request.user)
+                if profile is not None:
+                    self.locale = profile.locale
 
         if locale:
             self.locale = locale
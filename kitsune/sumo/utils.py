@@ -1,12 +1,16 @@
 import json
 import re
 import sys
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
 from datetime import datetime
 
 from django.conf import settings
 from django.contrib.sites.models import Site
-from django.db import models
+from django.core.cache import cache
+from django.db import connections, models, router
 from django.db.models.signals import pre_delete
 from django.utils import translation
 from django.utils.http import is_safe_url, urlencode
@@ -83,6 +87,76 @@ def chunked(seq, n, length=None):
         yield seq[i : i + n]
 
 
+def bulk_upsert(model, fk_field, values, value_field, batch_size=1000, **fixed):
+    """Set a field of a bunch of rows at once, creating the missing ones.
+
+    ``values`` maps ids of the objects ``fk_field`` points to to the
+    values of ``value_field``. Ids of objects that don't exist (anymore)
+    are skipped. ``fixed`` holds the values of the rest of the fields of
+    the unique key, e.g. ``period=LAST_7_DAYS``.
+
+    This takes a few queries per ``batch_size`` rows: one to leave out
+    the missing objects and, on MySQL, one INSERT ... ON DUPLICATE KEY
+    UPDATE. Other databases get a bulk_update and a bulk_create.
+
+    Returns how many rows were written.
+
+    """
+    fk = model._meta.get_field(fk_field)
+    column = model._meta.get_field(value_field).column
+    fixed_columns = [model._meta.get_field(name).column for name in fixed]
+    db = router.db_for_write(model)
+    connection = connections[db]
+    qn = connection.ops.quote_name
+
+    written = 0
+    for chunk in chunked(sorted(values), batch_size):
+        existing = set(
+            fk.related_model.objects.using(db).filter(pk__in=chunk).values_list("pk", flat=True)
+        )
+        rows = [(pk, values[pk]) for pk in chunk if pk in existing]
+        if not rows:
+            continue
+
+        if connection.vendor == "mysql":
+            placeholders = "(%s)" % ", ".join(["%s"] * (2 + len(fixed)))
+            params = []
+            for pk, value in rows:
+                params.extend([pk, value] + list(fixed.values()))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO %s (%s) VALUES %s ON DUPLICATE KEY UPDATE %s = VALUES(%s)"
+                    % (
+                        qn(model._meta.db_table),
+                        ", ".join(qn(c) for c in [fk.column, column] + fixed_columns),
+                        ", ".join([placeholders] * len(rows)),
+                        qn(column),
+                        qn(column),
+                    ),
+                    params,
+                )
+        else:
+            objs = model.objects.using(db).filter(
+                **dict(fixed, **{fk.attname + "__in": [pk for pk, _value in rows]})
+            )
+            objs = dict((getattr(obj, fk.attname), obj) for obj in objs)
+            to_update = []
+            to_create = []
+            for pk, value in rows:
+                obj = objs.get(pk)
+                if obj is None:
+                    to_create.append(model(**dict(fixed, **{fk.attname: pk, value_field: value})))
+                elif getattr(obj, value_field) != value:
+                    setattr(obj, value_field, value)
+                    to_update.append(obj)
+            model.objects.using(db).bulk_update(to_update, [value_field])
+            model.objects.using(db).bulk_create(to_create)
+
+        written += len(rows)
+
+    return written
+
+
 def smart_int(string, fallback=0):
     """Convert a string to int, with fallback for invalid strings or types."""
     try:
@@ -252,6 +326,86 @@ class Progress(object):
         sys.stdout.flush()
 
 
+def get_cache_generation(key):
+    """Return the generation stored in the cache under key
+
+    A generation can go in cache keys so that changing it with
+    bump_cache_generation invalidates all of them at once.
+    """
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the time rather than 0 so that if the key gets
+        # evicted, we don't go back to a generation that's already
+        # been used and pick up stale entries.
+        cache.add(key, int(time.time() * 1000000), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_cache_generation(key):
+    """Change the generation stored in the cache under key"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The key isn't there, so there's nothing to invalidate.
+        pass
+
+
+class LRUCache(object):
+    """A size-bounded in-process cache that drops the least recently used
+
+    Example:
+
+        lru = LRUCache(100)
+        lru.set("key", value, timeout=60)
+        lru.get("key")
+
+    Entries can have a timeout in seconds, after which they're treated
+    as missing. It's safe to share between threads.
+    """
+
+    def __init__(self, max_size):
+        """
+        :param max_size: The maximum number of entries to keep.
+        """
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                return default
+
+            if expires is not None and expires <= time.time():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = None if timeout is None else time.time() + timeout
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
 def is_ratelimited(request, name, rate, method=["POST"], skip_if=lambda r: False):
     """
     Reimplement ``ratelimit.helpers.is_ratelimited``, with sumo-specific details:
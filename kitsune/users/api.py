@@ -19,12 +19,12 @@ from kitsune.questions.utils import num_answers, num_questions, num_solutions
 from kitsune.sumo.api_utils import DateTimeUTCField, PermissionMod
 from kitsune.sumo.decorators import json_view
 from kitsune.users.models import Profile, Setting
-from kitsune.users.templatetags.jinja_helpers import profile_avatar
+from kitsune.users.templatetags.jinja_helpers import profile_avatar, remember_avatars_and_names
 
 
-def display_name_or_none(user):
+def profile_or_none(user):
     try:
-        return user.profile.name
+        return user.profile
     except (Profile.DoesNotExist, AttributeError):
         return None
 
@@ -66,13 +66,15 @@ def usernames(request):
         last_login = datetime.now() - timedelta(weeks=12)
         users = users.filter(last_login__gte=last_login)
 
+    users_and_profiles = [(u, profile_or_none(u)) for u in users[:10]]
+    avatars = remember_avatars_and_names(users_and_profiles, size=24)
     return [
         {
             "username": u.username,
-            "display_name": display_name_or_none(u),
-            "avatar": profile_avatar(u, 24),
+            "display_name": profile.name if profile else None,
+            "avatar": avatars[u.id][0],
         }
-        for u in users[:10]
+        for u, profile in users_and_profiles
     ]
 
 
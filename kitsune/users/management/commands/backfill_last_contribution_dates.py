@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from kitsune.sumo.utils import chunked
+from kitsune.users.models import Profile, get_last_contribution_dates
+
+
+class Command(BaseCommand):
+    help = "Compute the last contribution date of every user again, from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Users to compute at once."
+        )
+
+    def handle(self, batch_size=1000, **options):
+        user_ids = list(Profile.objects.order_by("user_id").values_list("user_id", flat=True))
+        for chunk in chunked(user_ids, batch_size):
+            if options["verbosity"] > 1:
+                print("Computing users %s to %s." % (chunk[0], chunk[-1]))
+            dates = get_last_contribution_dates(chunk)
+            Profile.objects.bulk_update(
+                [
+                    Profile(user_id=user_id, last_contribution_date=dates.get(user_id))
+                    for user_id in chunk
+                ],
+                ["last_contribution_date"],
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.14 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_auto_20200629_0841'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='last_contribution_date',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
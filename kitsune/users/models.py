@@ -1,16 +1,21 @@
 import logging
 import re
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
 from django.db import models
+from django.db.models import Max, Q
+from django.db.models.signals import post_delete, post_save
 from django.utils.translation import ugettext as _
 from django.utils.translation import ugettext_lazy as _lazy
 from kitsune.lib.countries import COUNTRIES
 from kitsune.products.models import Product
-from kitsune.search.es_utils import UnindexMeBro
 from kitsune.search.models import (
     SearchMappingType,
     SearchMixin,
@@ -109,6 +114,10 @@ class Profile(ModelBase, SearchMixin):
     fxa_avatar = models.URLField(max_length=512, blank=True, default="")
     products = models.ManyToManyField(Product, related_name="subscribed_users")
     fxa_password_change = models.DateTimeField(blank=True, null=True)
+    # The date of the user's last Army of Awesome reply, Support Forum
+    # answer, or KB revision edited or reviewed. Kept up to date by
+    # update_last_contribution_date.
+    last_contribution_date = models.DateTimeField(null=True, blank=True, db_index=True)
 
     class Meta(object):
         permissions = (
@@ -126,6 +135,17 @@ class Profile(ModelBase, SearchMixin):
     def get_absolute_url(self):
         return reverse("users.profile", args=[self.user_id])
 
+    def save(self, *args, **kwargs):
+        # last_contribution_date is moved forward with UPDATEs of its own,
+        # so don't put back the date this profile was loaded with.
+        if not self._state.adding and not args and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name
+                for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != "last_contribution_date"
+            ]
+        super(Profile, self).save(*args, **kwargs)
+
     def clear(self):
         """Clears out the users profile"""
         self.name = ""
@@ -171,49 +191,6 @@ class Profile(ModelBase, SearchMixin):
         else:
             raise ValueError('Unknown serializer type "{}".'.format(serializer_type))
 
-    @property
-    def last_contribution_date(self):
-        """Get the date of the user's last contribution."""
-        from kitsune.customercare.models import Reply
-        from kitsune.questions.models import Answer
-        from kitsune.wiki.models import Revision
-
-        dates = []
-
-        # Latest Army of Awesome reply:
-        try:
-            aoa_reply = Reply.objects.filter(user=self.user).latest("created")
-            dates.append(aoa_reply.created)
-        except Reply.DoesNotExist:
-            pass
-
-        # Latest Support Forum answer:
-        try:
-            answer = Answer.objects.filter(creator=self.user).latest("created")
-            dates.append(answer.created)
-        except Answer.DoesNotExist:
-            pass
-
-        # Latest KB Revision edited:
-        try:
-            revision = Revision.objects.filter(creator=self.user).latest("created")
-            dates.append(revision.created)
-        except Revision.DoesNotExist:
-            pass
-
-        # Latest KB Revision reviewed:
-        try:
-            revision = Revision.objects.filter(reviewer=self.user).latest("reviewed")
-            # Old revisions don't have the reviewed date.
-            dates.append(revision.reviewed or revision.created)
-        except Revision.DoesNotExist:
-            pass
-
-        if len(dates) == 0:
-            return None
-
-        return max(dates)
-
     @property
     def settings(self):
         return self.user.settings
@@ -263,44 +240,60 @@ class UserMappingType(SearchMappingType):
         }
 
     @classmethod
-    def extract_document(cls, obj_id, obj=None):
-        """Extracts interesting thing from a Thread and its Posts"""
-        if obj is None:
-            model = cls.get_model()
-            obj = model.objects.select_related("user").get(pk=obj_id)
+    def extract_documents(cls, ids):
+        """Extracts interesting things from Profiles"""
+        from kitsune.customercare.models import Reply
+        from kitsune.users.templatetags.jinja_helpers import remember_avatars_and_names
 
-        if not obj.user.is_active:
-            raise UnindexMeBro()
+        # Inactive users shouldn't be in the index.
+        objs = list(
+            cls.get_model().objects.filter(pk__in=ids, user__is_active=True).select_related("user")
+        )
+        user_ids = [obj.user_id for obj in objs]
 
-        d = {}
-        d["id"] = obj.pk
-        d["model"] = cls.get_mapping_type_name()
-        d["url"] = obj.get_absolute_url()
-        d["indexed_on"] = int(time.time())
+        twitter_usernames = {}
+        replies = (
+            Reply.objects.filter(user__in=user_ids)
+            .order_by()
+            .values_list("user_id", "twitter_username")
+            .distinct()
+        )
+        for user_id, twitter_username in replies:
+            twitter_usernames.setdefault(user_id, []).append(twitter_username)
 
-        d["username"] = obj.user.username
-        d["display_name"] = obj.display_name
-        d["twitter_usernames"] = obj.twitter_usernames
+        avatars_and_names = remember_avatars_and_names([(obj.user, obj) for obj in objs], size=120)
 
-        d["last_contribution_date"] = obj.last_contribution_date
+        documents = {}
+        for obj in objs:
+            d = {}
+            d["id"] = obj.pk
+            d["model"] = cls.get_mapping_type_name()
+            d["url"] = obj.get_absolute_url()
+            d["indexed_on"] = int(time.time())
 
-        d["iusername"] = obj.user.username.lower()
-        d["idisplay_name"] = obj.display_name.lower()
-        d["itwitter_usernames"] = [u.lower() for u in obj.twitter_usernames]
+            d["username"] = obj.user.username
+            d["display_name"] = obj.display_name
+            d["twitter_usernames"] = twitter_usernames.get(obj.user_id, [])
 
-        from kitsune.users.templatetags.jinja_helpers import profile_avatar
+            d["last_contribution_date"] = obj.last_contribution_date
 
-        d["avatar"] = profile_avatar(obj.user, size=120)
+            d["iusername"] = obj.user.username.lower()
+            d["idisplay_name"] = obj.display_name.lower()
+            d["itwitter_usernames"] = [u.lower() for u in d["twitter_usernames"]]
 
-        d["suggest"] = {
-            "input": [d["iusername"], d["idisplay_name"]],
-            "output": _("{displayname} ({username})").format(
-                displayname=d["display_name"], username=d["username"]
-            ),
-            "payload": {"user_id": d["id"]},
-        }
+            d["avatar"] = avatars_and_names[obj.user_id][0]
+
+            d["suggest"] = {
+                "input": [d["iusername"], d["idisplay_name"]],
+                "output": _("{displayname} ({username})").format(
+                    displayname=d["display_name"], username=d["username"]
+                ),
+                "payload": {"user_id": d["id"]},
+            }
 
-        return d
+            documents[obj.pk] = d
+
+        return documents
 
     @classmethod
     def suggest_completions(cls, text):
@@ -322,11 +315,199 @@ class UserMappingType(SearchMappingType):
 register_for_indexing("users", Profile)
 
 
+# Profiles looked up during the current request (or profile_cache block) of
+# this thread, by user id. None when there's no request.
+_local = threading.local()
+
+
 def get_profile(u):
+    """Return the user's Profile, or None if they don't have one.
+
+    During a request, each user's profile is only looked up once.
+
+    """
+    profiles = getattr(_local, "profiles", None)
+    if profiles is not None and u.id in profiles:
+        return profiles[u.id]
+
     try:
-        return Profile.objects.get(user=u)
+        profile = Profile.objects.get(user_id=u.id)
     except Profile.DoesNotExist:
-        return None
+        profile = None
+
+    if profiles is not None:
+        profiles[u.id] = profile
+    return profile
+
+
+def get_remembered_profile(user_id):
+    """Return the profile get_profile remembered for a user, without
+    looking it up.
+
+    :returns: the Profile, or None if the user doesn't have one
+    :raises KeyError: if it isn't remembered
+
+    """
+    profiles = getattr(_local, "profiles", None)
+    if profiles is None:
+        raise KeyError(user_id)
+    return profiles[user_id]
+
+
+def prefetch_profiles(users):
+    """Look up the profiles of many users with one query.
+
+    During a request, get_profile won't have to look them up again.
+
+    :arg users: iterable of users; None and users without an id are
+        skipped
+
+    :returns: dict of user id -> Profile, or None if the user doesn't
+        have one
+
+    """
+    profiles = getattr(_local, "profiles", None)
+    if profiles is None:
+        profiles = {}
+
+    user_ids = set(u.id for u in users if u is not None and u.id is not None)
+    missing = [user_id for user_id in user_ids if user_id not in profiles]
+    if missing:
+        found = Profile.objects.in_bulk(missing)
+        for user_id in missing:
+            profiles[user_id] = found.get(user_id)
+
+    return dict((user_id, profiles[user_id]) for user_id in user_ids)
+
+
+@contextmanager
+def profile_cache():
+    """Remember the profiles get_profile looks up until the block ends.
+
+    Every request gets one of these. Use it for batch jobs that go
+    through many users.
+
+    """
+    if getattr(_local, "profiles", None) is not None:
+        # Already in one.
+        yield
+        return
+
+    _local.profiles = {}
+    try:
+        yield
+    finally:
+        _local.profiles = None
+
+
+def _start_profile_cache(**kwargs):
+    _local.profiles = {}
+
+
+def _end_profile_cache(**kwargs):
+    _local.profiles = None
+
+
+def _forget_profile(sender, instance, **kwargs):
+    profiles = getattr(_local, "profiles", None)
+    if profiles is not None:
+        profiles.pop(instance.user_id, None)
+
+
+# What avatar URLs and display names are made of, by user id (see
+# kitsune.users.templatetags.jinja_helpers.get_avatars_and_names).
+AVATAR_AND_NAME_CACHE_KEY = "users:avatar_and_name:%s"
+
+
+def _forget_avatar_and_name(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    cache.delete(AVATAR_AND_NAME_CACHE_KEY % user_id)
+
+
+request_started.connect(_start_profile_cache, dispatch_uid="profile_cache_start")
+request_finished.connect(_end_profile_cache, dispatch_uid="profile_cache_end")
+post_save.connect(_forget_profile, sender=Profile, dispatch_uid="profile_cache_save")
+post_delete.connect(_forget_profile, sender=Profile, dispatch_uid="profile_cache_delete")
+for sender in (User, Profile):
+    post_save.connect(_forget_avatar_and_name, sender=sender, dispatch_uid="avatar_and_name_save")
+    post_delete.connect(
+        _forget_avatar_and_name, sender=sender, dispatch_uid="avatar_and_name_delete"
+    )
+
+
+def update_last_contribution_date(user_id, date):
+    """Move a user's last contribution date forward to `date`.
+
+    Nothing changes if they already contributed later than that.
+
+    """
+    if user_id is None or date is None:
+        return
+
+    Profile.objects.filter(
+        Q(last_contribution_date=None) | Q(last_contribution_date__lt=date), user_id=user_id
+    ).update(last_contribution_date=date)
+
+    profile = (getattr(_local, "profiles", None) or {}).get(user_id)
+    if profile is not None and (
+        profile.last_contribution_date is None or profile.last_contribution_date < date
+    ):
+        profile.last_contribution_date = date
+
+
+def get_last_contribution_dates(user_ids):
+    """Get the dates of the last contribution for many users at once.
+
+    Contributions are Army of Awesome replies, Support Forum answers,
+    and KB revisions edited or reviewed.
+
+    :arg user_ids: list of user ids
+
+    :returns: dict of user id -> datetime. Users who never contributed
+        are left out.
+
+    """
+    from kitsune.customercare.models import Reply
+    from kitsune.questions.models import Answer
+    from kitsune.wiki.models import Revision
+
+    dates = {}
+
+    def add_dates(rows):
+        for user_id, date in rows:
+            if date is not None and (user_id not in dates or date > dates[user_id]):
+                dates[user_id] = date
+
+    def latest(qs, user_field, date_field="created"):
+        return (
+            qs.filter(**{user_field + "__in": user_ids})
+            .order_by()
+            .values(user_field)
+            .annotate(latest=Max(date_field))
+            .values_list(user_field, "latest")
+        )
+
+    # Latest Army of Awesome reply:
+    add_dates(latest(Reply.objects, "user"))
+
+    # Latest Support Forum answer:
+    add_dates(latest(Answer.objects, "creator"))
+
+    # Latest KB Revision edited:
+    add_dates(latest(Revision.objects, "creator"))
+
+    # Latest KB Revision reviewed. Old revisions don't have the
+    # reviewed date.
+    reviewed = (
+        Revision.objects.filter(reviewer__in=user_ids)
+        .order_by()
+        .values("reviewer")
+        .annotate(latest_reviewed=Max("reviewed"), latest_created=Max("created"))
+        .values_list("reviewer", "latest_reviewed", "latest_created")
+    )
+    add_dates((user_id, rev or created) for user_id, rev, created in reviewed)
+
+    return dates
 
 
 register_for_indexing("users", User, instance_to_indexee=get_profile)
@@ -4,6 +4,8 @@ import urllib.parse
 import urllib.request
 
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.utils.encoding import force_bytes
 from django.utils.translation import ugettext as _
 from django_jinja import library
@@ -11,15 +13,16 @@ from jinja2 import Markup, escape
 
 from kitsune.sumo.templatetags.jinja_helpers import urlparams
 from kitsune.sumo.urlresolvers import reverse
-from kitsune.users.models import Profile
+from kitsune.users.models import AVATAR_AND_NAME_CACHE_KEY, Profile
+from kitsune.users.models import get_profile as _get_profile
+from kitsune.users.models import get_remembered_profile
+
+AVATAR_AND_NAME_CACHE_TIMEOUT = 60 * 60 * 24
 
 
 @library.global_function
 def get_profile(user):
-    try:
-        return Profile.objects.get(user_id=user.id)
-    except Profile.DoesNotExist:
-        return None
+    return _get_profile(user)
 
 
 @library.global_function
@@ -33,18 +36,40 @@ def profile_url(user, edit=False):
 @library.global_function
 def profile_avatar(user, size=200):
     """Return a URL to the user's avatar."""
-    try:  # This is mostly for tests.
-        profile = Profile.objects.get(user_id=user.id)
-    except (Profile.DoesNotExist, AttributeError):
-        avatar = settings.STATIC_URL + settings.DEFAULT_AVATAR
-        profile = None
+    user_id = getattr(user, "id", None)
+    if not user_id:  # Anonymous or unsaved user.
+        return avatar_url(user, None, size=size)
+
+    try:
+        # Pages that show many users prefetch their profiles.
+        return avatar_url(user, get_remembered_profile(user_id), size=size)
+    except KeyError:
+        pass
+
+    avatars_and_names = get_avatars_and_names([user_id], size=size)
+    if user_id not in avatars_and_names:
+        return avatar_url(user, None, size=size)
+    return avatars_and_names[user_id][0]
+
+
+def avatar_url(user, profile, size=200):
+    """Return a URL to the avatar of a user whose profile is already loaded.
+
+    :arg user: the user, or None
+    :arg profile: the user's Profile, or None if they don't have one
+
+    """
+    return _avatar_url(_avatar_and_name(user, profile), size)
+
+
+def _avatar_and_name(user, profile):
+    """Return what the user's avatar URL and display name are made of."""
+    if profile is not None and profile.is_fxa_migrated:
+        avatar = profile.fxa_avatar
+    elif profile is not None and profile.avatar:
+        avatar = profile.avatar.url
     else:
-        if profile.is_fxa_migrated:
-            avatar = profile.fxa_avatar
-        elif profile.avatar:
-            avatar = profile.avatar.url
-        else:
-            avatar = settings.STATIC_URL + settings.DEFAULT_AVATAR
+        avatar = settings.STATIC_URL + settings.DEFAULT_AVATAR
 
     if avatar.startswith("//"):
         avatar = "https:%s" % avatar
@@ -54,11 +79,22 @@ def profile_avatar(user, size=200):
     else:
         email_hash = "00000000000000000000000000000000"
 
-    url = "https://secure.gravatar.com/avatar/%s?s=%s" % (email_hash, size)
+    return {
+        "avatar": avatar,
+        "email_hash": email_hash,
+        "is_fxa_migrated": bool(profile and profile.is_fxa_migrated),
+        # Not profile.display_name, which would look the user up again.
+        "display_name": (profile and profile.name) or getattr(user, "username", ""),
+    }
+
+
+def _avatar_url(info, size):
+    avatar = info["avatar"]
+    url = "https://secure.gravatar.com/avatar/%s?s=%s" % (info["email_hash"], size)
 
     # If the url doesn't start with http (local dev), don't pass it to
     # to gravatar because it can't use it.
-    if avatar.startswith("https") and profile and profile.is_fxa_migrated:
+    if avatar.startswith("https") and info["is_fxa_migrated"]:
         url = avatar
     elif avatar.startswith("http"):
         url = url + "&d=%s" % urllib.parse.quote(avatar)
@@ -66,14 +102,83 @@ def profile_avatar(user, size=200):
     return url
 
 
+def get_avatars_and_names(user_ids, size=200):
+    """Return the avatar URLs and display names of many users at once.
+
+    They're cached until the user or their profile changes, and the ones
+    that aren't are looked up with one query.
+
+    :arg user_ids: ids of the users
+    :arg size: size of the avatars, in pixels
+
+    :returns: dict of user id -> (avatar URL, display name). Users that
+        don't exist are left out.
+
+    """
+    keys = dict((user_id, AVATAR_AND_NAME_CACHE_KEY % user_id) for user_id in set(user_ids))
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [user_id for user_id, key in keys.items() if key not in cached]
+    if missing:
+        users_and_profiles = []
+        for user in User.objects.filter(id__in=missing).select_related("profile"):
+            try:
+                users_and_profiles.append((user, user.profile))
+            except Profile.DoesNotExist:
+                users_and_profiles.append((user, None))
+        infos = _remember_avatars_and_names(users_and_profiles)
+        cached.update((keys[user_id], info) for user_id, info in infos.items())
+
+    return dict(
+        (user_id, (_avatar_url(cached[key], size), cached[key]["display_name"]))
+        for user_id, key in keys.items()
+        if key in cached
+    )
+
+
+def _remember_avatars_and_names(users_and_profiles):
+    infos = dict(
+        (user.id, _avatar_and_name(user, profile)) for user, profile in users_and_profiles
+    )
+    cache.set_many(
+        dict((AVATAR_AND_NAME_CACHE_KEY % user_id, info) for user_id, info in infos.items()),
+        AVATAR_AND_NAME_CACHE_TIMEOUT,
+    )
+    return infos
+
+
+def remember_avatars_and_names(users_and_profiles, size=200):
+    """Like get_avatars_and_names, for users whose profiles are already
+    loaded. Their avatars and names are cached for get_avatars_and_names.
+
+    :arg users_and_profiles: list of (user, Profile or None) tuples
+
+    """
+    infos = _remember_avatars_and_names(users_and_profiles)
+    return dict(
+        (user_id, (_avatar_url(info, size), info["display_name"]))
+        for user_id, info in infos.items()
+    )
+
+
 @library.global_function
 def display_name(user):
     """Return a display name if set, else the username."""
-    try:  # Also mostly for tests.
-        profile = Profile.objects.get(user_id=user.id)
-    except (Profile.DoesNotExist, AttributeError):
+    user_id = getattr(user, "id", None)
+    if not user_id:  # Anonymous or unsaved user. Mostly for tests.
+        return user.username
+
+    try:
+        profile = get_remembered_profile(user_id)
+    except KeyError:
+        pass
+    else:
+        return (profile and profile.name) or user.username
+
+    try:
+        return get_avatars_and_names([user_id])[user_id][1]
+    except KeyError:
         return user.username
-    return profile.display_name if profile else user.username
 
 
 @library.filter
@@ -91,8 +196,14 @@ def unicode_to_html(text):
 def user_list(users):
     """Turn a list of users into a list of links to their profiles."""
     link = '<a class="user secondary-color" href="%s">%s</a>'
+    users = list(users)
+    names = get_avatars_and_names([u.id for u in users])
     result_list = ", ".join(
-        [link % (escape(profile_url(u)), escape(display_name(u))) for u in users]
+        [
+            link
+            % (escape(profile_url(u)), escape(names[u.id][1] if u.id in names else u.username))
+            for u in users
+        ]
     )
     return Markup(result_list)
 
@@ -1,11 +1,22 @@
 import logging
+from datetime import datetime
 
+from django.core.management import call_command
 from nose.tools import eq_
 
+from kitsune.customercare.tests import ReplyFactory
+from kitsune.questions.tests import AnswerFactory
 from kitsune.sumo.tests import TestCase
 from kitsune.users.forms import SettingsForm
-from kitsune.users.models import Setting
+from kitsune.users.models import (
+    Profile,
+    Setting,
+    get_profile,
+    prefetch_profiles,
+    profile_cache,
+)
 from kitsune.users.tests import UserFactory
+from kitsune.wiki.tests import RevisionFactory
 
 log = logging.getLogger("k.users")
 
@@ -27,3 +38,81 @@ class UserSettingsTests(TestCase):
         for setting in keys:
             SettingsForm.base_fields[setting]
             eq_(False, Setting.get_for_user(self.u, setting))
+
+
+class ProfileCacheTests(TestCase):
+    def test_get_profile_once(self):
+        """Profiles are looked up once per profile_cache block, and
+        forgotten when they change."""
+        u = UserFactory()
+        profile = u.profile
+        with profile_cache():
+            with self.assertNumQueries(1):
+                eq_(profile, get_profile(u))
+                eq_(profile, get_profile(u))
+
+            profile.name = "Someone else"
+            profile.save()
+            eq_("Someone else", get_profile(u).name)
+
+        with self.assertNumQueries(1):
+            get_profile(u)
+
+    def test_prefetch_profiles(self):
+        """Many profiles are looked up with one query."""
+        users = UserFactory.create_batch(3)
+        no_profile = UserFactory()
+        no_profile.profile.delete()
+        with profile_cache():
+            with self.assertNumQueries(1):
+                profiles = prefetch_profiles(users + [no_profile, None])
+
+            with self.assertNumQueries(0):
+                for u in users:
+                    eq_(u.id, get_profile(u).user_id)
+                eq_(None, get_profile(no_profile))
+
+        eq_(None, profiles[no_profile.id])
+
+
+class LastContributionDateTests(TestCase):
+    def last_contribution_date(self, user):
+        return Profile.objects.get(user=user).last_contribution_date
+
+    def test_updated_on_contribution(self):
+        u = UserFactory()
+        eq_(None, self.last_contribution_date(u))
+
+        d = datetime(2014, 1, 2)
+        AnswerFactory(creator=u, created=d)
+        eq_(d, self.last_contribution_date(u))
+
+        # Older contributions don't move it back.
+        ReplyFactory(user=u, created=datetime(2014, 1, 1))
+        eq_(d, self.last_contribution_date(u))
+
+        d = datetime(2014, 1, 3)
+        RevisionFactory(creator=u, created=d)
+        eq_(d, self.last_contribution_date(u))
+
+        d = datetime(2014, 1, 4)
+        RevisionFactory(reviewer=u, reviewed=d)
+        eq_(d, self.last_contribution_date(u))
+
+        # Saving a profile loaded earlier doesn't put back its date.
+        profile = Profile.objects.get(user=u)
+        AnswerFactory(creator=u, created=datetime(2014, 1, 5))
+        profile.name = "Someone else"
+        profile.save()
+        eq_(datetime(2014, 1, 5), self.last_contribution_date(u))
+
+    def test_backfill(self):
+        u1 = UserFactory()
+        u2 = UserFactory()
+        d = datetime(2014, 1, 2)
+        AnswerFactory(creator=u1, created=d)
+        Profile.objects.update(last_contribution_date=datetime(2015, 1, 1))
+
+        call_command("backfill_last_contribution_dates", batch_size=1)
+        eq_(d, self.last_contribution_date(u1))
+        eq_(None, self.last_contribution_date(u2))
@@ -13,8 +13,10 @@ from kitsune.users.templatetags.jinja_helpers import (
     profile_avatar,
     public_email,
     display_name,
+    get_avatars_and_names,
     user_list,
 )
+from kitsune.users.models import prefetch_profiles, profile_cache
 from kitsune.users.tests import UserFactory
 
 
@@ -83,3 +85,28 @@ class HelperTestCase(TestCase):
         a = fragment("a")[1]
         assert a.attrib["href"].endswith(str(users[1].username))
         eq_(display_name(users[1]), a.text)
+
+    def test_get_avatars_and_names(self):
+        u2 = UserFactory(profile__name="Someone")
+        with self.assertNumQueries(1):
+            names = get_avatars_and_names([self.u.id, u2.id, 0], size=48)
+        eq_([self.u.id, u2.id], sorted(names))
+        assert "?s=48" in names[u2.id][0]
+        eq_("Someone", names[u2.id][1])
+
+        # They're cached until the profile changes.
+        with self.assertNumQueries(0):
+            eq_(names[u2.id], get_avatars_and_names([u2.id], size=48)[u2.id])
+        u2.profile.name = "Someone Else"
+        u2.profile.save()
+        eq_("Someone Else", get_avatars_and_names([u2.id])[u2.id][1])
+
+    def test_prefetched_profiles(self):
+        """Users whose profiles were prefetched don't need any lookups."""
+        self.u.profile.name = ""
+        self.u.profile.save()
+        with profile_cache():
+            prefetch_profiles([self.u])
+            with self.assertNumQueries(0):
+                eq_(self.u.username, display_name(self.u))
+                assert "?s=48" in profile_avatar(self.u, 48)
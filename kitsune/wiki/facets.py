@@ -70,6 +70,34 @@ def documents_for(locale, topics=None, products=None):
     return documents, fallback_documents
 
 
+def documents_for_searches(locale, topics=None, products=None):
+    """Returns the ES searches documents_for would do that aren't cached.
+
+    This lets a caller execute them along with its own searches in one
+    request (see ``es_utils.msearch``) and then store the results with
+    cache_documents_for.
+
+    :returns: dict of locale -> S
+    """
+    locales = [locale]
+    if locale != settings.WIKI_DEFAULT_LANGUAGE:
+        locales.append(settings.WIKI_DEFAULT_LANGUAGE)
+
+    return dict(
+        (loc, _es_documents_for_search(loc, topics, products))
+        for loc in locales
+        if not cache.get(_documents_for_cache_key(loc, topics, products))
+    )
+
+
+def cache_documents_for(searches, topics=None, products=None):
+    """Caches the results of executed documents_for_searches searches."""
+    for locale, s in searches.items():
+        cache.add(
+            _documents_for_cache_key(locale, topics, products), DocumentMappingType.reshape(s)
+        )
+
+
 def _documents_for(locale, topics=None, products=None):
     """Returns a list of articles that apply to passed in topics and products.
 
@@ -96,6 +124,11 @@ def _documents_for(locale, topics=None, products=None):
 
 def _es_documents_for(locale, topics=None, products=None):
     """ES implementation of documents_for."""
+    return DocumentMappingType.reshape(_es_documents_for_search(locale, topics, products))
+
+
+def _es_documents_for_search(locale, topics=None, products=None):
+    """Returns the S for _es_documents_for."""
     s = (
         DocumentMappingType.search()
         .values_dict("id", "document_title", "url", "document_parent_id", "document_summary")
@@ -111,9 +144,7 @@ def _es_documents_for(locale, topics=None, products=None):
     for product in products or []:
         s = s.filter(product=product.slug)
 
-    results = s.order_by("document_display_order", "-document_recent_helpful_votes")[:100]
-    results = DocumentMappingType.reshape(results)
-    return results
+    return s.order_by("document_display_order", "-document_recent_helpful_votes")[:100]
 
 
 def _db_documents_for(locale, topics=None, products=None):
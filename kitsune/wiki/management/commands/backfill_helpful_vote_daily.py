@@ -0,0 +1,43 @@
+import argparse
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+
+from kitsune.wiki.models import HelpfulVote, HelpfulVoteDaily
+
+
+def valid_date(s):
+    try:
+        return datetime.strptime(s, "%Y-%m-%d").date()
+    except ValueError:
+        msg = "Not a valid date: '{0}'.".format(s)
+        raise argparse.ArgumentTypeError(msg)
+
+
+class Command(BaseCommand):
+    help = "Count the daily helpful votes of every revision again, from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "start",
+            nargs="?",
+            type=valid_date,
+            help="First day to count. Default: the first vote.",
+        )
+        parser.add_argument("--days", type=int, default=30, help="Days to count at once.")
+
+    def handle(self, start=None, days=30, **options):
+        if start is None:
+            first_vote = HelpfulVote.objects.aggregate(first=Min("created"))["first"]
+            if first_vote is None:
+                return
+            start = first_vote.date()
+
+        end = date.today() + timedelta(days=1)
+        while start < end:
+            chunk_end = min(start + timedelta(days=days), end)
+            if options["verbosity"] > 1:
+                print("Counting votes from %s to %s." % (start, chunk_end))
+            HelpfulVoteDaily.recount(start, chunk_end)
+            start = chunk_end
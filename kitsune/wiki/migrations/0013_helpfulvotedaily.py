@@ -0,0 +1,27 @@
+# Generated by Django 2.2.14 on 2026-10-18 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0012_auto_20200629_0826'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HelpfulVoteDaily',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('helpful', models.IntegerField(default=0)),
+                ('unhelpful', models.IntegerField(default=0)),
+                ('revision', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_votes', to='wiki.Revision')),
+            ],
+            options={
+                'unique_together': {('revision', 'date')},
+            },
+        ),
+    ]
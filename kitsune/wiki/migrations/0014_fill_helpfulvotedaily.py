@@ -0,0 +1,56 @@
+# Generated by Django 2.2.14 on 2026-10-18 18:40
+
+from datetime import date, timedelta
+
+from django.db import migrations
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncDate
+
+
+def count_helpful_votes(apps, schema_editor):
+    """Count the helpful votes cast before HelpfulVoteDaily existed."""
+    HelpfulVote = apps.get_model('wiki', 'HelpfulVote')
+    HelpfulVoteDaily = apps.get_model('wiki', 'HelpfulVoteDaily')
+
+    first_vote = HelpfulVote.objects.aggregate(first=Min('created'))['first']
+    if first_vote is None:
+        return
+
+    start = first_vote.date()
+    end = date.today() + timedelta(days=1)
+    while start < end:
+        chunk_end = min(start + timedelta(days=30), end)
+        counts = (
+            HelpfulVote.objects.filter(created__gte=start, created__lt=chunk_end)
+            .annotate(day=TruncDate('created'))
+            .values('revision_id', 'day')
+            .annotate(
+                yes=Count('id', filter=Q(helpful=True)), no=Count('id', filter=Q(helpful=False))
+            )
+        )
+        HelpfulVoteDaily.objects.filter(date__gte=start, date__lt=chunk_end).delete()
+        HelpfulVoteDaily.objects.bulk_create(
+            [
+                HelpfulVoteDaily(
+                    revision_id=c['revision_id'], date=c['day'], helpful=c['yes'], unhelpful=c['no']
+                )
+                for c in counts
+            ],
+            batch_size=1000,
+        )
+        start = chunk_end
+
+
+def forget_helpful_votes(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0013_helpfulvotedaily'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_helpful_votes, forget_helpful_votes),
+    ]
@@ -9,8 +9,10 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db import IntegrityError, models
-from django.db.models import Q
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save
 from django.http import Http404
 from django.urls import resolve
 from django.utils.encoding import smart_bytes
@@ -21,7 +23,7 @@ from tidings.models import NotificationsMixin
 
 from kitsune.gallery.models import Image
 from kitsune.products.models import Product, Topic
-from kitsune.search.es_utils import UnindexMeBro, es_analyzer_for_locale
+from kitsune.search.es_utils import es_analyzer_for_locale
 from kitsune.search.models import (
     SearchMappingType,
     SearchMixin,
@@ -30,8 +32,10 @@ from kitsune.search.models import (
 )
 from kitsune.sumo.apps import ProgrammingError
 from kitsune.sumo.models import LocaleField, ModelBase
+from kitsune.sumo.parser import invalidate_resolved_objects
 from kitsune.sumo.urlresolvers import reverse, split_path
 from kitsune.tags.models import BigVocabTaggableMixin
+from kitsune.users.models import update_last_contribution_date
 from kitsune.wiki.config import (
     ADMINISTRATION_CATEGORY,
     CANNED_RESPONSES_CATEGORY,
@@ -675,11 +679,14 @@ class Document(
     def get_mapping_type(cls):
         return DocumentMappingType
 
-    def parse_and_calculate_links(self):
+    def parse_and_calculate_links(self, resolver=None):
         """Calculate What Links Here data for links going out from this.
 
         Also returns a parsed version of the current html, because that
         is a byproduct of the process, and is useful.
+
+        Pass an ObjectResolver to share lookups when rendering a bunch
+        of documents.
         """
         if not self.current_revision:
             return ""
@@ -700,6 +707,8 @@ class Document(
             locale=self.locale,
             doc_id=self.id,
             parser_cls=WhatLinksHereParser,
+            document=self,
+            resolver=resolver,
         )
 
     def links_from(self):
@@ -790,66 +799,78 @@ class DocumentMappingType(SearchMappingType):
         }
 
     @classmethod
-    def extract_document(cls, obj_id, obj=None):
-        if obj is None:
-            model = cls.get_model()
-            obj = model.objects.select_related("current_revision", "parent").get(pk=obj_id)
-
-        if obj.html.startswith(REDIRECT_HTML):
-            # It's possible this document is indexed and was turned
-            # into a redirect, so now we want to explicitly unindex
-            # it. The way we do that is by throwing an exception
-            # which gets handled by the indexing machinery.
-            raise UnindexMeBro()
-
-        d = {}
-        d["id"] = obj.id
-        d["model"] = cls.get_mapping_type_name()
-        d["url"] = obj.get_absolute_url()
-        d["indexed_on"] = int(time.time())
-
-        d["topic"] = [t.slug for t in obj.get_topics()]
-        d["product"] = [p.slug for p in obj.get_products()]
-
-        d["document_title"] = obj.title
-        d["document_locale"] = obj.locale
-        d["document_parent_id"] = obj.parent.id if obj.parent else None
-        d["document_content"] = obj.html
-        d["document_category"] = obj.category
-        d["document_slug"] = obj.slug
-        d["document_is_archived"] = obj.is_archived
-        d["document_display_order"] = obj.original.display_order
-
-        d["document_summary"] = obj.summary
-        if obj.current_revision is not None:
+    def extract_documents(cls, ids):
+        # It's possible a document is indexed and was turned into a
+        # redirect or lost its current revision, so now we want to
+        # explicitly unindex it. The way we do that is by leaving it
+        # out.
+        objs = list(
+            cls.get_model()
+            .objects.filter(pk__in=ids, current_revision__isnull=False)
+            .exclude(html__startswith=REDIRECT_HTML)
+            .select_related("current_revision", "parent")
+        )
+
+        # Translations inherit their parent's topics and products.
+        original_ids = set(obj.original.id for obj in objs)
+        topics = {}
+        for doc_id, slug in Topic.objects.filter(document__in=original_ids).values_list(
+            "document", "slug"
+        ):
+            topics.setdefault(doc_id, []).append(slug)
+        products = {}
+        for doc_id, slug in Product.objects.filter(document__in=original_ids).values_list(
+            "document", "slug"
+        ):
+            products.setdefault(doc_id, []).append(slug)
+
+        # Don't query for helpful votes if the document is a template or
+        # is in Navigation category (50).
+        voted_ids = [obj.id for obj in objs if not obj.is_template and not obj.category == 50]
+        start = datetime.now() - timedelta(days=30)
+        recent_helpful_votes = dict(
+            HelpfulVote.objects.filter(
+                revision__document__in=voted_ids, created__gt=start, helpful=True
+            )
+            .order_by()
+            .values("revision__document")
+            .annotate(num=Count("id"))
+            .values_list("revision__document", "num")
+        )
+
+        documents = {}
+        for obj in objs:
+            d = {}
+            d["id"] = obj.id
+            d["model"] = cls.get_mapping_type_name()
+            d["url"] = obj.get_absolute_url()
+            d["indexed_on"] = int(time.time())
+
+            d["topic"] = topics.get(obj.original.id, [])
+            d["product"] = products.get(obj.original.id, [])
+
+            d["document_title"] = obj.title
+            d["document_locale"] = obj.locale
+            d["document_parent_id"] = obj.parent.id if obj.parent else None
+            d["document_content"] = obj.html
+            d["document_category"] = obj.category
+            d["document_slug"] = obj.slug
+            d["document_is_archived"] = obj.is_archived
+            d["document_display_order"] = obj.original.display_order
+
+            d["document_summary"] = obj.summary
             d["document_keywords"] = obj.current_revision.keywords
             d["updated"] = int(time.mktime(obj.current_revision.created.timetuple()))
             d["document_current_id"] = obj.current_revision.id
-            d["document_recent_helpful_votes"] = obj.recent_helpful_votes
-        else:
-            d["document_summary"] = None
-            d["document_keywords"] = None
-            d["updated"] = None
-            d["document_current_id"] = None
-            d["document_recent_helpful_votes"] = 0
-
-        # Don't query for helpful votes if the document doesn't have a current
-        # revision, or is a template, or is a redirect, or is in Navigation
-        # category (50).
-        if (
-            obj.current_revision
-            and not obj.is_template
-            and not obj.html.startswith(REDIRECT_HTML)
-            and not obj.category == 50
-        ):
-            d["document_recent_helpful_votes"] = obj.recent_helpful_votes
-        else:
-            d["document_recent_helpful_votes"] = 0
 
-        # Select a locale-appropriate default analyzer for all strings.
-        d["_analyzer"] = es_analyzer_for_locale(obj.locale)
+            d["document_recent_helpful_votes"] = recent_helpful_votes.get(obj.id, 0)
+
+            # Select a locale-appropriate default analyzer for all strings.
+            d["_analyzer"] = es_analyzer_for_locale(obj.locale)
 
-        return d
+            documents[obj.id] = d
+
+        return documents
 
     @classmethod
     def get_indexable(cls, seconds_ago=0):
@@ -879,6 +900,10 @@ register_for_indexing("wiki", Document)
 register_for_indexing("wiki", Document.topics.through, m2m=True)
 register_for_indexing("wiki", Document.products.through, m2m=True)
 
+# Parsers remember what links, templates and includes point to.
+post_save.connect(invalidate_resolved_objects, sender=Document, dispatch_uid="parser_doc_save")
+post_delete.connect(invalidate_resolved_objects, sender=Document, dispatch_uid="parser_doc_delete")
+
 
 MAX_REVISION_COMMENT_LENGTH = 255
 
@@ -1175,8 +1200,8 @@ class RevisionMetricsMappingType(SearchMappingType):
         }
 
     @classmethod
-    def extract_document(cls, obj_id, obj=None):
-        """Extracts indexable attributes from an Answer."""
+    def extract_documents(cls, ids):
+        """Extracts indexable attributes from Revisions."""
         fields = [
             "id",
             "created",
@@ -1185,50 +1210,71 @@ class RevisionMetricsMappingType(SearchMappingType):
             "reviewer_id",
             "is_approved",
             "document_id",
+            "document__locale",
+            "document__slug",
+            "document__parent_id",
         ]
-        composed_fields = ["document__locale", "document__slug"]
-        all_fields = fields + composed_fields
 
-        if obj is None:
-            model = cls.get_model()
-            obj_dict = model.objects.values(*all_fields).get(pk=obj_id)
-        else:
-            obj_dict = dict([(field, getattr(obj, field)) for field in fields])
-            obj_dict["document__locale"] = obj.document.locale
-            obj_dict["document__slug"] = obj.document.slug
-
-        d = {}
-        d["id"] = obj_dict["id"]
-        d["model"] = cls.get_mapping_type_name()
-
-        # We do this because get_absolute_url is an instance method
-        # and we don't want to create an instance because it's a DB
-        # hit and expensive. So we do it by hand. get_absolute_url
-        # doesn't change much, so this is probably ok.
-        d["url"] = reverse(
-            "wiki.revision",
-            kwargs={"revision_id": obj_dict["id"], "document_slug": obj_dict["document__slug"]},
-        )
+        objs = list(cls.get_model().objects.filter(pk__in=ids).values(*fields))
+
+        # Translations inherit their parent's products.
+        products = {}
+        original_ids = set(obj["document__parent_id"] or obj["document_id"] for obj in objs)
+        for doc_id, slug in Product.objects.filter(document__in=original_ids).values_list(
+            "document", "slug"
+        ):
+            products.setdefault(doc_id, []).append(slug)
+
+        documents = {}
+        for obj in objs:
+            d = {}
+            d["id"] = obj["id"]
+            d["model"] = cls.get_mapping_type_name()
+
+            # We do this because get_absolute_url is an instance method
+            # and we don't want to create an instance because it's a DB
+            # hit and expensive. So we do it by hand. get_absolute_url
+            # doesn't change much, so this is probably ok.
+            d["url"] = reverse(
+                "wiki.revision",
+                kwargs={"revision_id": obj["id"], "document_slug": obj["document__slug"]},
+            )
 
-        d["indexed_on"] = int(time.time())
+            d["indexed_on"] = int(time.time())
 
-        d["created"] = obj_dict["created"]
-        d["reviewed"] = obj_dict["reviewed"]
+            d["created"] = obj["created"]
+            d["reviewed"] = obj["reviewed"]
 
-        d["locale"] = obj_dict["document__locale"]
-        d["is_approved"] = obj_dict["is_approved"]
-        d["creator_id"] = obj_dict["creator_id"]
-        d["reviewer_id"] = obj_dict["reviewer_id"]
+            d["locale"] = obj["document__locale"]
+            d["is_approved"] = obj["is_approved"]
+            d["creator_id"] = obj["creator_id"]
+            d["reviewer_id"] = obj["reviewer_id"]
 
-        doc = Document.objects.get(id=obj_dict["document_id"])
-        d["product"] = [p.slug for p in doc.get_products()]
+            d["product"] = products.get(obj["document__parent_id"] or obj["document_id"], [])
 
-        return d
+            documents[obj["id"]] = d
+
+        return documents
 
 
 register_for_indexing("revisions", Revision)
 
 
+def revision_contributed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_last_contribution_date(instance.creator_id, instance.created)
+        # Old revisions don't have the reviewed date.
+        if instance.reviewer_id:
+            update_last_contribution_date(
+                instance.reviewer_id, instance.reviewed or instance.created
+            )
+
+
+post_save.connect(
+    revision_contributed, sender=Revision, dispatch_uid="revision_last_contribution_date"
+)
+
+
 class HelpfulVote(ModelBase):
     """Helpful or Not Helpful vote on Revision."""
 
@@ -1253,6 +1299,81 @@ class HelpfulVoteMetadata(ModelBase):
     value = models.CharField(max_length=1000)
 
 
+class HelpfulVoteDaily(ModelBase):
+    """How many Helpful and Not Helpful votes a revision got in a day.
+
+    These are kept up to date as votes come and go, so the stats about
+    votes don't have to go through all of them.
+
+    """
+
+    revision = models.ForeignKey(Revision, on_delete=models.CASCADE, related_name="daily_votes")
+    date = models.DateField()
+    helpful = models.IntegerField(default=0)
+    unhelpful = models.IntegerField(default=0)
+
+    class Meta(object):
+        unique_together = ("revision", "date")
+
+    @classmethod
+    def count_vote(cls, revision_id, created, helpful, count=1):
+        """Add `count` votes to the revision's count of the day."""
+        day = created.date() if isinstance(created, datetime) else created
+        field = "helpful" if helpful else "unhelpful"
+        qs = cls.objects.filter(revision_id=revision_id, date=day)
+        if qs.update(**{field: F(field) + count}) or count < 0:
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(revision_id=revision_id, date=day, **{field: count})
+        except IntegrityError:
+            # Another vote of the day beat us to it.
+            qs.update(**{field: F(field) + count})
+
+    @classmethod
+    def recount(cls, start, end):
+        """Count the votes from `start` up to, but not including, `end`
+        again, from scratch."""
+        counts = (
+            HelpfulVote.objects.filter(created__gte=start, created__lt=end)
+            .annotate(day=TruncDate("created"))
+            .values("revision_id", "day")
+            .annotate(
+                yes=Count("id", filter=Q(helpful=True)), no=Count("id", filter=Q(helpful=False))
+            )
+        )
+        with transaction.atomic():
+            cls.objects.filter(date__gte=start, date__lt=end).delete()
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        revision_id=c["revision_id"],
+                        date=c["day"],
+                        helpful=c["yes"],
+                        unhelpful=c["no"],
+                    )
+                    for c in counts
+                ],
+                batch_size=1000,
+            )
+
+
+def count_helpful_vote(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        HelpfulVoteDaily.count_vote(instance.revision_id, instance.created, instance.helpful)
+
+
+def uncount_helpful_vote(sender, instance, **kwargs):
+    HelpfulVoteDaily.count_vote(instance.revision_id, instance.created, instance.helpful, -1)
+
+
+post_save.connect(count_helpful_vote, sender=HelpfulVote, dispatch_uid="helpful_vote_daily_save")
+post_delete.connect(
+    uncount_helpful_vote, sender=HelpfulVote, dispatch_uid="helpful_vote_daily_delete"
+)
+
+
 class ImportantDate(ModelBase):
     """Important date that shows up globally on metrics graphs."""
 
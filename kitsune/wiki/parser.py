@@ -13,7 +13,7 @@ from django.utils.translation import ugettext as _, ugettext_lazy as _lazy
 
 from kitsune.gallery.models import Image
 from kitsune.sumo import parser as sumo_parser
-from kitsune.sumo.parser import ALLOWED_ATTRIBUTES, get_object_fallback
+from kitsune.sumo.parser import ALLOWED_ATTRIBUTES
 from kitsune.sumo.utils import uselocale
 from kitsune.wiki.models import Document
 
@@ -48,13 +48,19 @@ BLOCK_LEVEL_ELEMENTS = [
 TEMPLATE_ARG_REGEX = re.compile("{{{([^{]+?)}}}")
 
 
-def wiki_to_html(wiki_markup, locale=settings.WIKI_DEFAULT_LANGUAGE, doc_id=None, parser_cls=None):
-    """Wiki Markup -> HTML with the wiki app's enhanced parser"""
+def wiki_to_html(
+    wiki_markup, locale=settings.WIKI_DEFAULT_LANGUAGE, doc_id=None, parser_cls=None, **kwargs
+):
+    """Wiki Markup -> HTML with the wiki app's enhanced parser
+
+    Any other kwargs go to the parser.
+
+    """
     if parser_cls is None:
         parser_cls = WikiParser
 
     with uselocale(locale):
-        content = parser_cls(doc_id=doc_id).parse(
+        content = parser_cls(doc_id=doc_id, **kwargs).parse(
             wiki_markup, show_toc=False, locale=locale, toc_string=_("Table of Contents"),
         )
     return content
@@ -364,14 +370,16 @@ class WikiParser(sumo_parser.WikiParser):
 
     image_template = "wikiparser/hook_image_lazy.html"
 
-    def __init__(self, base_url=None, doc_id=None):
+    def __init__(self, base_url=None, doc_id=None, resolver=None):
         """
         doc_id -- If you want to be nice, pass the ID of the Document you are
             rendering. This will make recursive inclusions fail immediately
             rather than after the first round of recursion.
+        resolver -- An ObjectResolver to look up links with. Pass one to
+            share lookups between parsers.
 
         """
-        super(WikiParser, self).__init__(base_url)
+        super(WikiParser, self).__init__(base_url, resolver=resolver)
 
         # Stack of document IDs to prevent Include or Template recursion:
         self.inclusions = [doc_id] if doc_id else []
@@ -409,10 +417,17 @@ class WikiParser(sumo_parser.WikiParser):
 
         return html
 
+    def prefetch_lookup(self, space, name):
+        if space in ("Include", "I"):
+            return Document, name, {}
+        elif space in ("Template", "T"):
+            return Document, "Template:" + name.split("|", 1)[0], {"is_template": True}
+        return super(WikiParser, self).prefetch_lookup(space, name)
+
     def _hook_include(self, parser, space, title):
         """Returns the document's parsed content."""
         message = _('The document "%s" does not exist.') % title
-        include = get_object_fallback(Document, title, locale=self.locale)
+        include = self.resolver.get(Document, title, locale=self.locale)
         if not include or not include.current_revision:
             return message
 
@@ -439,7 +454,7 @@ class WikiParser(sumo_parser.WikiParser):
         template_title = "Template:" + short_title
 
         message = _('The template "%s" does not exist or has no approved revision.') % short_title
-        template = get_object_fallback(
+        template = self.resolver.get(
             Document, template_title, locale=self.locale, is_template=True
         )
 
@@ -467,8 +482,8 @@ class WikiParser(sumo_parser.WikiParser):
 class WhatLinksHereParser(WikiParser):
     """An extension of the wiki that deals with what links here data."""
 
-    def __init__(self, doc_id, **kwargs):
-        self.current_doc = Document.objects.get(pk=doc_id)
+    def __init__(self, doc_id, document=None, **kwargs):
+        self.current_doc = document or Document.objects.get(pk=doc_id)
         return super(WhatLinksHereParser, self).__init__(doc_id=doc_id, **kwargs)
 
     def _hook_internal_link(self, parser, space, name):
@@ -477,7 +492,7 @@ class WhatLinksHereParser(WikiParser):
         title = name.split("|")[0]
         locale = self.current_doc.locale
 
-        linked_doc = get_object_fallback(Document, title, locale)
+        linked_doc = self.resolver.get(Document, title, locale)
         if linked_doc is not None:
             self.current_doc.add_link_to(linked_doc, "link")
 
@@ -487,7 +502,7 @@ class WhatLinksHereParser(WikiParser):
         """Record a template link between documents, and then call super()."""
 
         params = name.split("|")
-        template = get_object_fallback(
+        template = self.resolver.get(
             Document, "Template:" + params[0], locale=self.locale, is_template=True
         )
 
@@ -498,7 +513,7 @@ class WhatLinksHereParser(WikiParser):
 
     def _hook_include(self, parser, space, name):
         """Record an include link between documents, and then call super()."""
-        include = get_object_fallback(Document, name, locale=self.locale)
+        include = self.resolver.get(Document, name, locale=self.locale)
 
         if include:
             self.current_doc.add_link_to(include, "include")
@@ -508,7 +523,7 @@ class WhatLinksHereParser(WikiParser):
     def _hook_image_tag(self, parser, space, name):
         """Record an image is included in a document, then call super()."""
         title = name.split("|")[0]
-        image = get_object_fallback(Image, title, self.locale)
+        image = self.resolver.get(Image, title, self.locale)
 
         if image:
             self.current_doc.add_image(image)
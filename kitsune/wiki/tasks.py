@@ -1,4 +1,5 @@
 import logging
+from collections import deque
 from datetime import date
 from typing import Dict, List
 
@@ -17,12 +18,17 @@ from multidb.pinning import pin_this_thread, unpin_this_thread
 from sentry_sdk import capture_exception
 
 from kitsune.kbadge.utils import get_or_create_badge
+from kitsune.search.tasks import index_task
+from kitsune.search.utils import to_class_path
 from kitsune.sumo import email_utils
+from kitsune.sumo.parser import ObjectResolver
 from kitsune.sumo.urlresolvers import reverse
 from kitsune.sumo.utils import chunked
 from kitsune.wiki.badges import WIKI_BADGES
 from kitsune.wiki.models import (
     Document,
+    DocumentLink,
+    DocumentMappingType,
     Revision,
     SlugCollision,
     TitleCollision,
@@ -32,6 +38,11 @@ from kitsune.wiki.utils import BitlyRateLimitException, generate_short_url
 
 log = logging.getLogger("k.task")
 
+# Links along which a change to a document changes how others render.
+RENDER_CASCADE_KINDS = ["template", "include"]
+
+RENDER_CHUNK_SIZE = 100
+
 
 @task()
 def send_reviewed_notification(revision_id: int, document_id: int, message: str):
@@ -297,42 +308,103 @@ def maybe_award_badge(badge_template: Dict, year: int, user_id: int):
         return True
 
 
+def _dependents_in_render_order(doc_ids):
+    """Return doc_ids and every document that depends on them, in the
+    order they need to be rendered.
+
+    This walks along the graph of links between documents. If there is
+    a document A that includes another document B as a template, then
+    there is an edge from A to B in this graph, and A depends on B. The
+    graph is loaded a level at a time with one query per level.
+
+    Documents come after the documents they depend on. The graph can
+    have cycles (the parser refuses to render those), so anything in a
+    cycle comes at the end.
+
+    """
+    doc_ids = set(doc_ids)
+    depends_on = {}
+    todo = doc_ids
+    while todo:
+        links = DocumentLink.objects.filter(
+            linked_to__in=todo, kind__in=RENDER_CASCADE_KINDS
+        ).values_list("linked_from", "linked_to")
+        todo = set()
+        for from_id, to_id in links:
+            depends_on.setdefault(from_id, set()).add(to_id)
+            if from_id not in doc_ids:
+                doc_ids.add(from_id)
+                todo.add(from_id)
+
+    dependents = {}
+    for from_id, to_ids in depends_on.items():
+        for to_id in to_ids:
+            dependents.setdefault(to_id, set()).add(from_id)
+
+    waiting = dict((doc_id, len(depends_on.get(doc_id, ()))) for doc_id in doc_ids)
+    ready = deque(sorted(doc_id for doc_id, count in waiting.items() if not count))
+    order = []
+    while ready:
+        doc_id = ready.popleft()
+        order.append(doc_id)
+        for dependent in sorted(dependents.get(doc_id, ())):
+            waiting[dependent] -= 1
+            if not waiting[dependent]:
+                ready.append(dependent)
+
+    done = set(order)
+    order.extend(sorted(doc_id for doc_id in doc_ids if doc_id not in done))
+    return order
+
+
+def render_documents(doc_ids, cascade=True):
+    """Re-render documents and save the ones whose html changed.
+
+    With cascade, this also re-renders every document that uses them,
+    however indirectly, as a template or include, each exactly once.
+
+    Documents are loaded and saved in bulk, and links are looked up
+    once for the whole run. Only the html column is written, so this
+    doesn't go through Document.save(); it clears the html cache and
+    reindexes the changed documents itself.
+
+    Returns the ids of the documents whose html changed.
+
+    """
+    if cascade:
+        doc_ids = _dependents_in_render_order(doc_ids)
+
+    resolver = ObjectResolver()
+    changed_ids = []
+    for chunk in chunked(list(doc_ids), RENDER_CHUNK_SIZE):
+        docs = Document.objects.select_related("current_revision", "parent").in_bulk(chunk)
+        changed = []
+        for doc_id in chunk:
+            doc = docs.get(doc_id)
+            if doc is None:
+                continue
+            html = doc.parse_and_calculate_links(resolver=resolver)
+            if doc.html != html:
+                doc.html = html
+                changed.append(doc)
+
+        Document.objects.bulk_update(changed, ["html"])
+        for doc in changed:
+            doc.clear_cached_html()
+        changed_ids.extend(doc.id for doc in changed)
+
+    if changed_ids:
+        index_task.delay(to_class_path(DocumentMappingType), changed_ids)
+    return changed_ids
+
+
 @task()
 def render_document_cascade(base_doc_id):
     """Given a document, render it and all documents that may be affected."""
-
-    # This walks along the graph of links between documents. If there is
-    # a document A that includes another document B as a template, then
-    # there is an edge from A to B in this graph. The goal here is to
-    # process every node exactly once. This is robust to cycles and
-    # diamonds in the graph, since it keeps track of what nodes have
-    # been visited already.
-
-    try:
-        base_doc = Document.objects.get(id=base_doc_id)
-    except Document.DoesNotExist as err:
-        capture_exception(err)
-        return
     # In case any thing goes wrong, this guarantees we unpin the DB
     try:
         # Sends all writes to the master DB. Slaves are readonly.
         pin_this_thread()
-
-        todo = {base_doc}
-        done = set()
-
-        while todo:
-            d = todo.pop()
-            if d in done:
-                # Don't process a node twice.
-                continue
-            d.html = d.parse_and_calculate_links()
-            d.save()
-            done.add(d)
-            todo.update(
-                link_to.linked_from
-                for link_to in d.links_to().filter(kind__in=["template", "include"])
-            )
-
+        render_documents([base_doc_id])
     finally:
         unpin_this_thread()
@@ -1,12 +1,13 @@
 # coding: utf-8
 
 import urllib.parse
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from nose.tools import eq_
 from taggit.models import TaggedItem
 
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 
 from kitsune.products.tests import ProductFactory, TopicFactory
 from kitsune.sumo.apps import ProgrammingError
@@ -23,13 +24,14 @@ from kitsune.wiki.config import (
     TEMPLATES_CATEGORY,
     TEMPLATE_TITLE_PREFIX,
 )
-from kitsune.wiki.models import Document
+from kitsune.wiki.models import Document, HelpfulVoteDaily
 from kitsune.wiki.parser import wiki_to_html
 from kitsune.wiki.tests import (
     RevisionFactory,
     ApprovedRevisionFactory,
     TranslatedRevisionFactory,
     DocumentFactory,
+    HelpfulVoteFactory,
     TemplateDocumentFactory,
     RedirectRevisionFactory,
 )
@@ -701,3 +703,38 @@ class RevisionTests(TestCase):
 
         eq_(r1.previous, None)
         eq_(r2.previous.id, r1.id)
+
+
+class HelpfulVoteDailyTests(TestCase):
+    def test_counts_follow_votes(self):
+        """Votes are counted by revision and day as they come and go."""
+        r = RevisionFactory()
+        yesterday = datetime.now() - timedelta(days=1)
+        HelpfulVoteFactory(revision=r, helpful=True)
+        HelpfulVoteFactory(revision=r, helpful=True)
+        HelpfulVoteFactory(revision=r, helpful=True, created=yesterday)
+        vote = HelpfulVoteFactory(revision=r, helpful=False)
+
+        def counts():
+            return sorted(r.daily_votes.values_list("date", "helpful", "unhelpful"))
+
+        eq_([(yesterday.date(), 1, 0), (datetime.now().date(), 2, 1)], counts())
+
+        vote.delete()
+        eq_([(yesterday.date(), 1, 0), (datetime.now().date(), 2, 0)], counts())
+        eq_(2, HelpfulVoteDaily.objects.count())
+
+    def test_backfill(self):
+        """The backfill counts the votes again from scratch."""
+        r = RevisionFactory()
+        yesterday = datetime.now() - timedelta(days=1)
+        HelpfulVoteFactory(revision=r, helpful=True, created=yesterday)
+        HelpfulVoteFactory(revision=r, helpful=False)
+        HelpfulVoteDaily.objects.all().delete()
+
+        call_command("backfill_helpful_vote_daily")
+
+        eq_(
+            [(yesterday.date(), 1, 0), (datetime.now().date(), 0, 1)],
+            sorted(r.daily_votes.values_list("date", "helpful", "unhelpful")),
+        )
@@ -17,9 +17,11 @@ from kitsune.users.tests import UserFactory, add_permission
 from kitsune.wiki.config import TEMPLATE_TITLE_PREFIX, TEMPLATES_CATEGORY
 from kitsune.wiki.models import Document, Revision
 from kitsune.wiki.tasks import (
+    _dependents_in_render_order,
     _rebuild_kb_chunk,
     rebuild_kb,
     render_document_cascade,
+    render_documents,
     schedule_rebuild_kb,
     send_reviewed_notification,
 )
@@ -201,3 +203,35 @@ class TestDocumentRenderCascades(TestCaseBase):
         eq_(self._clean(d1), "ONE")
         eq_(self._clean(d2), "ONE two")
         eq_(self._clean(d3), "ONE ONE two three")
+
+    def test_render_order(self):
+        d1, _, _ = doc_rev_parser(
+            "one ", title=TEMPLATE_TITLE_PREFIX + "D1", category=TEMPLATES_CATEGORY
+        )
+        d2, _, _ = doc_rev_parser(
+            "[[T:D1]] two", title=TEMPLATE_TITLE_PREFIX + "D2", category=TEMPLATES_CATEGORY
+        )
+        d3, _, _ = doc_rev_parser("[[T:D2]] [[I:D4]] three", title="D3")
+        d4, _, _ = doc_rev_parser("[[T:D1]] four", title="D4")
+        doc_rev_parser("[[D3]] five", title="D5")
+
+        # Plain links don't make D5 depend on D3.
+        eq_([d1.id, d2.id, d4.id, d3.id], _dependents_in_render_order([d1.id]))
+        eq_([d2.id, d3.id], _dependents_in_render_order([d2.id]))
+
+    @mock.patch("kitsune.wiki.tasks.index_task")
+    def test_only_saves_changes(self, index_task):
+        d1, _, _ = doc_rev_parser(
+            "one ", title=TEMPLATE_TITLE_PREFIX + "D1", category=TEMPLATES_CATEGORY
+        )
+        d2, _, _ = doc_rev_parser("[[T:D1]] two", title="D2")
+
+        eq_([], render_documents([d1.id]))
+        assert not index_task.delay.called
+
+        Revision.objects.filter(document=d1).update(content="ONE")
+        eq_([d1.id, d2.id], render_documents([d1.id]))
+        eq_(self._clean(d2), "ONE two")
+        index_task.delay.assert_called_once_with(
+            "kitsune.wiki.models:DocumentMappingType", [d1.id, d2.id]
+        )
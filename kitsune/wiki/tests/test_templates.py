@@ -37,6 +37,7 @@ from kitsune.wiki.tests import (
     ApprovedRevisionFactory,
     DocumentFactory,
     DraftRevisionFactory,
+    HelpfulVoteFactory,
     LocaleFactory,
     RedirectRevisionFactory,
     RevisionFactory,
@@ -2576,6 +2577,19 @@ class HelpfulVoteTests(TestCaseBase):
         data = json.loads(resp.content)
         eq_(0, len(data["datums"]))
 
+    def test_helpfulvotes_graph_async_zero_fill(self):
+        """There's a datum for every day from the first vote up to today, in order."""
+        r = self.document.current_revision
+        HelpfulVoteFactory(revision=r, helpful=True, created=datetime.now() - timedelta(days=3))
+        HelpfulVoteFactory(revision=r, helpful=False, created=datetime.now() - timedelta(days=1))
+
+        resp = get(self.client, "wiki.get_helpful_votes_async", args=[r.document.slug])
+        eq_(200, resp.status_code)
+        datums = json.loads(resp.content)["datums"]
+
+        eq_([(1, 0), (0, 0), (0, 1), (0, 0)], [(d["yes"], d["no"]) for d in datums])
+        eq_([86400] * 3, [b["date"] - a["date"] for a, b in zip(datums, datums[1:])])
+
 
 class SelectLocaleTests(TestCaseBase):
     """Test the locale selection page"""
@@ -2,7 +2,7 @@ import json
 import logging
 import re
 import time
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from functools import wraps
 
 from django.conf import settings
@@ -10,7 +10,6 @@ from django.contrib import messages
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.db import connection
 from django.forms.utils import ErrorList
 from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
@@ -55,6 +54,7 @@ from kitsune.wiki.models import (
     Document,
     DraftRevision,
     HelpfulVote,
+    HelpfulVoteDaily,
     ImportantDate,
     Revision,
     SlugCollision,
@@ -1235,66 +1235,57 @@ def unhelpful_survey(request):
     return HttpResponse(json.dumps({"message": _("Thanks for making us better!")}))
 
 
+# How long to keep the helpful votes chart data of a document.
+HELPFUL_VOTES_CACHE_TIMEOUT = 60 * 60
+
+
 @require_GET
 def get_helpful_votes_async(request, document_slug):
     document = get_object_or_404(Document, locale=request.LANGUAGE_CODE, slug=document_slug)
 
-    datums = []
-    flag_data = []
-    rev_data = []
+    # The days are filled in up to today, so tomorrow gets a new key.
+    cache_key = "wiki:helpful_votes:%s:%s" % (document.id, date.today())
+    send = cache.get(cache_key)
+    if send is None:
+        send = _helpful_votes_chart(document)
+        cache.set(cache_key, send, HELPFUL_VOTES_CACHE_TIMEOUT)
+
+    return HttpResponse(json.dumps(send), content_type="application/json")
+
+
+def _helpful_votes_chart(document):
+    """Return the data of the helpful votes chart of a document."""
+    votes_by_day = {}
     revisions = set()
-    created_list = []
-    dates_with_data = set()
-
-    cursor = connection.cursor()
-
-    cursor.execute(
-        "SELECT wiki_helpfulvote.revision_id, "
-        "    SUM(wiki_helpfulvote.helpful), "
-        "    SUM(NOT(wiki_helpfulvote.helpful)), "
-        "    wiki_helpfulvote.created "
-        "FROM wiki_helpfulvote "
-        "INNER JOIN wiki_revision ON "
-        "    wiki_helpfulvote.revision_id=wiki_revision.id "
-        "WHERE wiki_revision.document_id=%s "
-        "GROUP BY DATE(wiki_helpfulvote.created)",
-        [document.id],
+    daily_votes = HelpfulVoteDaily.objects.filter(revision__document=document).values_list(
+        "date", "revision_id", "helpful", "unhelpful"
     )
+    for day, revision_id, helpful, unhelpful in daily_votes:
+        yes, no = votes_by_day.get(day, (0, 0))
+        votes_by_day[day] = (yes + helpful, no + unhelpful)
+        revisions.add(revision_id)
 
-    results = cursor.fetchall()
-    for res in results:
-        revisions.add(int(res[0]))
-        created_list.append(res[3])
-        date = int(time.mktime(res[3].timetuple()) // 86400) * 86400
+    if not votes_by_day:
+        return {"datums": [], "annotations": []}
 
-        datums.append(
-            {"yes": int(res[1]), "no": int(res[2]), "date": date,}
-        )
-        dates_with_data.add(date)
-
-    if not created_list:
-        send = {"datums": [], "annotations": []}
-        return HttpResponse(json.dumps(send), content_type="application/json")
-
-    min_created = min(created_list)
-    max_created = max(created_list)
-
-    # Zero fill data
-    timestamp = int(time.mktime(res[3].timetuple()) // 86400) * 86400
-    end = time.mktime(datetime.now().timetuple())
-    while timestamp <= end:
-        if timestamp not in dates_with_data:
-            datums.append(
-                {"yes": 0, "no": 0, "date": timestamp,}
-            )
-            dates_with_data.add(timestamp)
-        timestamp += 24 * 60 * 60
+    first_day = min(votes_by_day)
+    last_day = max(votes_by_day)
+
+    # One datum per day, from the first vote up to today, in order.
+    datums = []
+    for n in range((max(date.today(), last_day) - first_day).days + 1):
+        day = first_day + timedelta(days=n)
+        yes, no = votes_by_day.get(day, (0, 0))
+        timestamp = int(time.mktime(day.timetuple()) // 86400) * 86400
+        datums.append({"yes": yes, "no": no, "date": timestamp})
 
-    for flag in ImportantDate.objects.filter(date__gte=min_created, date__lte=max_created):
+    flag_data = []
+    for flag in ImportantDate.objects.filter(date__gte=first_day, date__lte=last_day):
         flag_data.append({"x": int(time.mktime(flag.date.timetuple())), "text": _(flag.text)})
 
+    rev_data = []
     for rev in Revision.objects.filter(
-        pk__in=revisions, created__gte=min_created, created__lte=max_created
+        pk__in=revisions, created__gte=first_day, created__lt=last_day + timedelta(days=1)
     ):
         rdate = rev.reviewed or rev.created
         rev_data.append(
@@ -1314,7 +1305,7 @@ def get_helpful_votes_async(request, document_slug):
             {"name": _("Article Revisions"), "slug": "revisions", "data": rev_data,}
         )
 
-    return HttpResponse(json.dumps(send), content_type="application/json")
+    return send
 
 
 @login_required